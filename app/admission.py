@@ -0,0 +1,124 @@
+"""
+Control de admisión para las rutas de escritura.
+
+En las ventanas de examen las ráfagas de ``/send_exam_results`` y ``/extra_points`` ocupan todas
+las conexiones del pool y frenan al resto de las rutas. Cada ruta limitada tiene:
+- ``concurrency``: peticiones que se atienden a la vez (por worker),
+- ``queue``: peticiones que pueden esperar turno; si la cola está llena se rechaza de inmediato,
+- ``timeout``: segundos máximos de espera en la cola.
+
+Las peticiones rechazadas reciben 503 con ``Retry-After`` sin tocar la base, y los contadores
+quedan disponibles en ``AdmissionControl.metrics()``.
+"""
+import json
+import os
+import threading
+import time
+
+from flask import g, jsonify, make_response, request
+
+DEFAULT_LIMITS = {
+    'api.send_exam_results': {'concurrency': 4, 'queue': 16, 'timeout': 1.5},
+    'api.extra_points': {'concurrency': 4, 'queue': 16, 'timeout': 1.0},
+}
+RETRY_AFTER_SECONDS = 2
+
+
+class RouteLimiter:
+    def __init__(self, concurrency: int, queue: int, timeout: float):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self._semaphore = threading.BoundedSemaphore(concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self.max_wait = 0.0
+
+    def acquire(self):
+        """
+        Devuelve ``None`` si se admite la petición, o el motivo del rechazo.
+        """
+        if self._semaphore.acquire(blocking=False):
+            self._admit(0.0)
+            return None
+        with self._lock:
+            if self.waiting >= self.queue:
+                self.shed_queue_full += 1
+                return 'cola llena'
+            self.waiting += 1
+        started = time.monotonic()
+        acquired = self._semaphore.acquire(timeout=self.timeout)
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.shed_timeout += 1
+                return 'tiempo de espera agotado'
+        self._admit(time.monotonic() - started)
+        return None
+
+    def _admit(self, waited: float):
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+            self.max_wait = max(self.max_wait, waited)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'concurrency': self.concurrency,
+                'queue': self.queue,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'shed_queue_full': self.shed_queue_full,
+                'shed_timeout': self.shed_timeout,
+                'max_wait_seconds': round(self.max_wait, 3),
+            }
+
+
+class AdmissionControl:
+    def __init__(self, app=None):
+        self.limiters = {}
+        self.retry_after = RETRY_AFTER_SECONDS
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        limits = json.loads(os.getenv('ADMISSION_LIMITS', 'null')) or DEFAULT_LIMITS
+        app.config.setdefault('ADMISSION_LIMITS', limits)
+        app.config.setdefault('ADMISSION_RETRY_AFTER', RETRY_AFTER_SECONDS)
+        self.retry_after = app.config['ADMISSION_RETRY_AFTER']
+        self.limiters = {endpoint: RouteLimiter(**limit) for endpoint, limit in app.config['ADMISSION_LIMITS'].items()}
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['admission_control'] = self
+
+    def _before_request(self):
+        limiter = self.limiters.get(request.endpoint)
+        if limiter is None:
+            return None
+        motivo = limiter.acquire()
+        if motivo is not None:
+            response = make_response(jsonify({'message': f'Servicio saturado ({motivo}), intente de nuevo'}), 503)
+            response.headers['Retry-After'] = str(self.retry_after)
+            return response
+        g.admission_limiter = limiter
+        return None
+
+    @staticmethod
+    def _teardown_request(exception=None):
+        limiter = g.pop('admission_limiter', None)
+        if limiter is not None:
+            limiter.release()
+
+    def metrics(self) -> dict:
+        return {endpoint: limiter.metrics() for endpoint, limiter in self.limiters.items()}
@@ -1,25 +1,73 @@
-from datetime import datetime
-import json
-import os
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import JSON
-
-
-db_username = os.getenv("db_username")
-db_password = os.getenv("db_password")
-db_endpoint = os.getenv("db_endpoint")
-db_name = os.getenv("db_name")
+import time
 
+_IMPORT_STARTED = time.perf_counter()
 
-app = Flask(__name__)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = f'postgresql://{db_username}:{db_password}@{db_endpoint}/{db_name}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-# Configuración de Flask para asegurarse de que use UTF-8
-app.config['JSON_AS_ASCII'] = False
+from datetime import datetime, timedelta
+import json
+import logging
+import itertools
+import os
+import random
+import secrets
 
-db = SQLAlchemy(app)
+import click
+from flask import Blueprint, Flask, Response, abort, current_app, render_template, request, redirect, url_for, session, jsonify, stream_with_context
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import JSON, bindparam, delete, func, insert, inspect as sa_inspect, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.schema import CreateColumn
+
+from admission import AdmissionControl
+from auth import CognitoAuth
+from awarded import AwardedSet
+from batch import BatchError, run_batch, sin_lote, validate as validar_lote
+from catalog_cache import CatalogCache
+from catalog_changes import CatalogChangeLog
+from compression import Compression, cache_compresion, sin_cache_compresion
+from db_routing import ReadRouter, RoutingSession, usar_primaria
+from dynamo_sync import DEFAULT_SEGMENTS, DynamoSync
+from events import EventHub
+from exports import CSV_MIMETYPE, XLSX_MIMETYPE, csv_chunks, export_response, write_csv, write_xlsx, xlsx_chunks
+from fieldsets import Fieldset
+from json_provider import OrjsonProvider, stream_json_array
+from media import STREAM_CHUNK_SIZE, MediaStore
+from media_previews import run_pipeline
+from question_sampling import SemillaInvalida, firmar_semilla, leer_semilla, nueva_semilla, sortear_ids
+from search import CatalogSearch
+from shared_cache import SharedCache
+from sharding import UserShards
+from single_flight import coalesce
+from slow_queries import SlowQueryLog, explain, is_read, plan_shape, sequential_scans, table_rows
+
+
+logger = logging.getLogger(__name__)
+
+# Las extensiones se crean sin app; se enlazan en create_app (no hay conexión a la base al importar)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+db_router = ReadRouter()
+compression = Compression()
+catalog_cache = CatalogCache()
+media_store = MediaStore()
+cognito_auth = CognitoAuth()
+admission_control = AdmissionControl()
+shared_cache = SharedCache()
+# Pares (usuario, artículo) con puntos extra ya otorgados, para responder repeticiones sin la base
+awarded_points = AwardedSet()
+live_events = EventHub()
+slow_query_log = SlowQueryLog()
+api = Blueprint('api', __name__, cli_group=None)
+
+# Cantidad de filas que se leen por vuelta del cursor en los listados grandes
+USER_POINTS_BATCH_SIZE = 1000
+
+
+def database_uri() -> str:
+    db_username = os.getenv("db_username")
+    db_password = os.getenv("db_password")
+    db_endpoint = os.getenv("db_endpoint")
+    db_name = os.getenv("db_name")
+    return f'postgresql://{db_username}:{db_password}@{db_endpoint}/{db_name}'
 
 
 class Especializacion(db.Model):
@@ -67,6 +115,10 @@ class Examen(db.Model):
     titulo = db.Column(db.Text, nullable=False)
     articulo_id = db.Column(db.Integer, db.ForeignKey('articulo.id', ondelete='CASCADE'))
     articulo = db.relationship('Articulo', backref=db.backref('examenes', lazy=True))
+    # Si se define, cada intento toma esta cantidad de preguntas al azar del banco del examen
+    preguntas_por_intento = db.Column(db.Integer, nullable=True)
+    # Reparte el sorteo proporcionalmente entre las etiquetas de las preguntas
+    estratificar_por_etiqueta = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
 
 
 class Pregunta(db.Model):
@@ -79,20 +131,59 @@ class Pregunta(db.Model):
     opcion_d = db.Column(db.Text, nullable=False, default='Ninguna')
     respuesta_correcta = db.Column(db.String(1), nullable=False)  # 'A', 'B', 'C', 'D'
     explicacion = db.Column(db.Text, nullable=True)
-    examen_id = db.Column(db.Integer, db.ForeignKey('examen.id', ondelete='CASCADE'))
+    etiqueta = db.Column(db.String(100), nullable=True)
+    examen_id = db.Column(db.Integer, db.ForeignKey('examen.id', ondelete='CASCADE'), index=True)
     examen = db.relationship('Examen', backref=db.backref('preguntas', lazy=True))
 
 
+class EstadisticaPregunta(db.Model):
+    """
+    Contadores por pregunta que se actualizan al calificar cada intento: dificultad (correctas
+    entre intentos), opciones elegidas y tiempo acumulado (segundos del intento entre sus preguntas).
+    """
+    __tablename__ = 'estadistica_pregunta'
+    pregunta_id = db.Column(db.Integer, db.ForeignKey('pregunta.id', ondelete='CASCADE'), primary_key=True)
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    correctas = db.Column(db.Integer, nullable=False, default=0)
+    opcion_a = db.Column(db.Integer, nullable=False, default=0)
+    opcion_b = db.Column(db.Integer, nullable=False, default=0)
+    opcion_c = db.Column(db.Integer, nullable=False, default=0)
+    opcion_d = db.Column(db.Integer, nullable=False, default=0)
+    tiempo_acumulado = db.Column(db.Float, nullable=False, default=0)
+    pregunta = db.relationship('Pregunta', backref=db.backref(
+        'estadistica', uselist=False, lazy=True, cascade='all, delete-orphan'))
+
+
+class EstadisticaPreguntaDelta(db.Model):
+    """
+    Incrementos pendientes de ``EstadisticaPregunta``. Cada intento inserta sus filas en lugar de
+    actualizar los contadores (con muchos envíos simultáneos de un mismo examen todos esperarían el
+    candado de las mismas filas); ``plegar_estadisticas`` los suma a los contadores y los borra.
+    """
+    __tablename__ = 'estadistica_pregunta_delta'
+    id = db.Column(db.Integer, primary_key=True)
+    pregunta_id = db.Column(db.Integer, db.ForeignKey('pregunta.id', ondelete='CASCADE'), nullable=False, index=True)
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    correctas = db.Column(db.Integer, nullable=False, default=0)
+    opcion_a = db.Column(db.Integer, nullable=False, default=0)
+    opcion_b = db.Column(db.Integer, nullable=False, default=0)
+    opcion_c = db.Column(db.Integer, nullable=False, default=0)
+    opcion_d = db.Column(db.Integer, nullable=False, default=0)
+    tiempo_acumulado = db.Column(db.Float, nullable=False, default=0)
+
+
 class ResultadoExamen(db.Model):
     __tablename__ = 'resultado_examen'
     id = db.Column(db.Integer, primary_key=True)
-    usuario_email = db.Column(db.String(255), nullable=False)
+    usuario_email = db.Column(db.String(255), nullable=False, index=True)
     examen_id = db.Column(db.Integer, db.ForeignKey('examen.id', ondelete='CASCADE'), nullable=False)
     puntaje = db.Column(db.Float, nullable=False)
     fecha_realizacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     tiempo_total = db.Column(db.Integer, nullable=False)
     examen = db.relationship('Examen', backref=db.backref('resultados_examen', lazy=True))
     respuestas = db.Column(JSON)
+    # Semilla del sorteo de preguntas del intento (solo exámenes con preguntas_por_intento)
+    semilla = db.Column(db.BigInteger, nullable=True)
 
 
 class PuntajeUsuarioExtraArticulos(db.Model):
@@ -101,11 +192,68 @@ class PuntajeUsuarioExtraArticulos(db.Model):
     """
     __tablename__ = 'puntaje_usuario'
     id = db.Column(db.Integer, primary_key=True)
-    usuario_email = db.Column(db.String(255), nullable=False)
+    usuario_email = db.Column(db.String(255), nullable=False, index=True)
     puntaje = db.Column(db.Float, nullable=False)
     articulo_id = db.Column(db.Integer, db.ForeignKey('articulo.id', ondelete='CASCADE'))
     articulo = db.relationship('Articulo', backref=db.backref('puntajes_usuario', lazy=True))
 
+    __table_args__ = (
+        db.UniqueConstraint('usuario_email', 'articulo_id', name='uq_puntaje_usuario_articulo'),
+    )
+
+
+class ManifiestoMedia(db.Model):
+    """
+    Metadatos del archivo de un Articulo en S3, para que la app muestre tamaños, reanude descargas
+    y sepa si su copia local sigue vigente sin descargar el archivo.
+    """
+    __tablename__ = 'manifiesto_media'
+    articulo_id = db.Column(db.Integer, db.ForeignKey('articulo.id', ondelete='CASCADE'), primary_key=True)
+    tamano_bytes = db.Column(db.BigInteger)
+    hash_contenido = db.Column(db.String(64))  # SHA-256 en hexadecimal
+    etag = db.Column(db.String(255))
+    tipo_mime = db.Column(db.String(100))
+    ultima_modificacion = db.Column(db.DateTime)
+    fecha_actualizacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    articulo = db.relationship('Articulo', backref=db.backref('manifiesto', uselist=False, lazy=True))
+
+
+class PreviewMedia(db.Model):
+    """
+    Vista previa liviana del archivo de un Articulo (páginas o duración y miniatura).
+    hash_contenido es el del archivo procesado: si el manifiesto cambia, se vuelve a procesar.
+    """
+    __tablename__ = 'preview_media'
+    articulo_id = db.Column(db.Integer, db.ForeignKey('articulo.id', ondelete='CASCADE'), primary_key=True)
+    hash_contenido = db.Column(db.String(64), nullable=False)
+    paginas = db.Column(db.Integer)
+    duracion_segundos = db.Column(db.Float)
+    miniatura_url = db.Column(db.Text)
+    error = db.Column(db.Text)
+    fecha_procesado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    articulo = db.relationship('Articulo', backref=db.backref('preview', uselist=False, lazy=True))
+
+
+class CambioCatalogo(db.Model):
+    """
+    Registro de cambios del catálogo (ver catalog_changes.py); ``version`` es el cursor de los clientes.
+    """
+    __tablename__ = 'cambio_catalogo'
+    version = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    tabla = db.Column(db.String(50), nullable=False)
+    entidad_id = db.Column(db.Integer, nullable=False)
+    operacion = db.Column(db.String(20), nullable=False)
+    fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+catalog_search = CatalogSearch(db, {'curso': Curso, 'articulo': Articulo, 'pregunta': Pregunta})
+catalog_changes = CatalogChangeLog(db, CambioCatalogo, {
+    'especializacion': Especializacion, 'bloque_curso': BloqueCurso, 'curso': Curso,
+    'articulo': Articulo, 'examen': Examen, 'pregunta': Pregunta,
+})
+# Los resultados de cada usuario viven en un shard elegido por hash del email
+user_shards = UserShards(db, [ResultadoExamen, PuntajeUsuarioExtraArticulos])
+
 
 def crear_examen(articulo_id, data_exam: dict):
 
@@ -116,7 +264,12 @@ def crear_examen(articulo_id, data_exam: dict):
         return jsonify({'message': 'Titulo del examen y preguntas son requeridos'}), 400
 
     # Crear el examen
-    nuevo_examen = Examen(titulo=titulo, articulo_id=articulo_id)
+    nuevo_examen = Examen(
+        titulo=titulo,
+        articulo_id=articulo_id,
+        preguntas_por_intento=data_exam.get('preguntas_por_intento'),
+        estratificar_por_etiqueta=bool(data_exam.get('estratificar_por_etiqueta', False))
+    )
     db.session.add(nuevo_examen)
     db.session.commit()
 
@@ -138,29 +291,38 @@ def crear_examen(articulo_id, data_exam: dict):
             opcion_d=opcion_d,
             respuesta_correcta=respuesta_correcta,
             examen_id=nuevo_examen.id,
-            explicacion=explicacion
+            explicacion=explicacion,
+            etiqueta=pregunta_data.get('etiqueta')
         )
+        nueva_pregunta.estadistica = EstadisticaPregunta(
+            intentos=0, correctas=0, opcion_a=0, opcion_b=0, opcion_c=0, opcion_d=0, tiempo_acumulado=0)
         db.session.add(nueva_pregunta)
     db.session.commit()
+    catalog_cache.clear()
+    shared_cache.invalidate_catalog()
     return jsonify({'message': 'Examen creado exitosamente'}), 201
 
 
 def create_tables():
-    with app.app_context():
-        db.create_all()
+    with current_app.app_context():
+        # Solo la primaria: las réplicas reciben el esquema por replicación
+        db.create_all(bind_key=None)
+        user_shards.create_tables()
         print("All tables created.")
 
 
 def drop_tables():
-    with app.app_context():
-        db.drop_all()
+    with current_app.app_context():
+        user_shards.drop_tables()
+        db.drop_all(bind_key=None)
+        awarded_points.clear()
         print("All tables dropped.")
 
 
 def insert_initial_data():
     drop_tables()
     create_tables()
-    with app.app_context():
+    with current_app.app_context():
         # Por ahora tendremos dos especialidades
         especializacion_cardio = Especializacion(nombre='Cardio Neumología')
         especializacion_hematologia = Especializacion(nombre='Hematología')
@@ -596,12 +758,14 @@ def insert_initial_data():
         crear_examen(articulo_hipertension_2.id, data_examen_hipertension_2)
         crear_examen(articulo_hipertension_3.id, data_examen_hipertension_3)
         db.session.commit()
+        catalog_cache.clear()
+        shared_cache.invalidate_catalog()
 
 
 def connect_and_execute(query):
     try:
         # Connect to the database
-        with app.app_context():
+        with current_app.app_context():
             result = db.session.execute(query)
             db.session.commit()  # Commit changes to the database
             return result
@@ -619,18 +783,24 @@ def obtener_cursos_por_especializacion(especializacion: str):
     return cursos
 
 
-@app.route('/list_courses', methods=['GET'])
+# Campos que se pueden pedir con ?fields= (columnas que necesita cada uno y cómo se arma)
+CAMPOS_CURSO = Fieldset({
+    'id': ([], lambda curso: curso.id),
+    'nombre': ([Curso.nombre], lambda curso: curso.nombre),
+    'contenido': ([Curso.contenido], lambda curso: curso.contenido),
+})
+
+
+@api.route('/list_courses', methods=['GET'])
+@cache_compresion
+@coalesce
 def list_courses():
     bloque_id = int(request.args.get('bloque_id'))
-    bloque = BloqueCurso.query.filter_by(id=bloque_id).first()
+    campos = CAMPOS_CURSO.requested()
+    cursos = Curso.query.options(CAMPOS_CURSO.load_only(Curso, campos)).filter_by(bloque_curso_id=bloque_id)
     cursos_json = []
-    if bloque:
-        for curso in bloque.cursos:
-            cursos_json.append({
-                "id": curso.id,
-                "nombre": curso.nombre,
-                "contenido": curso.contenido
-            })
+    for curso in cursos:
+        cursos_json.append(CAMPOS_CURSO.render(curso, campos))
     return jsonify(cursos_json)
 
 
@@ -639,9 +809,20 @@ def get_especialty(especializacion_nombre: str):
     return especializacion_query
 
 
+def examenes_realizados(email_usuario: str) -> set:
+    """
+    Ids de los exámenes que realizó el usuario (consulta solo su shard).
+    """
+    sesion = user_shards.session_for(email_usuario)
+    return set(sesion.scalars(
+        select(ResultadoExamen.examen_id).filter_by(usuario_email=email_usuario)))
+
+
 def percentage_course_finished(email_usuario:str, cursos: list):
     total_courses = len(cursos)
     exams_finished = 0
+    # Obtener todos los exámenes realizados por el usuario
+    examenes_usuario_ids = examenes_realizados(email_usuario)
     for curso in cursos:
         curso_id = curso.id
         # Obtener todos los exámenes del curso
@@ -652,24 +833,26 @@ def percentage_course_finished(email_usuario:str, cursos: list):
             continue
         examenes_curso_ids = {examen.id for examen in examenes_curso}
 
-        # Obtener todos los exámenes realizados por el usuario
-        examenes_usuario = db.session.query(ResultadoExamen.examen_id).filter_by(
-            usuario_email=email_usuario
-        ).all()
-        examenes_usuario_ids = {examen.examen_id for examen in examenes_usuario}
-
         # Verificar si todos los exámenes del curso fueron realizados por el usuario
-        if examenes_usuario:
+        if examenes_usuario_ids:
             todos_examenes_realizados = examenes_curso_ids.issubset(examenes_usuario_ids)
             if todos_examenes_realizados:
                 exams_finished += 1
     return exams_finished/total_courses if total_courses else 0
 
 
-@app.route('/list_blocks', methods=['GET'])
+@api.route('/list_blocks', methods=['GET'])
+@coalesce
 def list_blocks():
     especializacion_nombre = request.args.get('especializacion_nombre')
-    user_email = request.args.get('userEmail')
+    user_email = cognito_auth.current_email()
+    bloques_json = shared_cache.get_or_compute(
+        'bloques', user_email, lambda: avance_bloques(especializacion_nombre, user_email),
+        params=(especializacion_nombre,))
+    return jsonify({"blocks": bloques_json})
+
+
+def avance_bloques(especializacion_nombre: str, user_email: str) -> list:
     especializacion_query = get_especialty(especializacion_nombre=especializacion_nombre)
     bloques_json = []
     if especializacion_query:
@@ -682,29 +865,76 @@ def list_blocks():
                 "porcentaje_completado": percentage_completed,
                 "porcentaje_completado_texto": f"{int(percentage_completed*100)}%"
             })
-    return jsonify({"blocks": bloques_json})
+    return bloques_json
 
 
-@app.route('/create_tables_command', methods=['GET'])
+@api.route('/create_tables_command', methods=['GET'])
+@usar_primaria
 def create_tables_command():
     create_tables()
     return jsonify({"message": "Tables created."})
 
 
-@app.route('/drop_tables_command', methods=['GET'])
+@api.route('/drop_tables_command', methods=['GET'])
+@usar_primaria
 def drop_tables_command():
     drop_tables()
     return jsonify({"message": "Tables created."})
 
 
-@app.route('/initial_data', methods=['GET'])
+@api.route('/initial_data', methods=['GET'])
+@usar_primaria
 def initial_data():
     insert_initial_data()
     return jsonify({"message": "Initial Data created."})
 
 
-@app.route('/list_specialties', methods=['GET'])
-def list_specialties():
+def columnas_faltantes(engine, tables) -> list:
+    """
+    Columnas de los modelos que no existen en las tablas de ``engine`` (bases creadas con una
+    versión anterior). Las tablas que no existen las crea ``create_tables``.
+    """
+    inspector = sa_inspect(engine)
+    faltantes = []
+    for table in tables:
+        if not inspector.has_table(table.name):
+            continue
+        existentes = {columna['name'] for columna in inspector.get_columns(table.name)}
+        faltantes.extend(columna for columna in table.columns if columna.name not in existentes)
+    return faltantes
+
+
+def agregar_columnas(engine, columnas: list):
+    with engine.begin() as connection:
+        for columna in columnas:
+            definicion = CreateColumn(columna).compile(dialect=engine.dialect)
+            connection.execute(text(f'ALTER TABLE {columna.table.name} ADD COLUMN {definicion}'))
+
+
+@api.cli.command('upgrade-schema')
+@click.option('--dry-run', is_flag=True, help='Solo muestra las columnas que faltan.')
+def upgrade_schema_command(dry_run):
+    """
+    Agrega a una base existente (y a sus shards) las tablas y columnas nuevas de los modelos, por
+    ejemplo las del sorteo de preguntas (examen.preguntas_por_intento, examen.estratificar_por_etiqueta,
+    pregunta.etiqueta, resultado_examen.semilla) o estadistica_pregunta_delta. Es idempotente.
+    """
+    if not dry_run:
+        # create_all solo crea las tablas que no existen
+        create_tables()
+    destinos = [('primaria', db.engine, db.metadata.sorted_tables)]
+    destinos += [(f'shard {numero}', user_shards.engine(numero), user_shards.tables)
+                 for numero in range(len(user_shards.shard_keys))]
+    for nombre, engine, tables in destinos:
+        columnas = columnas_faltantes(engine, tables)
+        for columna in columnas:
+            click.echo(f'{nombre}: {columna.table.name}.{columna.name}')
+        if columnas and not dry_run:
+            agregar_columnas(engine, columnas)
+    click.echo('Esquema actualizado.' if not dry_run else 'Sin cambios (--dry-run).')
+
+
+def cargar_especializaciones() -> list:
     especializaciones = Especializacion.query.all()
     especializaciones_json = []
     for especializacion in especializaciones:
@@ -712,103 +942,556 @@ def list_specialties():
             'id': especializacion.id,
             'nombre': especializacion.nombre,
         })
-    return jsonify(especializaciones_json)
+    return especializaciones_json
 
 
-@app.route('/list_articles', methods=['GET'])
+@api.route('/list_specialties', methods=['GET'])
+@cache_compresion
+def list_specialties():
+    return jsonify(catalog_cache.get_or_load(('especializaciones',), cargar_especializaciones))
+
+
+@api.route('/catalog_changes', methods=['GET'])
+@cache_compresion
+@coalesce
+def catalog_changes_view():
+    """
+    Sincronización incremental del catálogo. El cliente envía ``epoca`` y ``since`` (la ``version``
+    de su última respuesta); sin ellos, o si quedó muy atrás, recibe el catálogo completo.
+    """
+    since = request.args.get('since', type=int)
+    return jsonify(catalog_changes.changes_since(
+        since, request.args.get('epoca'), current_app.config['CATALOG_DELTA_LIMIT']))
+
+
+@api.cli.command('prune-catalog-changes')
+@click.option('--days', default=30, show_default=True, help='Días de cambios que se conservan.')
+def prune_catalog_changes_command(days):
+    """Borra el registro de cambios antiguo (los clientes más atrasados recibirán el catálogo completo)."""
+    borrados = catalog_changes.prune(datetime.utcnow() - timedelta(days=days))
+    click.echo(f'{borrados} cambios eliminados.')
+
+
+@api.route('/search', methods=['GET'])
+@coalesce
+def search():
+    """
+    Búsqueda en cursos, artículos y preguntas ordenada por relevancia.
+    Parámetros: q, page, page_size (máximo 50) y tipos (por ejemplo "curso,articulo").
+    """
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'message': 'El parámetro q es requerido'}), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = min(max(request.args.get('page_size', 20, type=int), 1), 50)
+    tipos = [tipo.strip() for tipo in (request.args.get('tipos') or '').split(',') if tipo.strip()]
+    desconocidos = sorted(set(tipos) - set(catalog_search.models))
+    if desconocidos:
+        return jsonify({'message': f"Tipos desconocidos: {', '.join(desconocidos)}; "
+                                   f"use {', '.join(catalog_search.models)}"}), 400
+    resultados, hay_mas = catalog_search.search(query, page=page, page_size=page_size, tipos=tipos or None)
+    return jsonify({
+        'query': query,
+        'page': page,
+        'page_size': page_size,
+        'has_more': hay_mas,
+        'results': resultados,
+    })
+
+
+@api.cli.command('create-search-index')
+def create_search_index_command():
+    """
+    Agrega las columnas tsvector e índices GIN de búsqueda a una base Postgres existente.
+    """
+    catalog_search.create_postgres_index()
+    print("Search index created.")
+
+
+def preview_json(preview: PreviewMedia):
+    if preview is None or preview.error:
+        return None
+    return {
+        'paginas': preview.paginas,
+        'duracion_segundos': preview.duracion_segundos,
+        'miniatura_url': preview.miniatura_url,
+    }
+
+
+def manifiesto_json(manifiesto: ManifiestoMedia):
+    if manifiesto is None:
+        return None
+    return {
+        'tamano_bytes': manifiesto.tamano_bytes,
+        'hash_contenido': manifiesto.hash_contenido,
+        'etag': manifiesto.etag,
+        'tipo_mime': manifiesto.tipo_mime,
+        'ultima_modificacion': manifiesto.ultima_modificacion.isoformat() if manifiesto.ultima_modificacion else None,
+    }
+
+
+CAMPOS_ARTICULO = Fieldset({
+    'id': ([], lambda article: article.id),
+    'titulo': ([Articulo.titulo], lambda article: article.titulo),
+    'url_file': ([Articulo.url_contenido], lambda article: article.url_contenido),
+    'tipo': ([Articulo.tipo], lambda article: article.tipo),
+    'contenido': ([Articulo.contenido], lambda article: article.contenido),
+    'examen_id': ([], lambda article: article.examenes[0].id if article.examenes else None),
+    'media': ([], lambda article: manifiesto_json(article.manifiesto)),
+    'preview': ([], lambda article: preview_json(article.preview)),
+})
+
+
+def consulta_articulos(campos: list):
+    query = Articulo.query.options(CAMPOS_ARTICULO.load_only(Articulo, campos))
+    # Las tablas de media solo se unen si se piden sus campos
+    if 'media' in campos:
+        query = query.options(joinedload(Articulo.manifiesto))
+    if 'preview' in campos:
+        query = query.options(joinedload(Articulo.preview))
+    return query
+
+
+@api.route('/list_articles', methods=['GET'])
+@cache_compresion
+@coalesce
 def list_articles():
     course_id = int(request.args.get('course_id'))
-    articles = Articulo.query.filter_by(curso_id=course_id)
+    # examen_id no forma parte del listado (solo de /article)
+    campos = CAMPOS_ARTICULO.requested(exclude=('examen_id',))
+    articles = consulta_articulos(campos).filter(Articulo.curso_id == course_id)
     articles_json = []
     for article in articles:
-        articles_json.append({
-            'id': article.id,
-            'titulo': article.titulo,
-            'url_file': article.url_contenido,
-            'tipo': article.tipo,
-            'contenido': article.contenido
-        })
+        articles_json.append(CAMPOS_ARTICULO.render(article, campos))
     return jsonify(articles_json)
 
 
-@app.route('/article', methods=['GET'])
+@api.route('/article', methods=['GET'])
+@cache_compresion
+@coalesce
 def get_article():
     """
     Un Articulo puede tener a futuro varios examanes, pero nosotros estaremos por ahora tomando solo 1
     :return:
     """
     article_id = int(request.args.get('article_id'))
-    article = Articulo.query.get_or_404(article_id)
-    return jsonify({
-        'id': article.id,
-        'titulo': article.titulo,
-        'url_file': article.url_contenido,
-        'tipo': article.tipo,
-        'contenido': article.contenido,
-        'examen_id': article.examenes[0].id,
-    })
+    campos = CAMPOS_ARTICULO.requested()
+    article = consulta_articulos(campos).filter(Articulo.id == article_id).first_or_404()
+    return jsonify(CAMPOS_ARTICULO.render(article, campos))
 
 
-@app.route('/exam', methods=['GET'])
-def get_examen():
-    examen = Examen.query.get_or_404(int(request.args.get('exam_id')))
-    if examen:
-        return jsonify({
-            'id': examen.id,
-            'titulo': examen.titulo,
-            'cantidad_preguntas': len(examen.preguntas),
-            'preguntas_id': [pregunta.id for pregunta in examen.preguntas],
+@api.route('/article_media_url', methods=['GET'])
+def article_media_url():
+    """
+    URL firmada para descargar el archivo del artículo directamente de S3.
+    """
+    article = Articulo.query.get_or_404(int(request.args.get('article_id')))
+    if not article.url_contenido:
+        abort(404)
+    url, expira_en = media_store.presigned_url(article.url_contenido)
+    return jsonify({'url': url, 'expira_en': expira_en, 'media': manifiesto_json(article.manifiesto)})
+
+
+@api.route('/article_media', methods=['GET'])
+@sin_lote
+def article_media():
+    """
+    Proxy del archivo del artículo con soporte de Range (206) para reanudar descargas
+    y de If-None-Match (304) para validar la copia local.
+    """
+    from botocore.exceptions import ClientError
+
+    article = Articulo.query.get_or_404(int(request.args.get('article_id')))
+    if not article.url_contenido:
+        abort(404)
+    byte_range = request.headers.get('Range')
+    try:
+        s3_object = media_store.get_object(
+            article.url_contenido, byte_range=byte_range, if_none_match=request.headers.get('If-None-Match'))
+    except ClientError as error:
+        metadata = error.response.get('ResponseMetadata', {})
+        status = metadata.get('HTTPStatusCode', 502)
+        if status == 304:
+            # El cliente guarda la validación con el ETag de la respuesta 304
+            etag = metadata.get('HTTPHeaders', {}).get('etag') or request.headers.get('If-None-Match')
+            return Response(status=304, headers={'ETag': etag})
+        if status in (404, 416):
+            return Response(status=status)
+        raise
+
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'Content-Length': str(s3_object['ContentLength']),
+        'ETag': s3_object.get('ETag', ''),
+    }
+    if s3_object.get('LastModified'):
+        headers['Last-Modified'] = s3_object['LastModified'].strftime('%a, %d %b %Y %H:%M:%S GMT')
+    if s3_object.get('ContentRange'):
+        headers['Content-Range'] = s3_object['ContentRange']
+    return Response(
+        stream_with_context(s3_object['Body'].iter_chunks(STREAM_CHUNK_SIZE)),
+        status=206 if s3_object.get('ContentRange') else 200,
+        headers=headers,
+        mimetype=s3_object.get('ContentType') or 'application/octet-stream',
+        direct_passthrough=True)
+
+
+def refresh_media_manifest(compute_hash: bool = False, only_missing: bool = False) -> int:
+    """
+    Actualiza el manifiesto de cada artículo con su HEAD en S3. Devuelve cuántos se actualizaron.
+    """
+    updated = 0
+    for article in Articulo.query.filter(Articulo.url_contenido.isnot(None)).all():
+        manifiesto = article.manifiesto
+        if manifiesto is not None and only_missing:
+            continue
+        # Con el hash ya calculado para el mismo ETag no se vuelve a leer el archivo
+        hashed_etag = manifiesto.etag if manifiesto is not None and manifiesto.hash_contenido else None
+        data = media_store.describe(article.url_contenido, compute_hash=compute_hash, hashed_etag=hashed_etag)
+        if manifiesto is None:
+            manifiesto = ManifiestoMedia(articulo_id=article.id)
+            db.session.add(manifiesto)
+        elif data['hash_contenido'] is None and manifiesto.etag == data['etag']:
+            # El archivo no cambió: se conserva el hash calculado antes
+            data['hash_contenido'] = manifiesto.hash_contenido
+        if data['ultima_modificacion'] is not None:
+            data['ultima_modificacion'] = data['ultima_modificacion'].replace(tzinfo=None)
+        for field, value in data.items():
+            setattr(manifiesto, field, value)
+        manifiesto.fecha_actualizacion = datetime.utcnow()
+        db.session.commit()
+        updated += 1
+    return updated
+
+
+def extract_media_previews(workers: int = None, force: bool = False) -> dict:
+    """
+    Genera vistas previas solo para los artículos cuyo archivo cambió desde el último proceso
+    (se compara el hash del manifiesto, o el ETag si no hay hash, con el de la vista previa).
+    """
+    rows = db.session.query(Articulo, ManifiestoMedia, PreviewMedia).join(
+        ManifiestoMedia, ManifiestoMedia.articulo_id == Articulo.id
+    ).outerjoin(
+        PreviewMedia, PreviewMedia.articulo_id == Articulo.id
+    ).all()
+    tasks = []
+    for article, manifiesto, preview in rows:
+        content_key = manifiesto.hash_contenido or manifiesto.etag
+        if not force and preview is not None and preview.hash_contenido == content_key and not preview.error:
+            continue
+        tasks.append({
+            'articulo_id': article.id,
+            'url': article.url_contenido,
+            'tipo': article.tipo,
+            'hash_contenido': content_key,
+            'endpoint_url': media_store.endpoint_url,
         })
-    return jsonify({})
+    db.session.remove()
+
+    summary = {'procesados': 0, 'errores': 0, 'sin_cambios': len(rows) - len(tasks)}
+    for result in run_pipeline(tasks, workers=workers):
+        preview = db.session.get(PreviewMedia, result['articulo_id'])
+        if preview is None:
+            preview = PreviewMedia(articulo_id=result['articulo_id'])
+            db.session.add(preview)
+        for field, value in result.items():
+            setattr(preview, field, value)
+        preview.fecha_procesado = datetime.utcnow()
+        db.session.commit()
+        summary['errores' if result['error'] else 'procesados'] += 1
+    return summary
+
+
+@api.cli.command('extract-media-previews')
+@click.option('--workers', type=int, default=None, help='Procesos del pool (por defecto, uno por CPU).')
+@click.option('--force', is_flag=True, help='Vuelve a procesar aunque el archivo no haya cambiado.')
+def extract_media_previews_command(workers, force):
+    print(extract_media_previews(workers=workers, force=force))
+
+
+@api.cli.command('refresh-media-manifest')
+@click.option('--hash', 'compute_hash', is_flag=True, help='Calcula SHA-256 leyendo el archivo si S3 no lo tiene.')
+@click.option('--only-missing', is_flag=True, help='Solo artículos sin manifiesto.')
+def refresh_media_manifest_command(compute_hash, only_missing):
+    updated = refresh_media_manifest(compute_hash=compute_hash, only_missing=only_missing)
+    print(f"Media manifest updated for {updated} articles.")
+
+
+def banco_preguntas(ids_etiquetas) -> dict:
+    """
+    Arreglo de ids de preguntas del examen, completo y agrupado por etiqueta, ordenado por id.
+    """
+    banco = {'ids': [], 'por_etiqueta': {}}
+    for pregunta_id, etiqueta in sorted(ids_etiquetas):
+        banco['ids'].append(pregunta_id)
+        banco['por_etiqueta'].setdefault(etiqueta or '', []).append(pregunta_id)
+    return banco
 
 
-@app.route('/question', methods=['GET'])
+def obtener_banco_preguntas(exam_id: int) -> dict:
+    return catalog_cache.get_or_load(
+        ('banco', exam_id),
+        lambda: banco_preguntas(
+            db.session.query(Pregunta.id, Pregunta.etiqueta).filter(Pregunta.examen_id == exam_id).all()))
+
+
+def resumen_examen(examen: Examen) -> dict:
+    return {
+        'id': examen.id,
+        'titulo': examen.titulo,
+        'preguntas_por_intento': examen.preguntas_por_intento,
+        'estratificar_por_etiqueta': examen.estratificar_por_etiqueta,
+    }
+
+
+def obtener_resumen_examen(exam_id: int) -> dict:
+    return catalog_cache.get_or_load(('examen', exam_id), lambda: resumen_examen(Examen.query.get_or_404(exam_id)))
+
+
+def sortear_preguntas(resumen: dict, semilla: int) -> list:
+    return sortear_ids(
+        obtener_banco_preguntas(resumen['id']),
+        resumen['preguntas_por_intento'],
+        semilla,
+        estratificar=resumen['estratificar_por_etiqueta'])
+
+
+def semilla_del_intento(resumen: dict, token) -> int:
+    return leer_semilla(current_app.config['SECRET_KEY'], token, resumen['id'], current_app.config['EXAM_SEED_MAX_AGE'])
+
+
+@api.route('/exam', methods=['GET'])
+@cache_compresion
+def get_examen():
+    """
+    Si el examen sortea preguntas, se devuelve la semilla firmada del intento; la app la envía de
+    vuelta en /send_exam_results para calificar exactamente las preguntas que le tocaron (y en
+    /exam?semilla=... para volver a abrir el mismo intento).
+    """
+    resumen = obtener_resumen_examen(int(request.args.get('exam_id')))
+    examen_json = {
+        'id': resumen['id'],
+        'titulo': resumen['titulo'],
+    }
+    if resumen['preguntas_por_intento']:
+        token = request.args.get('semilla')
+        if token:
+            try:
+                semilla = semilla_del_intento(resumen, token)
+            except SemillaInvalida as error:
+                return jsonify({'message': str(error)}), 400
+        else:
+            semilla = nueva_semilla()
+            token = firmar_semilla(current_app.config['SECRET_KEY'], resumen['id'], semilla)
+        preguntas_id = sortear_preguntas(resumen, semilla)
+        examen_json['semilla'] = token
+        # Cada intento es distinto: no vale la pena guardar el cuerpo comprimido
+        sin_cache_compresion()
+    else:
+        preguntas_id = obtener_banco_preguntas(resumen['id'])['ids']
+    examen_json['cantidad_preguntas'] = len(preguntas_id)
+    examen_json['preguntas_id'] = preguntas_id
+    return jsonify(examen_json)
+
+
+CAMPOS_PREGUNTA = Fieldset({
+    'id': ([], lambda pregunta: pregunta.id),
+    'enunciado': ([Pregunta.enunciado], lambda pregunta: pregunta.enunciado),
+    'opciones': ([Pregunta.opcion_a, Pregunta.opcion_b, Pregunta.opcion_c, Pregunta.opcion_d], lambda pregunta: [
+        {'opcion': 'A', 'descripcion': pregunta.opcion_a},
+        {'opcion': 'B', 'descripcion': pregunta.opcion_b},
+        {'opcion': 'C', 'descripcion': pregunta.opcion_c},
+        {'opcion': 'D', 'descripcion': pregunta.opcion_d},
+    ]),
+    'respuesta_correcta': ([Pregunta.respuesta_correcta], lambda pregunta: pregunta.respuesta_correcta),
+    'explicacion': ([Pregunta.explicacion], lambda pregunta: pregunta.explicacion),
+})
+
+
+@api.route('/question', methods=['GET'])
+@cache_compresion
+@coalesce
 def get_question():
-    pregunta = Pregunta.query.get_or_404(int(request.args.get('question_id')))
-    return jsonify({
-        'id': pregunta.id,
-        'enunciado': pregunta.enunciado,
-        'opciones': [
-            {'opcion': 'A', 'descripcion': pregunta.opcion_a},
-            {'opcion': 'B', 'descripcion': pregunta.opcion_b},
-            {'opcion': 'C', 'descripcion': pregunta.opcion_c},
-            {'opcion': 'D', 'descripcion': pregunta.opcion_d},
-        ],
-        'respuesta_correcta': pregunta.respuesta_correcta,
-        'explicacion':  pregunta.explicacion
-    })
+    campos = CAMPOS_PREGUNTA.requested()
+    pregunta = Pregunta.query.options(CAMPOS_PREGUNTA.load_only(Pregunta, campos)).filter(
+        Pregunta.id == int(request.args.get('question_id'))).first_or_404()
+    return jsonify(CAMPOS_PREGUNTA.render(pregunta, campos))
 
 
-def check_correct_answer(question_id: int) -> str:
-    pregunta = Pregunta.query.get_or_404(question_id)
-    if pregunta.respuesta_correcta == 'A':
+def texto_opcion(pregunta: Pregunta, opcion: str) -> str:
+    if opcion == 'A':
         return pregunta.opcion_a
-    elif pregunta.respuesta_correcta == 'B':
+    elif opcion == 'B':
         return pregunta.opcion_b
-    elif pregunta.respuesta_correcta == 'C':
+    elif opcion == 'C':
         return pregunta.opcion_c
     else:
         return pregunta.opcion_d
 
 
+def check_correct_answer(question_id: int) -> str:
+    pregunta = Pregunta.query.get_or_404(question_id)
+    return texto_opcion(pregunta, pregunta.respuesta_correcta)
+
+
+def clave_respuestas(preguntas: list) -> dict:
+    """
+    Clave de respuestas de un examen: por cada pregunta su enunciado, la opción correcta y su texto.
+    """
+    return {
+        pregunta.id: {
+            'enunciado': pregunta.enunciado,
+            'respuesta_correcta': pregunta.respuesta_correcta,
+            'texto_correcto': texto_opcion(pregunta, pregunta.respuesta_correcta),
+        }
+        for pregunta in preguntas
+    }
+
+
+def answer_key(exam_id: int) -> dict:
+    return catalog_cache.get_or_load(
+        ('answer_key', exam_id),
+        lambda: clave_respuestas(Pregunta.query.filter_by(examen_id=exam_id).all()))
+
+
+def respuesta_pregunta(exam_id: int, question_id) -> dict:
+    """
+    Busca la pregunta en la clave del examen; si no pertenece al examen se consulta directamente.
+    """
+    respuesta = answer_key(exam_id).get(question_id)
+    if respuesta is None:
+        pregunta = Pregunta.query.get_or_404(question_id)
+        respuesta = clave_respuestas([pregunta])[pregunta.id]
+    return respuesta
+
+
+OPCIONES_ESTADISTICA = {'A': 'opcion_a', 'B': 'opcion_b', 'C': 'opcion_c', 'D': 'opcion_d'}
+# Umbrales para marcar preguntas muy fáciles o muy difíciles (proporción de respuestas correctas)
+DIFICULTAD_MINIMO_INTENTOS = 20
+DIFICULTAD_FACIL = 0.9
+DIFICULTAD_DIFICIL = 0.3
+
+
+COLUMNAS_ESTADISTICA = ('intentos', 'correctas', 'opcion_a', 'opcion_b', 'opcion_c', 'opcion_d', 'tiempo_acumulado')
+_intentos_registrados = itertools.count(1)
+
+
+def registrar_estadisticas(answers: list, seconds_per_question: float):
+    """
+    ``answers`` es una lista de ``(pregunta_id, opcion, correcta)``. Se insertan los incrementos del
+    intento en un solo INSERT (sin candados sobre los contadores); cada
+    ``QUESTION_STATS_FOLD_EVERY`` intentos el worker los suma a los contadores.
+    """
+    filas = []
+    for pregunta_id, opcion, correcta in answers:
+        columna = OPCIONES_ESTADISTICA.get(opcion)
+        fila = {'pregunta_id': pregunta_id, 'intentos': 1, 'correctas': int(correcta),
+                'tiempo_acumulado': seconds_per_question}
+        fila.update({nombre: int(nombre == columna) for nombre in OPCIONES_ESTADISTICA.values()})
+        filas.append(fila)
+    db.session.execute(insert(EstadisticaPreguntaDelta.__table__), filas)
+    db.session.commit()
+    if next(_intentos_registrados) % current_app.config['QUESTION_STATS_FOLD_EVERY'] == 0:
+        try:
+            plegar_estadisticas()
+        except Exception:
+            # Los incrementos siguen pendientes; se suman en el siguiente plegado
+            db.session.rollback()
+            logger.exception('No se pudieron plegar las estadísticas por pregunta')
+
+
+def plegar_estadisticas() -> int:
+    """
+    Suma los incrementos pendientes a ``EstadisticaPregunta`` y los borra, en una transacción.
+    El ``DELETE ... RETURNING`` hace que cada incremento se sume una sola vez aunque dos workers
+    pleguen a la vez. Devuelve cuántos incrementos se sumaron.
+    """
+    tabla = EstadisticaPregunta.__table__
+    deltas = EstadisticaPreguntaDelta.__table__
+    dialect = db.session.get_bind(EstadisticaPreguntaDelta).dialect
+    if not dialect.delete_returning:
+        # Postgres siempre lo tiene; SQLite desde la versión 3.35
+        raise RuntimeError(f'{dialect.name} no soporta DELETE ... RETURNING (SQLite necesita 3.35 o posterior)')
+    filas = db.session.execute(delete(deltas).returning(
+        deltas.c.pregunta_id, *[deltas.c[columna] for columna in COLUMNAS_ESTADISTICA])).all()
+    sumas = {}
+    for fila in filas:
+        suma = sumas.setdefault(fila.pregunta_id, dict.fromkeys(COLUMNAS_ESTADISTICA, 0))
+        for columna in COLUMNAS_ESTADISTICA:
+            suma[columna] += getattr(fila, columna)
+    existentes = set(db.session.scalars(select(tabla.c.pregunta_id).where(tabla.c.pregunta_id.in_(sumas))))
+    # En orden de id para evitar bloqueos cruzados con otro plegado
+    cambios = [{'id_pregunta': pregunta_id, **{f'suma_{columna}': valor for columna, valor in sumas[pregunta_id].items()}}
+               for pregunta_id in sorted(existentes)]
+    if cambios:
+        db.session.execute(update(tabla).where(tabla.c.pregunta_id == bindparam('id_pregunta')).values(
+            {columna: tabla.c[columna] + bindparam(f'suma_{columna}') for columna in COLUMNAS_ESTADISTICA}), cambios)
+    nuevas = [{'pregunta_id': pregunta_id, **suma} for pregunta_id, suma in sumas.items() if pregunta_id not in existentes]
+    if nuevas:
+        # Preguntas creadas antes de existir las estadísticas
+        db.session.execute(insert(tabla), nuevas)
+    db.session.commit()
+    return len(filas)
+
+
+def respuestas_unicas(questions) -> list:
+    """
+    Respuestas enviadas a /send_exam_results con ``questionId`` entero, una por pregunta: si una
+    pregunta se repite cuenta solo la primera respuesta (repetir una correcta no sube el puntaje).
+    """
+    if not isinstance(questions, list):
+        raise ValueError('exam_results debe ser una lista')
+    vistas = set()
+    unicas = []
+    for question in questions:
+        question_id = question.get('questionId') if isinstance(question, dict) else None
+        if isinstance(question_id, bool) or not isinstance(question_id, (int, str)):
+            raise ValueError('Cada respuesta necesita un questionId numérico')
+        try:
+            question_id = int(question_id)
+        except ValueError:
+            raise ValueError(f'questionId no es numérico: {question_id}') from None
+        if question_id in vistas:
+            continue
+        vistas.add(question_id)
+        unicas.append({**question, 'questionId': question_id})
+    return unicas
+
+
 class Score:
-    def __init__(self, questions: list, exam_id: int, user_email: str, elapsed_time: int):
+    def __init__(self, questions: list, exam_id: int, user_email: str, elapsed_time: int, seed: int = None):
         self.questions = questions
         self.results_id = None
         self.exam = Examen.query.get_or_404(exam_id)
         self.user_email = user_email
+        self.seed = seed
+        self.drawn_questions = None
+        if seed is not None and self.exam.preguntas_por_intento:
+            self.drawn_questions = sortear_preguntas(resumen_examen(self.exam), seed)
         self.elapsed_time = elapsed_time//60
         self.final_score = 0
+        self.elapsed_seconds = elapsed_time
         exam_result = self.validate_questions()
         self.exam_result = exam_result
         self.final_score = exam_result.get('points')
         self.save_score()
+        self.update_question_stats()
+
+    def update_question_stats(self):
+        """
+        Suma el intento a los contadores de cada pregunta contestada (se leen en /question_stats).
+        """
+        answers = [(question['pregunta_id'], question['opcion_seleccionada'], question['respuesta'] == 'correcta')
+                   for question in self.exam_result['questions']]
+        if answers:
+            registrar_estadisticas(answers, (self.elapsed_seconds or 0) / len(answers))
 
     def save_score(self):
         """
         Si ya existe un resultado anteror, entonces lo actualizamos con el ultimo puntaje y tiempo obtenido
         """
-        last_exam_result = ResultadoExamen.query.filter_by(
+        sesion = user_shards.session_for(self.user_email)
+        last_exam_result = sesion.query(ResultadoExamen).filter_by(
             usuario_email=self.user_email,
             examen_id=self.exam.id).first()
         if last_exam_result:
@@ -816,7 +1499,9 @@ class Score:
             last_exam_result.puntaje = self.final_score
             last_exam_result.fecha_realizacion = datetime.utcnow()
             last_exam_result.respuestas = self.exam_result
-            db.session.commit()
+            last_exam_result.semilla = self.seed
+            sesion.commit()
+            shared_cache.invalidate_user(self.user_email)
             self.results_id = last_exam_result.id
         else:
             resultado = ResultadoExamen(
@@ -824,57 +1509,112 @@ class Score:
                 examen_id=self.exam.id,
                 tiempo_total=self.elapsed_time,
                 puntaje=self.final_score,
-                respuestas=self.exam_result
+                respuestas=self.exam_result,
+                semilla=self.seed
             )
-            db.session.add(resultado)
-            db.session.commit()
+            sesion.add(resultado)
+            sesion.commit()
+            shared_cache.invalidate_user(self.user_email)
             self.results_id = resultado.id
 
     def validate_questions(self):
         valid_answers = 0
         invalid_answers = 0
         json_list = []
-        total_questions = len(self.questions)
-        for question in self.questions:
-            question_id = question.get('questionId')
-            question_obj = Pregunta.query.get_or_404(question_id)
+        questions = self.questions
+        total_questions = len(questions)
+        if self.drawn_questions is not None:
+            # Solo cuentan las preguntas que salieron en el sorteo; las no contestadas valen cero
+            drawn = set(self.drawn_questions)
+            questions = [question for question in questions if question['questionId'] in drawn]
+            total_questions = len(self.drawn_questions)
+        for question in questions:
+            question_id = question['questionId']
+            respuesta = respuesta_pregunta(self.exam.id, question_id)
             user_option_selected = question.get('optionSelectedValue')
-            if user_option_selected == question_obj.respuesta_correcta:
+            if user_option_selected == respuesta['respuesta_correcta']:
                 valid_answers += 1
                 json_list.append({
-                    'enunciado_pregunta': question_obj.enunciado,
-                    'respuesta_correcta': question_obj.respuesta_correcta,
+                    'pregunta_id': question_id,
+                    'enunciado_pregunta': respuesta['enunciado'],
+                    'respuesta_correcta': respuesta['respuesta_correcta'],
+                    'opcion_correcta': respuesta['respuesta_correcta'],
+                    'opcion_seleccionada': user_option_selected,
                     'respuesta': 'correcta'
                 })
             else:
                 invalid_answers += 1
                 json_list.append({
-                    'enunciado_pregunta': question_obj.enunciado,
-                    'respuesta_correcta': check_correct_answer(question_id=question_id),
+                    'pregunta_id': question_id,
+                    'enunciado_pregunta': respuesta['enunciado'],
+                    'respuesta_correcta': respuesta['texto_correcto'],
+                    'opcion_correcta': respuesta['respuesta_correcta'],
+                    'opcion_seleccionada': user_option_selected,
                     'respuesta': 'incorrecta'
                 })
         return {
             'questions': json_list,
             'valid_questions': valid_answers,
             'invalid_questions': invalid_answers,
-            'points': (valid_answers/total_questions)*100
+            'points': (valid_answers/total_questions)*100 if total_questions else 0
         }
 
 
-@app.route('/send_exam_results', methods=['POST'])
+@api.route('/batch', methods=['POST'])
+def batch():
+    """
+    Ejecuta varias llamadas a la API en una sola petición.
+    Cuerpo: ``{"requests": [{"method": "GET", "path": "/article?article_id=1"}, ...], "paralelo": false}``.
+    Devuelve ``{"responses": [{"status": 200, "body": {...}}, ...]}`` en el mismo orden.
+    """
+    data = request.json or {}
+    try:
+        subrequests = validar_lote(data.get('requests'))
+    except BatchError as error:
+        return jsonify({'message': str(error)}), 400
+    solo_lectura = all(subrequest['method'] == 'GET' for subrequest in subrequests)
+    responses = run_batch(
+        db, subrequests, parallel=bool(data.get('paralelo')) and solo_lectura,
+        replica_engine=db_router.read_engine(db.engines) if solo_lectura else None)
+    return jsonify({'responses': responses})
+
+
+@api.route('/send_exam_results', methods=['POST'])
 def send_exam_results():
     data = request.json
-    exam_results = data.get('exam_results')
+    try:
+        exam_results = respuestas_unicas(data.get('exam_results'))
+    except ValueError as error:
+        return jsonify({'message': str(error)}), 400
     elapsed_time = data.get('elapsedTime')
     exam_id = data.get('examId')
-    user_email = data.get('userEmail')
-    score = Score(questions=exam_results, exam_id=exam_id, user_email=user_email, elapsed_time=elapsed_time)
+    user_email = cognito_auth.current_email(data)
+    resumen = obtener_resumen_examen(int(exam_id))
+    seed = None
+    if resumen['preguntas_por_intento']:
+        # Sin una semilla emitida por /exam no se sabe qué preguntas le tocaron: no se califica
+        try:
+            seed = semilla_del_intento(resumen, data.get('semilla'))
+        except SemillaInvalida as error:
+            return jsonify({'message': str(error)}), 400
+    # Las insignias de antes solo hacen falta para avisar de las nuevas a los clientes de /events
+    insignias_antes = insignias_usuario(user_email) if live_events.has_listeners(db.engine) else None
+    score = Score(questions=exam_results, exam_id=exam_id, user_email=user_email, elapsed_time=elapsed_time,
+                  seed=seed)
+    publicar_puntos(user_email, insignias_antes)
     return jsonify({'exam_results_id': score.results_id})
 
 
-@app.route('/exam_result', methods=['GET'])
+@api.route('/exam_result', methods=['GET'])
 def exam_result():
-    exam_result_obj = ResultadoExamen.query.get_or_404(int(request.args.get('exam_result_id')))
+    # Con el email (o el token) solo el dueño puede ver el resultado y se consulta solo su shard;
+    # sin él se busca por id, lo que solo es posible con una única base de resultados
+    email = cognito_auth.current_email()
+    if not email and user_shards.partitioned:
+        return jsonify({'message': 'Se requiere el usuario'}), 400
+    exam_result_obj = user_shards.find(ResultadoExamen, int(request.args.get('exam_result_id')), email=email)
+    if exam_result_obj is None:
+        abort(404)
     if exam_result_obj:
         return jsonify({
             'id': exam_result_obj.id,
@@ -884,17 +1624,275 @@ def exam_result():
     return jsonify({})
 
 
-@app.route('/extra_points', methods=['POST'])
+def estadistica_json(pregunta: Pregunta, contadores: dict) -> dict:
+    intentos = contadores['intentos']
+    selecciones = {letra: contadores[columna] for letra, columna in OPCIONES_ESTADISTICA.items()}
+    proporcion = contadores['correctas'] / intentos if intentos else None
+    dificultad = None
+    if intentos >= DIFICULTAD_MINIMO_INTENTOS:
+        dificultad = 'facil' if proporcion >= DIFICULTAD_FACIL else 'dificil' if proporcion <= DIFICULTAD_DIFICIL else 'adecuada'
+    distractores = [letra for letra in selecciones if letra != pregunta.respuesta_correcta]
+    return {
+        'pregunta_id': pregunta.id,
+        'enunciado': pregunta.enunciado,
+        'respuesta_correcta': pregunta.respuesta_correcta,
+        'intentos': intentos,
+        'correctas': contadores['correctas'],
+        'proporcion_correctas': proporcion,
+        'dificultad': dificultad,
+        'selecciones': selecciones,
+        # Opciones incorrectas ordenadas de la más a la menos elegida
+        'distractores': sorted(distractores, key=lambda letra: selecciones[letra], reverse=True),
+        'tiempo_promedio_segundos': contadores['tiempo_acumulado'] / intentos if intentos else None,
+    }
+
+
+@api.route('/question_stats', methods=['GET'])
+def question_stats():
+    """
+    Dificultad y distractores de las preguntas de un examen (solo administradores).
+    Lee los contadores ya agregados más los incrementos aún no plegados: el costo depende de la
+    cantidad de preguntas y de los incrementos pendientes, no del total de intentos.
+    """
+    cognito_auth.require_group(current_app.config['ADMIN_GROUP'])
+    exam_id = int(request.args.get('exam_id'))
+    filas = db.session.query(Pregunta, EstadisticaPregunta).outerjoin(
+        EstadisticaPregunta, EstadisticaPregunta.pregunta_id == Pregunta.id
+    ).filter(Pregunta.examen_id == exam_id).order_by(Pregunta.id).all()
+    deltas = EstadisticaPreguntaDelta.__table__
+    pendientes = {fila.pregunta_id: fila for fila in db.session.execute(
+        select(deltas.c.pregunta_id, *[func.sum(deltas.c[columna]).label(columna) for columna in COLUMNAS_ESTADISTICA])
+        .where(deltas.c.pregunta_id.in_([pregunta.id for pregunta, _ in filas]))
+        .group_by(deltas.c.pregunta_id))}
+    preguntas = []
+    for pregunta, estadistica in filas:
+        pendiente = pendientes.get(pregunta.id)
+        contadores = {columna: (getattr(estadistica, columna) if estadistica else 0)
+                      + (getattr(pendiente, columna) or 0 if pendiente else 0) for columna in COLUMNAS_ESTADISTICA}
+        preguntas.append(estadistica_json(pregunta, contadores))
+    return jsonify({'exam_id': exam_id, 'preguntas': preguntas})
+
+
+@api.cli.command('fold-question-stats')
+def fold_question_stats_command():
+    """Suma a las estadísticas por pregunta los incrementos pendientes de los intentos recientes."""
+    click.echo(f'{plegar_estadisticas()} incrementos sumados.')
+
+
+@api.cli.command('rebuild-question-stats')
+def rebuild_question_stats_command():
+    """
+    Recalcula los contadores desde los resultados guardados. Los resultados anteriores a las
+    estadísticas no guardan la opción elegida: de ellos solo se cuentan intentos y correctas.
+    """
+    preguntas_por_enunciado = {
+        (examen_id, enunciado): pregunta_id
+        for pregunta_id, examen_id, enunciado in db.session.query(Pregunta.id, Pregunta.examen_id, Pregunta.enunciado)
+    }
+    contadores = {pregunta_id: {'pregunta_id': pregunta_id, 'intentos': 0, 'correctas': 0, 'opcion_a': 0,
+                                'opcion_b': 0, 'opcion_c': 0, 'opcion_d': 0, 'tiempo_acumulado': 0.0}
+                  for pregunta_id in preguntas_por_enunciado.values()}
+    query = select(ResultadoExamen.examen_id, ResultadoExamen.tiempo_total, ResultadoExamen.respuestas)
+    for examen_id, tiempo_total, respuestas in user_shards.scatter_stream(query, USER_POINTS_BATCH_SIZE):
+        preguntas = (respuestas or {}).get('questions') or []
+        for pregunta in preguntas:
+            pregunta_id = pregunta.get('pregunta_id') or preguntas_por_enunciado.get(
+                (examen_id, pregunta.get('enunciado_pregunta')))
+            contador = contadores.get(pregunta_id)
+            if contador is None:
+                continue
+            contador['intentos'] += 1
+            contador['correctas'] += int(pregunta.get('respuesta') == 'correcta')
+            # tiempo_total se guarda en minutos
+            contador['tiempo_acumulado'] += (tiempo_total or 0) * 60 / len(preguntas)
+            columna = OPCIONES_ESTADISTICA.get(pregunta.get('opcion_seleccionada'))
+            if columna:
+                contador[columna] += 1
+    # Los incrementos pendientes ya están contados en los resultados
+    db.session.query(EstadisticaPreguntaDelta).delete()
+    db.session.query(EstadisticaPregunta).delete()
+    if contadores:
+        db.session.execute(insert(EstadisticaPregunta.__table__), list(contadores.values()))
+    db.session.commit()
+    click.echo(f'Estadísticas recalculadas para {len(contadores)} preguntas.')
+
+
+def respuestas_recalificadas(respuestas: dict, clave: dict, por_enunciado: dict, presente_fila, correctas_fila,
+                             validas: int, puntaje: float) -> dict:
+    """
+    Copia de ``ResultadoExamen.respuestas`` con la nueva calificación de cada pregunta recalificada
+    (``presente_fila`` y ``correctas_fila`` son la fila del envío en las matrices de ``regrade``).
+    """
+    preguntas = []
+    for pregunta in respuestas.get('questions') or []:
+        respuesta = clave.get(pregunta.get('pregunta_id') or por_enunciado.get(pregunta.get('enunciado_pregunta')))
+        if respuesta is not None and presente_fila[respuesta['columna']]:
+            correcta = bool(correctas_fila[respuesta['columna']])
+            pregunta = dict(pregunta, respuesta='correcta' if correcta else 'incorrecta',
+                            respuesta_correcta=respuesta['respuesta_correcta'] if correcta else respuesta['texto_correcto'],
+                            opcion_correcta=respuesta['respuesta_correcta'])
+        preguntas.append(pregunta)
+    return dict(respuestas, questions=preguntas, valid_questions=validas,
+                invalid_questions=len(preguntas) - validas, points=puntaje)
+
+
+def recalificar_examen(exam_id: int, batch_size: int = 1000, dry_run: bool = False) -> dict:
+    """
+    Vuelve a calificar todos los resultados guardados del examen con su clave de respuestas actual.
+    Escribe en lotes solo los resultados que cambian y ajusta las respuestas correctas de las
+    estadísticas por pregunta; los totales de puntos se calculan de los resultados, así que solo se
+    invalidan las cachés de los usuarios afectados y se les envía el nuevo total por ``/events``.
+
+    Cada fila se actualiza solo si su puntaje y su fecha siguen siendo los que se leyeron: si el
+    usuario volvió a enviar el examen mientras tanto, su envío nuevo ya se calificó con la clave
+    actual y no se pisa (se cuenta en ``omitidos``).
+    """
+    # NumPy solo se carga para este comando, no al arrancar la app
+    import regrade
+
+    started = time.monotonic()
+    examen = db.session.get(Examen, exam_id)
+    if examen is None:
+        raise click.ClickException(f'No existe el examen {exam_id}')
+    preguntas = Pregunta.query.filter_by(examen_id=exam_id).order_by(Pregunta.id).all()
+    clave = clave_respuestas(preguntas)
+    for columna, pregunta in enumerate(preguntas):
+        clave[pregunta.id]['columna'] = columna
+    columnas = {pregunta.id: columna for columna, pregunta in enumerate(preguntas)}
+
+    query = select(ResultadoExamen.id, ResultadoExamen.usuario_email, ResultadoExamen.respuestas,
+                   ResultadoExamen.semilla, ResultadoExamen.puntaje,
+                   ResultadoExamen.fecha_realizacion).where(ResultadoExamen.examen_id == exam_id)
+    filas = list(user_shards.scatter_stream(query, batch_size))
+    por_enunciado = {pregunta.enunciado: pregunta.id for pregunta in preguntas}
+    textos = []
+    for pregunta in preguntas:
+        por_texto = {}
+        for opcion in regrade.OPCIONES:
+            por_texto.setdefault(texto_opcion(pregunta, opcion), []).append(regrade.codigo_opcion(opcion))
+        # Un texto repetido (p. ej. "Ninguna") no dice con qué opción se calificó
+        textos.append({texto: codigos[0] for texto, codigos in por_texto.items() if len(codigos) == 1})
+    envios = regrade.Envios([fila.respuestas for fila in filas], columnas, por_enunciado, textos)
+    loaded = time.monotonic()
+
+    sorteadas = min(examen.preguntas_por_intento, len(preguntas)) if examen.preguntas_por_intento else 0
+    calificacion = regrade.Recalificacion(
+        envios, [pregunta.respuesta_correcta for pregunta in preguntas],
+        [fila.semilla is not None for fila in filas], sorteadas, [fila.puntaje for fila in filas])
+    cambiados = calificacion.cambiados.tolist()
+    graded = time.monotonic()
+
+    resumen = {
+        'examen_id': exam_id,
+        'resultados': len(filas),
+        'cambiados': len(cambiados),
+        'puntajes_cambiados': calificacion.puntajes_cambiados,
+        'usuarios_afectados': len({filas[i].usuario_email for i in cambiados}),
+        'diferencia_puntos': round(calificacion.diferencia_puntos, 2),
+        'segundos_carga': round(loaded - started, 3),
+        'segundos_calificacion': round(graded - loaded, 3),
+    }
+    if dry_run:
+        return resumen
+
+    tabla = ResultadoExamen.__table__
+    actualizar = update(tabla).where(
+        tabla.c.id == bindparam('fila_id'), tabla.c.puntaje == bindparam('puntaje_leido'),
+        tabla.c.fecha_realizacion == bindparam('fecha_leida'),
+    ).values(puntaje=bindparam('puntaje_nuevo'), respuestas=bindparam('respuestas_nuevas'))
+    lotes = {}
+    for i in cambiados:
+        lotes.setdefault(user_shards.session_for(filas[i].usuario_email), []).append(i)
+    omitidos = []
+    for sesion, indices in lotes.items():
+        for inicio in range(0, len(indices), batch_size):
+            for i in indices[inicio:inicio + batch_size]:
+                fila = filas[i]
+                # Una fila a la vez para saber cuáles cambiaron desde que se leyeron
+                resultado = sesion.execute(actualizar, {
+                    'fila_id': fila.id, 'puntaje_leido': fila.puntaje, 'fecha_leida': fila.fecha_realizacion,
+                    'puntaje_nuevo': float(calificacion.puntajes[i]),
+                    'respuestas_nuevas': respuestas_recalificadas(
+                        fila.respuestas or {}, clave, por_enunciado, envios.presente[i], calificacion.correctas[i],
+                        int(calificacion.validas[i]), float(calificacion.puntajes[i])),
+                })
+                if not resultado.rowcount:
+                    omitidos.append(i)
+            sesion.commit()
+    resumen['omitidos'] = len(omitidos)
+
+    # Las filas omitidas no se recalificaron: sus respuestas no cambian las estadísticas
+    diferencias = calificacion.diferencia_correctas
+    if omitidos:
+        diferencias = diferencias - calificacion.diferencia_por_envio[omitidos].sum(axis=0)
+    diferencias = diferencias.tolist()
+    ajustes = [{'id_pregunta': pregunta.id, 'diferencia': diferencias[columna]}
+               for columna, pregunta in enumerate(preguntas) if diferencias[columna]]
+    if ajustes:
+        # Como un incremento más: no toca las filas de contadores y cuenta aunque aún no existan
+        db.session.execute(insert(EstadisticaPreguntaDelta.__table__), [
+            {'pregunta_id': ajuste['id_pregunta'], 'correctas': ajuste['diferencia'], 'intentos': 0, 'opcion_a': 0,
+             'opcion_b': 0, 'opcion_c': 0, 'opcion_d': 0, 'tiempo_acumulado': 0} for ajuste in ajustes])
+        db.session.commit()
+    omitidos = set(omitidos)
+    for email in {filas[i].usuario_email for i in cambiados if i not in omitidos}:
+        shared_cache.invalidate_user(email)
+        publicar_puntos(email)
+    resumen['segundos'] = round(time.monotonic() - started, 3)
+    return resumen
+
+
+@api.cli.command('regrade-exam')
+@click.argument('exam_id', type=int)
+@click.option('--batch-size', default=1000, show_default=True, help='Resultados actualizados por transacción.')
+@click.option('--dry-run', is_flag=True, help='Solo informa cuántos resultados cambiarían.')
+def regrade_exam_command(exam_id, batch_size, dry_run):
+    """Recalifica los resultados guardados del examen después de corregir su clave de respuestas."""
+    click.echo(json.dumps(recalificar_examen(exam_id, batch_size, dry_run), ensure_ascii=False))
+
+
+@api.route('/admission_metrics', methods=['GET'])
+def admission_metrics():
+    """
+    Contadores del control de admisión de este worker (admitidas, rechazadas, en curso, en cola).
+    """
+    return jsonify(admission_control.metrics())
+
+
+@api.route('/slow_queries', methods=['GET'])
+def slow_queries():
+    """
+    Últimas consultas lentas de este worker con sus planes (solo administradores, requiere SLOW_QUERY_MS).
+    """
+    cognito_auth.require_group(current_app.config['ADMIN_GROUP'])
+    return jsonify({'umbral_ms': slow_query_log.threshold, 'consultas': list(slow_query_log.recent)})
+
+
+@api.route('/cache_metrics', methods=['GET'])
+def cache_metrics():
+    """
+    Aciertos y fallos de la caché compartida de resultados por usuario y del conjunto de puntos
+    extra otorgados en este worker.
+    """
+    return jsonify({'resultados_usuario': shared_cache.metrics(), 'puntos_extra': awarded_points.metrics()})
+
+
+@api.route('/extra_points', methods=['POST'])
 def extra_points():
     data = request.json
     articulo_id = data.get('articleId')
-    email = data.get('userEmail')
+    email = cognito_auth.current_email(data)
+    ya_otorgado = jsonify({"message": 'Ya tienes puntos por este contenido', "extrapoints": False})
+    # La mayoría de las llamadas son repeticiones y se responden sin consultar la base
+    if (email, articulo_id) in awarded_points:
+        return ya_otorgado
     article = Articulo.query.get_or_404(articulo_id)
     if article.tipo == "video":
         puntaje = 100
     else:
         puntaje = 60
-    ultimo_puntaje = PuntajeUsuarioExtraArticulos.query.filter_by(
+    sesion = user_shards.session_for(email)
+    ultimo_puntaje = sesion.query(PuntajeUsuarioExtraArticulos).filter_by(
         usuario_email=email, articulo_id=articulo_id).first()
     if not ultimo_puntaje:
         puntaje_usuario = PuntajeUsuarioExtraArticulos(
@@ -902,20 +1900,36 @@ def extra_points():
             articulo_id=articulo_id,
             puntaje=puntaje
         )
-        db.session.add(puntaje_usuario)
-        db.session.commit()
+        sesion.add(puntaje_usuario)
+        try:
+            sesion.commit()
+        except IntegrityError:
+            # Otra petición del mismo usuario otorgó los puntos primero
+            sesion.rollback()
+            awarded_points.add(email, articulo_id)
+            return ya_otorgado
+        awarded_points.add(email, articulo_id)
+        shared_cache.invalidate_user(email)
+        publicar_puntos(email)
         return jsonify({"message": f'Ganaste {puntaje} puntos por acceder a este contenido!', "extrapoints": True})
-    return jsonify({"message": 'Ya tienes puntos por este contenido', "extrapoints": False})
+    awarded_points.add(email, articulo_id)
+    return ya_otorgado
 
 
 def listar_cursos_por_usuario(email_usuario):
-    cursos = db.session.query(Curso).join(Articulo).join(Examen).join(ResultadoExamen).filter(
-        ResultadoExamen.usuario_email == email_usuario
+    # Los resultados están en el shard del usuario y el catálogo en la base principal
+    examenes_ids = examenes_realizados(email_usuario)
+    if not examenes_ids:
+        return []
+    cursos = db.session.query(Curso).join(Articulo).join(Examen).filter(
+        Examen.id.in_(examenes_ids)
     ).distinct().all()
     return cursos
 
 
 def usuario_realizo_todos_los_examenes_de_curso(email_usuario:str, cursos):
+    # Obtener todos los exámenes realizados por el usuario
+    examenes_usuario_ids = examenes_realizados(email_usuario)
     for curso in cursos:
         curso_id = curso.id
         # Obtener todos los exámenes del curso
@@ -924,12 +1938,6 @@ def usuario_realizo_todos_los_examenes_de_curso(email_usuario:str, cursos):
         ).all()
         examenes_curso_ids = {examen.id for examen in examenes_curso}
 
-        # Obtener todos los exámenes realizados por el usuario
-        examenes_usuario = db.session.query(ResultadoExamen.examen_id).filter_by(
-            usuario_email=email_usuario
-        ).all()
-        examenes_usuario_ids = {examen.examen_id for examen in examenes_usuario}
-
         # Verificar si todos los exámenes del curso fueron realizados por el usuario
         todos_exámenes_realizados = examenes_curso_ids.issubset(examenes_usuario_ids)
         if todos_exámenes_realizados:
@@ -937,12 +1945,22 @@ def usuario_realizo_todos_los_examenes_de_curso(email_usuario:str, cursos):
     return False
 
 
-@app.route('/calculate_badges', methods=['GET'])
+@api.route('/calculate_badges', methods=['GET'])
+@coalesce
 def calculate_badges():
-    email = request.args.get('userEmail')
+    email = cognito_auth.current_email()
+    return jsonify(insignias_usuario(email))
+
+
+def insignias_usuario(email: str) -> dict:
+    return shared_cache.get_or_compute('insignias', email, lambda: calcular_insignias(email))
+
+
+def calcular_insignias(email: str) -> dict:
     badges = []
     total_badges = 30
-    resultado_examen = ResultadoExamen.query.filter_by(usuario_email=email).first()
+    sesion = user_shards.session_for(email)
+    resultado_examen = sesion.query(ResultadoExamen).filter_by(usuario_email=email).first()
     if resultado_examen:
         badges.append({
             "name": "Principiante",
@@ -959,7 +1977,7 @@ def calculate_badges():
                 "level": 2
             })
     if resultado_examen:
-        tiempo_record = ResultadoExamen.query.filter(
+        tiempo_record = sesion.query(ResultadoExamen).filter(
             ResultadoExamen.usuario_email == email,
             ResultadoExamen.tiempo_total >= 20000).first()
         if tiempo_record:
@@ -969,77 +1987,590 @@ def calculate_badges():
                 "level": 3
             })
     percentage_text = int((len(badges)/total_badges)*100) if badges else 0
-    return jsonify({
+    return {
         "badges": badges,
         "total_badges": len(badges),
         "percentage_badge_score": len(badges)/total_badges if badges else 0,
         "percentage_text": f"{percentage_text}%"
-    })
+    }
 
 
-@app.route('/progress_chart_data', methods=['GET'])
+@api.route('/progress_chart_data', methods=['GET'])
+@coalesce
 def progress_chart_data():
-    email = request.args.get('userEmail')
-    result_exams = ResultadoExamen.query.filter_by(usuario_email=email).all()
+    email = cognito_auth.current_email()
+    return jsonify(shared_cache.get_or_compute('progreso', email, lambda: datos_grafica_progreso(email)))
+
+
+def datos_grafica_progreso(email: str) -> dict:
+    result_exams = user_shards.session_for(email).query(ResultadoExamen).filter_by(usuario_email=email).all()
+    # Los títulos salen del catálogo (la relación examen no cruza de un shard a la base principal)
+    titulos = dict(db.session.query(Examen.id, Examen.titulo).filter(
+        Examen.id.in_({result_exam.examen_id for result_exam in result_exams})).all()) if result_exams else {}
     chart_data_points = []
     chart_data_labels = []
     for result_exam in result_exams:
         chart_data_points.append(result_exam.puntaje)
-        chart_data_labels.append(result_exam.examen.titulo[:10])
+        chart_data_labels.append(titulos[result_exam.examen_id][:10])
     if not chart_data_labels:
         chart_data_labels = [""]
         chart_data_points = [0]
-    return jsonify({
+    return {
         "chart_data_points": chart_data_points,
         "chart_data_labels": chart_data_labels
-    })
+    }
 
 
 def get_points(email: str):
-    result_exams = ResultadoExamen.query.filter_by(usuario_email=email).all()
-    total_points_exam = sum(exam_point.puntaje for exam_point in result_exams)
-    result_extra_points = PuntajeUsuarioExtraArticulos.query.filter_by(usuario_email=email).all()
-    total_points_extra_points = sum(extra_point.puntaje for extra_point in result_extra_points)
+    return shared_cache.get_or_compute('puntos', email, lambda: sumar_puntos(email))
+
+
+def sumar_puntos(email: str) -> int:
+    sesion = user_shards.session_for(email)
+    total_points_exam = sesion.scalar(
+        select(func.coalesce(func.sum(ResultadoExamen.puntaje), 0)).filter_by(usuario_email=email))
+    total_points_extra_points = sesion.scalar(
+        select(func.coalesce(func.sum(PuntajeUsuarioExtraArticulos.puntaje), 0)).filter_by(usuario_email=email))
     return int(total_points_exam + total_points_extra_points)
 
 
-@app.route('/total_points', methods=['GET'])
+@api.route('/total_points', methods=['GET'])
+@coalesce
 def total_points():
     """
     Cantidad de puntos por Exmanen + Puntos extras por leer los articulos
     """
-    email = request.args.get('userEmail')
+    email = cognito_auth.current_email()
     return jsonify({
         "total_points": get_points(email=email),
     })
 
 
-@app.route('/user_points', methods=['GET'])
+def publicar_puntos(email: str, insignias_antes: dict = None):
+    """
+    Envía el nuevo total (y las insignias que se acaban de ganar) a los clientes de ``/events``.
+    """
+    if not live_events.should_publish(db.engine):
+        return
+    nuevas = []
+    if insignias_antes is not None:
+        ganadas = {insignia['name'] for insignia in insignias_antes['badges']}
+        nuevas = [insignia for insignia in insignias_usuario(email)['badges'] if insignia['name'] not in ganadas]
+    live_events.publish(db.engine, email, get_points(email), nuevas, total_ranking(email))
+
+
+@api.route('/events', methods=['GET'])
+@sin_lote
+def events():
+    """
+    Server-Sent Events con los puntos, insignias nuevas y posición en el ranking del usuario.
+    """
+    email = cognito_auth.current_email()
+    if not email:
+        return jsonify({'message': 'Se requiere el usuario'}), 400
+    return live_events.stream(db.engine, email, get_points(email))
+
+
+@api.route('/events_metrics', methods=['GET'])
+def events_metrics():
+    return jsonify(live_events.metrics())
+
+
+@api.route('/user_points', methods=['GET'])
 def user_points():
     """
-    Cantidad de puntos por Exmanen + Puntos extras por leer los articulos
+    Cantidad de puntos por Exmanen + Puntos extras por leer los articulos.
+    Se calcula en una sola consulta agregada por shard (todos los datos de un usuario están en
+    el mismo shard), que corren en paralelo y se envían en streaming desde cursores del servidor.
     """
-    user_points_list = []
-    emails = db.session.query(ResultadoExamen.usuario_email).distinct().all()
-
-    # examenes_curso = db.session.query(Examen.id).join(Articulo).filter(
-    #     Articulo.curso_id == curso_id
-    # ).all()
-    # examenes_curso_ids = {examen.id for examen in examenes_curso}
-    #
-    # # Obtener todos los exámenes realizados por el usuario
-    # examenes_usuario = db.session.query(ResultadoExamen.examen_id).filter_by(
-    #     usuario_email=email_usuario
-    # ).all()
-    # examenes_usuario_ids = {examen.examen_id for examen in examenes_usuario}
-    #
-    # # Verificar si todos los exámenes del curso fueron realizados por el usuario
-    # todos_exámenes_realizados = examenes_curso_ids.issubset(examenes_usuario_ids)
-    if emails:
-        email_list = [email[0] for email in emails]
-        for email in email_list:
-            user_points_list.append({
-                "email": email.split("@")[0],
-                "total_points": get_points(email=email)
-            })
-    return jsonify({"users_points": user_points_list})
+    user_points_list = (
+        {
+            "email": email.split("@")[0],
+            "total_points": total
+        }
+        for email, total in filas_ranking()
+    )
+    return stream_json_array(user_points_list, key="users_points")
+
+
+def consulta_ranking(email: str = None):
+    """
+    Usuarios del ranking (los que tienen algún examen) con sus puntos de exámenes y extra. Es la
+    misma consulta para ``/user_points`` y para el ranking en memoria de ``/events``.
+    """
+    puntos_examenes = select(
+        ResultadoExamen.usuario_email.label('email'),
+        func.sum(ResultadoExamen.puntaje).label('puntos')
+    ).group_by(ResultadoExamen.usuario_email)
+    puntos_extra = select(
+        PuntajeUsuarioExtraArticulos.usuario_email.label('email'),
+        func.sum(PuntajeUsuarioExtraArticulos.puntaje).label('puntos')
+    ).group_by(PuntajeUsuarioExtraArticulos.usuario_email)
+    if email is not None:
+        puntos_examenes = puntos_examenes.where(ResultadoExamen.usuario_email == email)
+        puntos_extra = puntos_extra.where(PuntajeUsuarioExtraArticulos.usuario_email == email)
+    puntos_examenes = puntos_examenes.subquery()
+    puntos_extra = puntos_extra.subquery()
+    return select(
+        puntos_examenes.c.email,
+        puntos_examenes.c.puntos,
+        func.coalesce(puntos_extra.c.puntos, 0)
+    ).outerjoin(puntos_extra, puntos_extra.c.email == puntos_examenes.c.email)
+
+
+def filas_ranking():
+    """
+    Pares ``(email, total de puntos)`` de todos los usuarios con algún examen.
+    """
+    for email, total_examenes, total_extra in user_shards.scatter_stream(consulta_ranking(), USER_POINTS_BATCH_SIZE):
+        yield email, int(total_examenes + total_extra)
+
+
+def total_ranking(email: str):
+    """
+    Total del usuario en el ranking, o ``None`` si todavía no entra (no tiene exámenes).
+    """
+    fila = user_shards.session_for(email).execute(consulta_ranking(email)).first()
+    return int(fila[1] + fila[2]) if fila else None
+
+
+EXPORT_RESULTS_HEADER = ['especializacion', 'bloque', 'curso', 'articulo', 'examen', 'usuario_email',
+                         'puntaje', 'tiempo_total', 'fecha_realizacion']
+EXPORT_EXTRA_POINTS_HEADER = ['especializacion', 'bloque', 'curso', 'articulo', 'tipo', 'usuario_email', 'puntaje']
+
+
+def mapa_catalogo(especializacion: str = None):
+    """
+    Ruta del catálogo de cada examen y de cada artículo (el catálogo es pequeño). Los resultados
+    están en los shards, así que no se pueden unir en SQL.
+    """
+    ruta = (Especializacion.nombre, BloqueCurso.nombre, Curso.nombre)
+
+    def con_ruta(query):
+        query = query.outerjoin(Curso, Curso.id == Articulo.curso_id)
+        query = query.outerjoin(BloqueCurso, BloqueCurso.id == Curso.bloque_curso_id)
+        query = query.outerjoin(Especializacion, Especializacion.id == BloqueCurso.especializacion_id)
+        if especializacion:
+            query = query.filter(Especializacion.nombre == especializacion)
+        return query
+
+    # Hay exámenes que no pertenecen a ningún artículo
+    examenes = {
+        examen_id: (esp, bloque, curso, articulo, examen)
+        for esp, bloque, curso, articulo, examen_id, examen in con_ruta(
+            db.session.query(*ruta, Articulo.titulo, Examen.id, Examen.titulo).select_from(Examen).outerjoin(
+                Articulo, Articulo.id == Examen.articulo_id))
+    }
+    articulos = {
+        articulo_id: (esp, bloque, curso, articulo, tipo)
+        for esp, bloque, curso, articulo_id, articulo, tipo in con_ruta(
+            db.session.query(*ruta, Articulo.id, Articulo.titulo, Articulo.tipo).select_from(Articulo))
+    }
+    return examenes, articulos
+
+
+def filas_resultados(examenes: dict):
+    query = select(
+        ResultadoExamen.examen_id, ResultadoExamen.usuario_email, ResultadoExamen.puntaje,
+        ResultadoExamen.tiempo_total, ResultadoExamen.fecha_realizacion
+    ).where(ResultadoExamen.examen_id.in_(list(examenes)))
+    for examen_id, email, puntaje, tiempo_total, fecha in user_shards.scatter_stream(query, USER_POINTS_BATCH_SIZE):
+        yield examenes[examen_id] + (email, puntaje, tiempo_total, fecha)
+
+
+def filas_puntos_extra(articulos: dict):
+    query = select(
+        PuntajeUsuarioExtraArticulos.articulo_id, PuntajeUsuarioExtraArticulos.usuario_email,
+        PuntajeUsuarioExtraArticulos.puntaje
+    ).where(PuntajeUsuarioExtraArticulos.articulo_id.in_(list(articulos)))
+    for articulo_id, email, puntaje in user_shards.scatter_stream(query, USER_POINTS_BATCH_SIZE):
+        yield articulos[articulo_id] + (email, puntaje)
+
+
+def total_filas_exportacion(examenes: dict, articulos: dict) -> int:
+    """
+    Filas que tendría la exportación, contadas en cada shard sin leerlas.
+    """
+    consultas = (
+        select(func.count()).select_from(ResultadoExamen).where(ResultadoExamen.examen_id.in_(list(examenes))),
+        select(func.count()).select_from(PuntajeUsuarioExtraArticulos).where(
+            PuntajeUsuarioExtraArticulos.articulo_id.in_(list(articulos))),
+    )
+    return sum(sesion.scalar(consulta) for sesion in user_shards.sessions() for consulta in consultas)
+
+
+def hojas_exportacion(especializacion: str = None, catalogo: tuple = None):
+    examenes, articulos = catalogo or mapa_catalogo(especializacion)
+    return [
+        ('resultados_examenes', EXPORT_RESULTS_HEADER, filas_resultados(examenes)),
+        ('puntos_extra', EXPORT_EXTRA_POINTS_HEADER, filas_puntos_extra(articulos)),
+    ]
+
+
+@api.route('/export_results', methods=['GET'])
+@sin_lote
+def export_results():
+    """
+    Exporta resultados de exámenes y puntos extra (solo administradores).
+    Parámetros: formato=csv|xlsx, especializacion (opcional) y, para CSV, datos=examenes|puntos_extra.
+    El CSV se envía mientras se lee; el XLSX se arma en el worker, así que solo se acepta hasta
+    ``EXPORT_XLSX_MAX_ROWS`` filas (más grandes: CSV o el comando ``export-results``).
+    """
+    cognito_auth.require_group(current_app.config['ADMIN_GROUP'])
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        return jsonify({'message': 'formato debe ser csv o xlsx'}), 400
+    especializacion = request.args.get('especializacion')
+    if formato == 'xlsx':
+        catalogo = mapa_catalogo(especializacion)
+        limite = current_app.config['EXPORT_XLSX_MAX_ROWS']
+        if total_filas_exportacion(*catalogo) > limite:
+            return jsonify({'message': f'El XLSX tendría más de {limite} filas; use formato=csv o el comando '
+                                       f'export-results'}), 400
+        return export_response(xlsx_chunks(hojas_exportacion(catalogo=catalogo)), 'resultados.xlsx', XLSX_MIMETYPE)
+    hojas = hojas_exportacion(especializacion)
+    titulo, encabezados, filas = hojas[1] if request.args.get('datos') == 'puntos_extra' else hojas[0]
+    return export_response(csv_chunks(encabezados, filas), f'{titulo}.csv', CSV_MIMETYPE)
+
+
+@api.cli.command('export-results')
+@click.argument('output', type=click.Path(dir_okay=False, writable=True))
+@click.option('--especializacion', default=None, help='Nombre de la especialización a exportar.')
+@click.option('--datos', type=click.Choice(['examenes', 'puntos_extra']), default='examenes', show_default=True,
+              help='Tabla a exportar en CSV (el XLSX incluye ambas en hojas separadas).')
+def export_results_command(output, especializacion, datos):
+    """Exporta resultados a OUTPUT (.csv o .xlsx según la extensión)."""
+    hojas = hojas_exportacion(especializacion)
+    if output.endswith('.xlsx'):
+        write_xlsx(output, hojas)
+    else:
+        titulo, encabezados, filas = hojas[1] if datos == 'puntos_extra' else hojas[0]
+        with open(output, 'wb') as target:
+            write_csv(target, encabezados, filas)
+    click.echo(f'Exportación guardada en {output}')
+
+
+def item_dynamo(pk: str, sk: str, **attributes) -> dict:
+    # DynamoDB no guarda atributos vacíos: se omiten igual que en utils/fill_tables.py
+    item = {'pk': pk, 'sk': sk}
+    item.update({key: value for key, value in attributes.items() if value not in (None, '')})
+    return item
+
+
+def filas_en_streaming(statement):
+    return db.session.execute(statement.execution_options(stream_results=True, yield_per=USER_POINTS_BATCH_SIZE))
+
+
+def items_educational_data():
+    """
+    Ítems de ``educational_data`` (mismo formato que utils/fill_tables.py) a partir del catálogo.
+    """
+    for especializacion in filas_en_streaming(select(Especializacion)).scalars():
+        yield item_dynamo(f'especializacion#{especializacion.id}', 'metadata', relation_id='N/A',
+                          type='especializacion', nombre=especializacion.nombre)
+    for bloque in filas_en_streaming(select(BloqueCurso)).scalars():
+        yield item_dynamo(f'bloque_curso#{bloque.id}', 'metadata', relation_id=f'especializacion#{bloque.especializacion_id}',
+                          type='bloque_curso', nombre=bloque.nombre, contenido=bloque.contenido)
+    for curso in filas_en_streaming(select(Curso)).scalars():
+        yield item_dynamo(f'curso#{curso.id}', 'metadata', relation_id=f'bloque_curso#{curso.bloque_curso_id}',
+                          type='curso', nombre=curso.nombre, contenido=curso.contenido)
+    for articulo in filas_en_streaming(select(Articulo)).scalars():
+        yield item_dynamo(f'articulo#{articulo.id}', 'metadata', relation_id=f'curso#{articulo.curso_id}',
+                          type='articulo', nombre=articulo.titulo, contenido=articulo.contenido,
+                          url_contenido=articulo.url_contenido, tipo=articulo.tipo)
+    for examen in filas_en_streaming(select(Examen)).scalars():
+        relation_id = f'articulo#{examen.articulo_id}' if examen.articulo_id else 'N/A'
+        yield item_dynamo(f'examen#{examen.id}', 'metadata', relation_id=relation_id, type='examen', nombre=examen.titulo)
+    for pregunta in filas_en_streaming(select(Pregunta)).scalars():
+        yield item_dynamo(f'pregunta#{pregunta.id}', 'metadata', relation_id=f'examen#{pregunta.examen_id}',
+                          type='pregunta', nombre=pregunta.enunciado, data=datos_pregunta_dynamo(pregunta))
+
+
+def datos_pregunta_dynamo(pregunta: Pregunta) -> dict:
+    return {
+        'enunciado': pregunta.enunciado,
+        'opciones': [pregunta.opcion_a, pregunta.opcion_b, pregunta.opcion_c, pregunta.opcion_d],
+        'respuesta_correcta': texto_opcion(pregunta, pregunta.respuesta_correcta),
+    }
+
+
+def items_exams_data():
+    """
+    Ítems de ``exams_data``: cada examen (sk ``metadata``) y sus preguntas (sk ``pregunta#<id>``)
+    con ``curso_id`` para el índice ``gsi_exam``. Los exámenes sin curso no entran en el índice.
+    """
+    examenes = filas_en_streaming(select(Examen, Articulo.curso_id).outerjoin(
+        Articulo, Articulo.id == Examen.articulo_id).order_by(Examen.id))
+    for examen, curso_id in examenes:
+        yield item_dynamo(f'examen#{examen.id}', 'metadata', curso_id=f'curso#{curso_id}' if curso_id else None,
+                          titulo=examen.titulo, articulo_id=f'articulo#{examen.articulo_id}' if examen.articulo_id else None)
+    preguntas = filas_en_streaming(select(Pregunta, Articulo.curso_id).join(
+        Examen, Examen.id == Pregunta.examen_id).outerjoin(Articulo, Articulo.id == Examen.articulo_id).order_by(Pregunta.id))
+    for pregunta, curso_id in preguntas:
+        yield item_dynamo(f'examen#{pregunta.examen_id}', f'pregunta#{pregunta.id}',
+                          curso_id=f'curso#{curso_id}' if curso_id else None, data=datos_pregunta_dynamo(pregunta))
+
+
+@api.cli.command('sync-dynamodb')
+@click.option('--segments', default=DEFAULT_SEGMENTS, show_default=True, help='Segmentos (hilos) del Scan paralelo.')
+@click.option('--dry-run', is_flag=True, help='Solo informa las diferencias.')
+@click.option('--delete-extra', is_flag=True, help='Borra de DynamoDB los ítems que no existen en Postgres.')
+@click.option('--table', 'tables', multiple=True, type=click.Choice(['educational_data', 'exams_data']),
+              help='Tabla a sincronizar (por defecto ambas).')
+def sync_dynamodb_command(segments, dry_run, delete_extra, tables):
+    """Sincroniza las tablas de DynamoDB con el catálogo de Postgres escribiendo solo las diferencias."""
+    sync = DynamoSync(endpoint_url=current_app.config['DYNAMODB_ENDPOINT_URL'], segments=segments,
+                      dry_run=dry_run, delete_extra=delete_extra)
+    generadores = {'educational_data': items_educational_data, 'exams_data': items_exams_data}
+    for table in tables or generadores:
+        stats = sync.sync_table(table, generadores[table]())
+        click.echo(json.dumps(stats, ensure_ascii=False))
+
+
+@api.cli.command('rebalance-shards')
+@click.option('--batch-size', default=500, show_default=True, help='Usuarios que se mueven por transacción.')
+@click.option('--dry-run', is_flag=True, help='Solo cuenta lo que se movería.')
+def rebalance_shards_command(batch_size, dry_run):
+    """Mueve los resultados de cada usuario al shard que le corresponde según SHARD_URIS."""
+    if not user_shards.enabled:
+        click.echo('No hay shards configurados (SHARD_URIS / db_shard_uris).')
+        return
+    # Los shards nuevos todavía no tienen tablas
+    user_shards.create_tables()
+    summary = user_shards.rebalance(batch_size=batch_size, dry_run=dry_run)
+    click.echo(f"{'Se moverían' if dry_run else 'Movidos'} {summary['usuarios_movidos']} usuarios "
+               f"({summary['filas_movidas']} filas).")
+
+
+PLAN_CHECK_EMAIL = 'plan-check-{}@example.invalid'
+# Vistas cuyos planes se revisan y tablas que pueden leer completas (``/user_points`` agrega todas
+# las filas). {email} es un usuario sintético y {especializacion}/{bloque} salen del catálogo.
+PLAN_CHECK_PATHS = {
+    '/list_blocks?especializacion_nombre={especializacion}&userEmail={email}': (),
+    '/list_courses?bloque_id={bloque}': (),
+    '/calculate_badges?userEmail={email}': (),
+    '/progress_chart_data?userEmail={email}': (),
+    '/total_points?userEmail={email}': (),
+    '/user_points': ('resultado_examen', 'puntaje_usuario'),
+}
+
+
+def insertar_datos_sinteticos(usuarios: int, batch_size: int = 5000):
+    """
+    Inserta ``usuarios`` usuarios ficticios, cada uno con un resultado por examen y puntos extra
+    por cada artículo, para revisar los planes con tablas grandes.
+    """
+    examenes = db.session.scalars(select(Examen.id)).all()
+    articulos = db.session.scalars(select(Articulo.id)).all()
+    rng = random.Random(0)
+    lotes = {}
+    for numero in range(usuarios):
+        email = PLAN_CHECK_EMAIL.format(numero)
+        resultados, puntos = lotes.setdefault(user_shards.session_for(email), ([], []))
+        resultados.extend({'usuario_email': email, 'examen_id': examen_id, 'puntaje': rng.choice((0, 40, 60, 80, 100)),
+                           'tiempo_total': rng.randint(1, 30)} for examen_id in examenes)
+        puntos.extend({'usuario_email': email, 'articulo_id': articulo_id, 'puntaje': 60} for articulo_id in articulos)
+    for sesion, (resultados, puntos) in lotes.items():
+        for model, filas in ((ResultadoExamen, resultados), (PuntajeUsuarioExtraArticulos, puntos)):
+            for inicio in range(0, len(filas), batch_size):
+                sesion.execute(insert(model), filas[inicio:inicio + batch_size])
+            sesion.commit()
+            # Estadísticas al día para que el planificador vea el tamaño real
+            sesion.execute(text(f'ANALYZE {model.__tablename__}'))
+            sesion.commit()
+
+
+def borrar_datos_sinteticos():
+    for sesion in user_shards.sessions():
+        for model in (ResultadoExamen, PuntajeUsuarioExtraArticulos):
+            sesion.query(model).filter(model.usuario_email.like(PLAN_CHECK_EMAIL.format('%'))).delete(
+                synchronize_session=False)
+        sesion.commit()
+
+
+def planes_de_vista(client, path: str, min_rows: int, permitidas=()) -> dict:
+    """
+    Ejecuta la vista y devuelve la forma del plan de cada SELECT distinto que hizo, con las tablas
+    grandes (al menos ``min_rows`` filas) que lee completas, salvo las ``permitidas``.
+    """
+    with slow_query_log.capture(db.engines.values()) as capturadas:
+        response = client.get(path)
+        response.get_data()
+    planes = {}
+    for engine, statement, parameters, _ in capturadas:
+        if not is_read(statement) or statement in planes:
+            continue
+        with engine.connect() as connection:
+            dbapi_connection = connection.connection.dbapi_connection
+            plan = explain(dbapi_connection, engine.dialect.name, statement, parameters, json_format=True)
+            # En SQLite las subconsultas también aparecen como SCAN; solo cuentan las tablas del modelo
+            grandes = [tabla for tabla in sequential_scans(plan, engine.dialect.name)
+                       if tabla in db.metadata.tables and tabla not in permitidas
+                       and table_rows(dbapi_connection, engine.dialect.name, tabla) >= min_rows]
+            connection.rollback()
+        planes[statement] = {'plan': plan_shape(plan, engine.dialect.name), 'seq_scans_grandes': grandes}
+    return {'status': response.status_code, 'consultas': planes}
+
+
+@api.cli.command('check-query-plans')
+@click.option('--synthetic-users', default=0, show_default=True,
+              help='Usuarios ficticios que se insertan antes de revisar (y se borran al terminar); requiere --scratch-db.')
+@click.option('--scratch-db', is_flag=True,
+              help='Confirma que la base (y sus shards) es desechable y se pueden insertar datos ficticios.')
+@click.option('--min-rows', default=10000, show_default=True, help='Filas a partir de las que una tabla es grande.')
+@click.option('--snapshot', type=click.Path(dir_okay=False), help='Guarda los planes en este archivo JSON.')
+@click.option('--compare', type=click.Path(exists=True, dir_okay=False),
+              help='Compara contra planes guardados antes con --snapshot.')
+def check_query_plans_command(synthetic_users, scratch_db, min_rows, snapshot, compare):
+    """Revisa los planes de las vistas principales: lecturas completas de tablas grandes y cambios de plan."""
+    if synthetic_users and not scratch_db:
+        # Las vistas se ejecutan como peticiones con sus propias conexiones: los datos ficticios tienen
+        # que quedar confirmados mientras se revisa, así que solo se insertan en una base desechable
+        raise click.UsageError('--synthetic-users inserta filas confirmadas en la base; úselo contra una copia '
+                               'desechable y agregue --scratch-db')
+    current_app.config['AUTH_REQUIRED'] = False
+    especializacion = db.session.scalar(select(Especializacion.nombre).order_by(Especializacion.id))
+    bloque = db.session.scalar(select(BloqueCurso.id).order_by(BloqueCurso.id))
+    if synthetic_users:
+        insertar_datos_sinteticos(synthetic_users)
+    # Sin caché para el usuario revisado: las vistas deben hacer sus consultas
+    shared_cache.invalidate_user(PLAN_CHECK_EMAIL.format(0))
+    client = current_app.test_client()
+    try:
+        planes = {
+            path: planes_de_vista(
+                client, path.format(email=PLAN_CHECK_EMAIL.format(0), especializacion=especializacion, bloque=bloque),
+                min_rows, permitidas)
+            for path, permitidas in PLAN_CHECK_PATHS.items()
+        }
+    finally:
+        if synthetic_users:
+            borrar_datos_sinteticos()
+
+    problemas = 0
+    for path, resultado in planes.items():
+        for statement, consulta in resultado['consultas'].items():
+            if consulta['seq_scans_grandes']:
+                problemas += 1
+                click.echo(f"[seq scan] {path}: {', '.join(consulta['seq_scans_grandes'])}\n  {statement}")
+    if compare:
+        with open(compare, encoding='utf-8') as source:
+            anteriores = json.load(source)
+        for path, resultado in planes.items():
+            for statement, consulta in resultado['consultas'].items():
+                anterior = anteriores.get(path, {}).get('consultas', {}).get(statement)
+                if anterior is not None and anterior['plan'] != consulta['plan']:
+                    problemas += 1
+                    click.echo(f'[plan cambió] {path}\n  {statement}\n  antes: {anterior["plan"]}\n  ahora: {consulta["plan"]}')
+    if snapshot:
+        with open(snapshot, 'w', encoding='utf-8') as target:
+            json.dump(planes, target, ensure_ascii=False, indent=2)
+    click.echo(f'{sum(len(resultado["consultas"]) for resultado in planes.values())} consultas revisadas, '
+               f'{problemas} problemas.')
+    if problemas:
+        click.get_current_context().exit(1)
+
+
+def warmup_caches():
+    """
+    Precarga el catálogo y las claves de respuesta de todos los exámenes en dos consultas,
+    para que el worker no haga esas consultas con tráfico real.
+    """
+    catalog_cache.set(('especializaciones',), cargar_especializaciones())
+    preguntas_por_examen = {}
+    for pregunta in Pregunta.query.order_by(Pregunta.id):
+        preguntas_por_examen.setdefault(pregunta.examen_id, []).append(pregunta)
+    for examen in Examen.query.all():
+        preguntas = preguntas_por_examen.get(examen.id, [])
+        catalog_cache.set(('examen', examen.id), resumen_examen(examen))
+        catalog_cache.set(('banco', examen.id), banco_preguntas((p.id, p.etiqueta) for p in preguntas))
+        catalog_cache.set(('answer_key', examen.id), clave_respuestas(preguntas))
+    cargar_puntos_otorgados()
+    db.session.remove()
+
+
+def cargar_puntos_otorgados():
+    """
+    Llena ``awarded_points`` con los puntos extra de todos los shards.
+    """
+    query = select(PuntajeUsuarioExtraArticulos.usuario_email, PuntajeUsuarioExtraArticulos.articulo_id)
+    awarded_points.load(tuple(row) for row in user_shards.scatter_stream(query, USER_POINTS_BATCH_SIZE))
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Construye la aplicación. La configuración de la base se lee aquí y no al importar el módulo;
+    el engine no abre conexiones hasta la primera consulta.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Configuración de Flask para asegurarse de que use UTF-8
+    app.config['JSON_AS_ASCII'] = False
+    app.config['WARMUP_ON_START'] = os.getenv('WARMUP_ON_START', '0') == '1'
+    app.config['CATALOG_CACHE_TTL'] = float(os.getenv('CATALOG_CACHE_TTL', '300'))
+    # Presupuesto de tiempo (segundos) para importar el módulo y construir la app
+    app.config['BOOT_TIME_BUDGET'] = float(os.getenv('BOOT_TIME_BUDGET', '2.0'))
+    app.config['DYNAMODB_ENDPOINT_URL'] = os.getenv('DYNAMODB_ENDPOINT_URL')
+    # Cada cuántos intentos un worker suma a las estadísticas por pregunta los incrementos pendientes
+    app.config['QUESTION_STATS_FOLD_EVERY'] = int(os.getenv('QUESTION_STATS_FOLD_EVERY', '200'))
+    # Firma las semillas de los exámenes y la cookie de read-your-writes; igual en todos los workers
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    # Tiempo (segundos) para enviar un intento de examen con sorteo desde que se pidió
+    app.config['EXAM_SEED_MAX_AGE'] = float(os.getenv('EXAM_SEED_MAX_AGE', str(24 * 3600)))
+    # El XLSX de /export_results se arma en el worker: más filas que esto deben exportarse con el comando
+    app.config['EXPORT_XLSX_MAX_ROWS'] = int(os.getenv('EXPORT_XLSX_MAX_ROWS', '50000'))
+    if config:
+        app.config.update(config)
+    if not app.config['SECRET_KEY']:
+        # Con preload_app la llave se genera antes del fork y la comparten los workers, pero no otras
+        # instancias ni reinicios (los intentos en curso se rechazarían)
+        logger.warning('Sin SECRET_KEY: se genera una llave temporal; configúrela en producción')
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+
+    db_router.init_app(app)
+    user_shards.init_app(app)
+    db.init_app(app)
+    slow_query_log.init_app(app, db)
+    compression.init_app(app)
+    catalog_search.init_app(app)
+    catalog_changes.init_app(app)
+    media_store.init_app(app)
+    cognito_auth.init_app(app)
+    admission_control.init_app(app)
+    shared_cache.init_app(app)
+    live_events.init_app(app, leaderboard_rows=filas_ranking)
+    catalog_cache.ttl = app.config['CATALOG_CACHE_TTL']
+    app.register_blueprint(api)
+
+    if app.config['WARMUP_ON_START']:
+        with app.app_context():
+            warmup_caches()
+
+    boot_time = _IMPORT_TIME + time.perf_counter() - started
+    app.config['BOOT_TIME'] = boot_time
+    if boot_time > app.config['BOOT_TIME_BUDGET']:
+        logger.warning('Arranque en %.3fs supera el presupuesto de %.3fs (import %.3fs)',
+                       boot_time, app.config['BOOT_TIME_BUDGET'], _IMPORT_TIME)
+    else:
+        logger.info('Arranque en %.3fs (import %.3fs)', boot_time, _IMPORT_TIME)
+    return app
+
+
+_IMPORT_TIME = time.perf_counter() - _IMPORT_STARTED
+_app = None
+
+
+def __getattr__(name):
+    """
+    Compatibilidad con ``gunicorn app:app``: la app se construye la primera vez que se pide.
+    """
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
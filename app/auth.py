@@ -0,0 +1,223 @@
+"""
+Verificación local de tokens JWT de Cognito.
+
+Las llaves públicas del user pool (JWKS) se descargan una vez y se refrescan periódicamente,
+o antes si llega un token firmado con un ``kid`` desconocido (rotación de llaves). Los tokens
+ya verificados se guardan en un LRU hasta que expiran, así que una petición autenticada no
+hace ninguna llamada de red ni vuelve a verificar la firma.
+
+La descarga del JWKS se hace fuera del candado del LRU y solo en un hilo a la vez; mientras tanto,
+y si la descarga falla, se siguen usando las llaves anteriores. Tras un fallo (o un ``kid``
+desconocido) no se vuelve a descargar hasta pasado un tiempo que crece con los fallos. Si no hay
+ninguna llave con qué verificar se responde 503 (no es culpa del token); un token inválido, 401.
+
+El email sale de los claims: el ID token de Cognito trae ``email``; el access token no
+(el pool usa ``username_attributes = ["email"]`` y ``username`` es el ``sub``), así que la app
+debe enviar el ID token en ``Authorization: Bearer``.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.request import urlopen
+
+import jwt
+from flask import abort, current_app, g, jsonify, make_response, request
+
+logger = logging.getLogger(__name__)
+
+
+class AuthError(Exception):
+    pass
+
+
+class KeysUnavailable(AuthError):
+    """
+    No se pudo descargar el JWKS y no hay llaves anteriores con qué verificar (responde 503).
+    """
+
+
+def fetch_jwks(url: str) -> dict:
+    with urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+class CognitoVerifier:
+    def __init__(self, issuer: str, client_id: str, jwks_loader=None, refresh_interval: float = 3600,
+                 min_refresh_interval: float = 60, cache_size: int = 4096, leeway: int = 30):
+        self.issuer = issuer
+        self.client_id = client_id
+        self.jwks_url = f'{issuer}/.well-known/jwks.json'
+        self.jwks_loader = jwks_loader or (lambda: fetch_jwks(self.jwks_url))
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.cache_size = cache_size
+        self.leeway = leeway
+        self._keys = {}
+        self._keys_loaded_at = 0.0
+        self._attempted_at = None
+        self._attempts = 0
+        self._failures = 0
+        self._verified = OrderedDict()
+        # _lock protege el LRU; _refresh_lock solo lo toma el hilo que descarga el JWKS
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _retry_after(self) -> float:
+        # Después de fallos la espera crece (60 s, 120 s, ...) hasta el intervalo normal de refresco
+        if not self._failures:
+            return self.min_refresh_interval
+        return min(self.min_refresh_interval * 2 ** (self._failures - 1), self.refresh_interval)
+
+    def _refresh_keys(self, force: bool = False):
+        """
+        Descarga el JWKS si las llaves están vencidas (o, con ``force``, si llegó un ``kid``
+        desconocido). Solo un hilo descarga; los demás siguen con las llaves anteriores, y si la
+        descarga falla también se siguen usando.
+        """
+        now = time.monotonic()
+        if self._keys and now - self._keys_loaded_at < (self.min_refresh_interval if force else self.refresh_interval):
+            return
+        if self._attempted_at is not None and now - self._attempted_at < self._retry_after():
+            # Descarga reciente (o fallida): no se vuelve a pedir en cada token con kid desconocido
+            if not self._keys:
+                raise KeysUnavailable('No se pudieron obtener las llaves de Cognito')
+            return
+        attempts = self._attempts
+        # Sin llaves no hay con qué verificar: se espera la descarga en curso
+        if not self._refresh_lock.acquire(blocking=not self._keys):
+            return
+        try:
+            if self._attempts != attempts:
+                # Otro hilo descargó mientras se esperaba
+                if not self._keys:
+                    raise KeysUnavailable('No se pudieron obtener las llaves de Cognito')
+                return
+            try:
+                jwks = self.jwks_loader()
+                keys = {key['kid']: jwt.PyJWK(key) for key in jwks.get('keys', [])}
+            except Exception:
+                self._failures += 1
+                logger.warning('No se pudo descargar el JWKS de %s', self.jwks_url, exc_info=True)
+                if not self._keys:
+                    raise KeysUnavailable('No se pudieron obtener las llaves de Cognito')
+                return
+            finally:
+                self._attempted_at = time.monotonic()
+                self._attempts += 1
+            self._keys = keys
+            self._keys_loaded_at = self._attempted_at
+            self._failures = 0
+        finally:
+            self._refresh_lock.release()
+
+    def signing_key(self, kid: str):
+        self._refresh_keys()
+        key = self._keys.get(kid)
+        if key is None:
+            # Llave nueva por rotación: se vuelve a descargar el JWKS (con límite de frecuencia)
+            self._refresh_keys(force=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise AuthError('Llave de firma desconocida')
+        return key
+
+    def verify(self, token: str) -> dict:
+        cache_key = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+        with self._lock:
+            cached = self._verified.get(cache_key)
+            if cached is not None and cached['exp'] + self.leeway > now:
+                self._verified.move_to_end(cache_key)
+                return cached
+
+        try:
+            header = jwt.get_unverified_header(token)
+            key = self.signing_key(header.get('kid'))
+            claims = jwt.decode(
+                token, key.key, algorithms=['RS256'], issuer=self.issuer, leeway=self.leeway,
+                options={'verify_aud': False, 'require': ['exp', 'iss', 'token_use']})
+        except jwt.PyJWTError as error:
+            raise AuthError(str(error)) from error
+
+        # El ID token lleva el client id en aud y el access token en client_id
+        token_use = claims.get('token_use')
+        audience = claims.get('aud') if token_use == 'id' else claims.get('client_id')
+        if token_use not in ('id', 'access') or audience != self.client_id:
+            raise AuthError('Token emitido para otro cliente')
+
+        with self._lock:
+            self._verified[cache_key] = claims
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return claims
+
+
+class CognitoAuth:
+    def __init__(self, app=None):
+        self.verifier = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, jwks_loader=None):
+        app.config.setdefault('COGNITO_REGION', os.getenv('COGNITO_REGION', 'us-east-1'))
+        app.config.setdefault('COGNITO_USER_POOL_ID', os.getenv('COGNITO_USER_POOL_ID'))
+        app.config.setdefault('COGNITO_CLIENT_ID', os.getenv('COGNITO_CLIENT_ID'))
+        # Mientras la app móvil migra, sin token se sigue aceptando el parámetro userEmail
+        app.config.setdefault('AUTH_REQUIRED', os.getenv('AUTH_REQUIRED', '0') == '1')
+        app.config.setdefault('JWKS_REFRESH_SECONDS', 3600)
+        app.config.setdefault('ADMIN_GROUP', os.getenv('COGNITO_ADMIN_GROUP', 'admin'))
+        if app.config['COGNITO_USER_POOL_ID']:
+            issuer = (f"https://cognito-idp.{app.config['COGNITO_REGION']}.amazonaws.com/"
+                      f"{app.config['COGNITO_USER_POOL_ID']}")
+            self.verifier = CognitoVerifier(
+                issuer, app.config['COGNITO_CLIENT_ID'], jwks_loader=jwks_loader,
+                refresh_interval=app.config['JWKS_REFRESH_SECONDS'])
+        app.extensions['cognito_auth'] = self
+
+    def _verify(self, authorization: str) -> dict:
+        try:
+            return self.verifier.verify(authorization[len('Bearer '):].strip())
+        except KeysUnavailable as error:
+            # Falla de Cognito, no del token: el cliente debe reintentar, no volver a iniciar sesión
+            response = make_response(jsonify({'message': str(error)}), 503)
+            response.headers['Retry-After'] = str(int(self.verifier.min_refresh_interval))
+            abort(response)
+        except AuthError as error:
+            abort(make_response(jsonify({'message': f'Token inválido: {error}'}), 401))
+
+    def current_email(self, data: dict = None):
+        """
+        Email del usuario autenticado. Sin token (y con AUTH_REQUIRED desactivado) se usa
+        ``userEmail`` del query string o del cuerpo JSON, como hasta ahora.
+        """
+        authorization = request.headers.get('Authorization', '')
+        if authorization.startswith('Bearer ') and self.verifier is not None:
+            claims = self._verify(authorization)
+            email = claims.get('email')
+            if not email:
+                abort(make_response(jsonify({'message': 'El token no contiene email; envíe el ID token'}), 401))
+        elif current_app.config['AUTH_REQUIRED']:
+            abort(make_response(jsonify({'message': 'Se requiere autenticación'}), 401))
+        elif data is not None:
+            email = data.get('userEmail')
+        else:
+            email = request.args.get('userEmail')
+        g.user_email = email
+        return email
+
+    def require_group(self, group: str) -> dict:
+        """
+        Exige un token válido de un usuario del grupo ``group`` de Cognito (claim ``cognito:groups``).
+        """
+        authorization = request.headers.get('Authorization', '')
+        if self.verifier is None or not authorization.startswith('Bearer '):
+            abort(make_response(jsonify({'message': 'Se requiere autenticación'}), 401))
+        claims = self._verify(authorization)
+        if group not in claims.get('cognito:groups', []):
+            abort(make_response(jsonify({'message': 'No tiene permisos para esta operación'}), 403))
+        g.user_email = claims.get('email')
+        return claims
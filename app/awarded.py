@@ -0,0 +1,68 @@
+"""
+Pares (usuario, artículo) que ya recibieron puntos extra, en memoria del worker.
+
+``/extra_points`` se llama cada vez que se abre un artículo y casi siempre es una repetición. Si el
+par está en el conjunto se responde sin ir a la base; si no está, se consulta la base como antes
+(puede ser la primera vez o un punto otorgado por otro worker, que entonces se agrega).
+
+No es un filtro de Bloom: un Bloom solo asegura los negativos y un falso positivo dejaría al usuario
+sin sus puntos. Aquí se guarda una huella de 64 bits por par (unos 70 bytes por par en un ``set``);
+la probabilidad de que dos pares compartan huella es despreciable (~n²/2⁶⁵).
+"""
+import hashlib
+import threading
+
+
+def fingerprint(email: str, articulo_id: int) -> int:
+    digest = hashlib.blake2b(f'{email}\x00{articulo_id}'.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class AwardedSet:
+    def __init__(self):
+        self._items = set()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, pair) -> bool:
+        found = fingerprint(*pair) in self._items
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def add(self, email: str, articulo_id: int):
+        self._items.add(fingerprint(email, articulo_id))
+
+    def load(self, rows):
+        """
+        Reconstruye el conjunto con ``rows`` (pares ``(email, articulo_id)``). Los pares agregados
+        mientras se cargaba se conservan; si se llamó ``clear()`` entre tanto, la carga se descarta.
+        """
+        generation = self._generation
+        items = {fingerprint(email, articulo_id) for email, articulo_id in rows}
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._items |= items
+            self.loaded = True
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._items = set()
+            self.loaded = False
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'pares': len(self._items),
+            'cargado': self.loaded,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+        }
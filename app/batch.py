@@ -0,0 +1,180 @@
+"""
+Ejecución de varias llamadas a la API en una sola petición HTTP (``POST /batch``).
+
+Cada sub-petición pasa por el despacho normal de Flask (mismas vistas, hooks y errores) dentro
+del mismo proceso, así que una pantalla de la app hace un solo viaje de red en lugar de N.
+
+Cada sub-petición tiene su propio contexto de aplicación (su propio ``g``: usuario, decisiones de
+réplica, banderas de caché) y sus propias sesiones de shards, que se cierran al terminar.
+
+- En modo secuencial todas las sub-peticiones comparten la sesión de la base principal: en Postgres
+  la transacción se abre en ``REPEATABLE READ`` y todas las lecturas ven la misma foto de los datos.
+  Las escrituras hacen commit como en la vista original. Cada sub-petición corre dentro de un
+  ``SAVEPOINT``: si falla (excepción o 5xx) se deshace solo lo suyo y las siguientes siguen con
+  la sesión limpia.
+- Con ``paralelo`` (solo si todas son GET) cada sub-petición corre en su hilo con su propia
+  sesión; en Postgres importan la foto de la transacción principal con ``SET TRANSACTION SNAPSHOT``
+  para seguir leyendo datos consistentes entre sí. La foto dura lo que dura la transacción: si una
+  vista GET hiciera commit, lo que lea después ya no es parte de la foto.
+
+Las vistas marcadas con ``@sin_lote`` (respuestas en streaming como ``/events``, el proxy de
+archivos o las exportaciones) no se pueden pedir dentro de un lote: su cuerpo no termina o es
+demasiado grande para guardarlo en memoria.
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g, request
+from sqlalchemy import text
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+MAX_SUBREQUESTS = 20
+MAX_WORKERS = 4
+ALLOWED_METHODS = ('GET', 'POST')
+FORWARDED_HEADERS = ('Authorization', 'X-Forwarded-For', 'Accept-Language')
+SNAPSHOT_ID = re.compile(r'^[0-9A-Fa-f-]+$')
+# Valores de ``g`` de una sub-petición que deben llegar a la respuesta del lote
+PROPAGATED_G = ('read_your_writes_until',)
+
+
+class BatchError(ValueError):
+    pass
+
+
+def sin_lote(view):
+    """
+    Marca una vista que no puede ejecutarse dentro de ``/batch``.
+    """
+    view.sin_lote = True
+    return view
+
+
+def _endpoint(path: str, method: str):
+    adapter = current_app.url_map.bind_to_environ(request.environ)
+    try:
+        return adapter.match(path.split('?')[0], method=method)[0]
+    except HTTPException:
+        # Rutas inexistentes: la sub-petición responde 404/405 como siempre
+        return None
+
+
+def validate(subrequests) -> list:
+    if not isinstance(subrequests, list) or not subrequests:
+        raise BatchError('requests debe ser una lista no vacía')
+    if len(subrequests) > MAX_SUBREQUESTS:
+        raise BatchError(f'Máximo {MAX_SUBREQUESTS} sub-peticiones por lote')
+    normalizadas = []
+    for subrequest in subrequests:
+        if not isinstance(subrequest, dict):
+            raise BatchError('Cada sub-petición debe ser un objeto con method y path')
+        method = str(subrequest.get('method', 'GET')).upper()
+        path = subrequest.get('path') or ''
+        if not isinstance(path, str):
+            raise BatchError('path debe ser texto')
+        if method not in ALLOWED_METHODS:
+            raise BatchError(f'Método no permitido: {method}')
+        if not path.startswith('/') or path.split('?')[0].rstrip('/') == request.path.rstrip('/'):
+            raise BatchError(f'Ruta no permitida: {path}')
+        endpoint = _endpoint(path, method)
+        if endpoint is not None and getattr(current_app.view_functions[endpoint], 'sin_lote', False):
+            raise BatchError(f'Ruta no permitida en un lote: {path}')
+        normalizadas.append({'method': method, 'path': path, 'body': subrequest.get('body')})
+    return normalizadas
+
+
+def _environ(subrequest: dict) -> dict:
+    headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    builder = EnvironBuilder(
+        path=subrequest['path'], method=subrequest['method'], headers=headers,
+        json=subrequest['body'] if subrequest['method'] != 'GET' else None,
+        environ_base={'REMOTE_ADDR': request.remote_addr})
+    try:
+        return builder.get_environ()
+    finally:
+        builder.close()
+
+
+def _response_json(response) -> dict:
+    body = response.get_data()
+    if response.is_json:
+        content = response.get_json(silent=True)
+    else:
+        content = body.decode('utf-8', errors='replace')
+    return {'status': response.status_code, 'body': content}
+
+
+def _dispatch(app, db, environ: dict, session, savepoint: bool = True) -> dict:
+    """
+    Corre la sub-petición en un contexto de aplicación nuevo que usa ``session`` como sesión de la
+    base principal. Con ``savepoint`` la sub-petición corre en un SAVEPOINT que se deshace si falla.
+    """
+    nested = session.begin_nested() if savepoint else None
+    propagated = {}
+    with app.app_context():
+        # El contexto nuevo usa la sesión del lote; se retira antes de salir para que el cierre del
+        # contexto no la cierre
+        db.session.registry.set(session)
+        try:
+            with app.request_context(environ):
+                try:
+                    response = app.full_dispatch_request()
+                except Exception as error:
+                    app.logger.exception('Error en sub-petición de /batch')
+                    result = {'status': 500, 'body': {'message': str(error)}}
+                else:
+                    result = _response_json(response)
+            propagated = {name: g.get(name) for name in PROPAGATED_G if g.get(name) is not None}
+        finally:
+            db.session.registry.clear()
+    for name, value in propagated.items():
+        setattr(g, name, value)
+    if nested is not None and nested.is_active:
+        # Si la vista hizo commit o rollback el savepoint ya terminó con la transacción
+        if result['status'] >= 500:
+            nested.rollback()
+        else:
+            nested.commit()
+    return result
+
+
+def _isolated(session):
+    """
+    Abre la transacción de la sesión en REPEATABLE READ (solo Postgres). Devuelve la conexión.
+    """
+    # El nivel de aislamiento solo se puede fijar antes de que la sesión tome la conexión
+    if session.get_bind().dialect.name != 'postgresql':
+        return session.connection()
+    return session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+
+
+def run_batch(db, subrequests: list, parallel: bool = False, replica_engine=None) -> list:
+    """
+    ``replica_engine`` es el engine de lectura elegido para el lote (``None`` para la primaria);
+    en paralelo todos los hilos deben leer del mismo servidor para poder compartir la foto.
+    """
+    app = current_app._get_current_object()
+    db.session.info['replica'] = replica_engine
+    connection = _isolated(db.session)
+    environs = [_environ(subrequest) for subrequest in subrequests]
+
+    if not parallel or len(environs) == 1:
+        session = db.session()
+        return [_dispatch(app, db, environ, session) for environ in environs]
+
+    snapshot = None
+    if connection.dialect.name == 'postgresql':
+        snapshot = connection.execute(text('SELECT pg_export_snapshot()')).scalar()
+        if not SNAPSHOT_ID.match(snapshot or ''):
+            snapshot = None
+
+    def worker(environ):
+        with app.app_context():
+            session = db.session()
+            session.info['replica'] = replica_engine
+            if snapshot is not None:
+                _isolated(session).execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot}'"))
+            return _dispatch(app, db, environ, session, savepoint=False)
+
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(environs))) as executor:
+        return list(executor.map(worker, environs))
@@ -0,0 +1,55 @@
+"""
+Caché en memoria (por proceso) para datos del catálogo que casi nunca cambian:
+especializaciones, exámenes con sus preguntas y claves de respuesta.
+
+Cada entrada expira después de ``ttl`` segundos para que los demás workers terminen
+viendo los cambios hechos por ``crear_examen`` o ``insert_initial_data``; el worker que
+hace el cambio limpia su caché de inmediato con ``clear``.
+
+Las cargas por una misma llave se agrupan (single-flight): si muchos hilos fallan la caché a la
+vez, solo uno consulta la base.
+"""
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+class CatalogCache:
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self._generation = 0
+
+    def get_or_load(self, key, loader):
+        now = time.monotonic()
+        entry = self._items.get(key)
+        if entry is not None and entry[0] > now:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return self._flight.do(key, lambda: self._load(key, loader))
+
+    def _load(self, key, loader):
+        generation = self._generation
+        value = loader()
+        # Si hubo un clear mientras se cargaba, el valor puede estar viejo: no se guarda
+        self.set(key, value, generation)
+        return value
+
+    def set(self, key, value, generation: int = None):
+        with self._lock:
+            if generation is None or generation == self._generation:
+                self._items[key] = (time.monotonic() + self.ttl, value)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
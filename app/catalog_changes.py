@@ -0,0 +1,125 @@
+"""
+Registro de cambios del catálogo para sincronización incremental de los clientes.
+
+Cada alta, modificación o baja de una entidad del catálogo (especializaciones, bloques, cursos,
+artículos, exámenes y preguntas) agrega una fila a ``cambio_catalogo`` en la misma transacción.
+La llave ``version`` crece monótonamente; en Postgres los escritores del catálogo se serializan con
+un advisory lock para que las versiones se confirmen en orden y un cliente no se salte ninguna.
+
+El cliente guarda ``epoca`` y ``version`` de la última respuesta y pide solo lo posterior. Si la
+tabla se recreó (``insert_initial_data``), la época cambia y el cliente recibe el catálogo completo;
+lo mismo si quedó tan atrás que los cambios que necesita ya se podaron o son demasiados.
+"""
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, text
+from sqlalchemy.orm import Session
+
+# Llave del advisory lock de Postgres que serializa las escrituras del catálogo
+CATALOG_LOCK_KEY = 730131
+# Con más entidades cambiadas que esto conviene mandar el catálogo completo
+DELTA_LIMIT = 500
+OPERACION_REINICIO = 'reinicio'
+
+
+def entity_json(obj) -> dict:
+    return {column.key: getattr(obj, column.key) for column in obj.__mapper__.column_attrs}
+
+
+class CatalogChangeLog:
+    def __init__(self, db, change_model, models: dict):
+        self.db = db
+        self.change_model = change_model
+        self.models = models
+        event.listen(change_model.__table__, 'after_create', self._mark_epoch)
+        event.listen(Session, 'after_flush', self._after_flush)
+
+    def init_app(self, app):
+        app.config.setdefault('CATALOG_DELTA_LIMIT', DELTA_LIMIT)
+        app.extensions['catalog_changes'] = self
+
+    def _mark_epoch(self, target, connection, **kwargs):
+        connection.execute(insert(target).values(
+            tabla='*', entidad_id=0, operacion=OPERACION_REINICIO, fecha=datetime.utcnow()))
+
+    def _after_flush(self, session, flush_context):
+        cambios = []
+        for operacion, objetos in (('alta', session.new), ('modificacion', session.dirty), ('baja', session.deleted)):
+            for obj in objetos:
+                tabla = getattr(obj, '__tablename__', None)
+                if tabla not in self.models:
+                    continue
+                if operacion == 'modificacion' and not session.is_modified(obj, include_collections=False):
+                    continue
+                cambios.append({'tabla': tabla, 'entidad_id': obj.id, 'operacion': operacion,
+                                'fecha': datetime.utcnow()})
+        if not cambios:
+            return
+        connection = session.connection()
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': CATALOG_LOCK_KEY})
+        connection.execute(insert(self.change_model.__table__), cambios)
+
+    def epoch(self) -> str:
+        model = self.change_model
+        inicio = self.db.session.query(model.fecha).filter(model.operacion == OPERACION_REINICIO).scalar()
+        return inicio.strftime('%Y%m%d%H%M%S%f') if inicio else ''
+
+    def snapshot(self) -> dict:
+        return {tabla: [entity_json(obj) for obj in model.query.order_by(model.id)]
+                for tabla, model in self.models.items()}
+
+    def changes_since(self, since, epoca: str = None, limit: int = DELTA_LIMIT) -> dict:
+        """
+        Cambios posteriores a ``since``: por tabla, las entidades vigentes que cambiaron y los ids
+        eliminados. Devuelve el catálogo completo si el cliente no tiene una versión utilizable.
+        """
+        model = self.change_model
+        session = self.db.session
+        current_epoch = self.epoch()
+        version, minimo = session.query(
+            func.max(model.version),
+            func.min(model.version).filter(model.operacion != OPERACION_REINICIO)
+        ).one()
+        version = version or 0
+        respuesta = {'epoca': current_epoch, 'version': version}
+
+        usable = since is not None and epoca == current_epoch and since <= version
+        # Los cambios anteriores a ``minimo`` ya se podaron
+        usable = usable and (minimo is None or since >= minimo - 1)
+        cambiadas = {}
+        if usable:
+            filas = session.query(model.tabla, model.entidad_id).filter(
+                model.version > since, model.operacion != OPERACION_REINICIO
+            ).distinct().limit(limit + 1).all()
+            usable = len(filas) <= limit
+            for tabla, entidad_id in filas:
+                cambiadas.setdefault(tabla, set()).add(entidad_id)
+        if not usable:
+            respuesta.update({'snapshot': True, 'entidades': self.snapshot()})
+            return respuesta
+
+        cambios = {}
+        for tabla, ids in cambiadas.items():
+            modelo = self.models[tabla]
+            vigentes = modelo.query.filter(modelo.id.in_(ids)).order_by(modelo.id).all()
+            # Lo que ya no existe se informa como eliminado, aunque se haya creado después de ``since``
+            cambios[tabla] = {
+                'actualizados': [entity_json(obj) for obj in vigentes],
+                'eliminados': sorted(ids - {obj.id for obj in vigentes}),
+            }
+        respuesta.update({'snapshot': False, 'cambios': cambios})
+        return respuesta
+
+    def prune(self, before: datetime) -> int:
+        """
+        Borra cambios anteriores a ``before``; siempre conserva la marca de época y el último cambio.
+        """
+        model = self.change_model
+        session = self.db.session
+        ultima = session.query(func.max(model.version)).scalar() or 0
+        borrados = session.query(model).filter(
+            model.fecha < before, model.version < ultima, model.operacion != OPERACION_REINICIO
+        ).delete(synchronize_session=False)
+        session.commit()
+        return borrados
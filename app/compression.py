@@ -0,0 +1,149 @@
+"""
+Compresión de respuestas (gzip / brotli) según el encabezado ``Accept-Encoding``.
+
+Los exámenes y el catálogo son en su mayoría texto médico en español, que se comprime
+muy bien. Las respuestas del catálogo marcadas con ``@cache_compresion`` guardan el cuerpo
+ya comprimido indexado por el hash de su contenido: el mismo examen se comprime una sola vez.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain', 'text/html'}
+
+DEFAULT_CONFIG = {
+    'COMPRESSION_ENABLED': True,
+    # Por debajo de este tamaño (bytes) no vale la pena comprimir
+    'COMPRESSION_MIN_SIZE': 1024,
+    'COMPRESSION_GZIP_LEVEL': 6,
+    'COMPRESSION_BROTLI_QUALITY': 4,
+    # Las respuestas cacheadas se comprimen una sola vez, así que se usa el nivel máximo
+    'COMPRESSION_CACHED_GZIP_LEVEL': 9,
+    'COMPRESSION_CACHED_BROTLI_QUALITY': 11,
+    'COMPRESSION_CACHE_MAX_BYTES': 32 * 1024 * 1024,
+}
+
+
+def cache_compresion(view):
+    """
+    Marca una vista del catálogo cuyo cuerpo comprimido puede reutilizarse entre peticiones.
+    """
+    view.cache_compresion = True
+    return view
+
+
+def sin_cache_compresion():
+    """
+    Excluye la respuesta actual de la caché aunque la vista tenga ``@cache_compresion`` (cuerpos
+    únicos por petición, que solo llenarían la caché).
+    """
+    g.sin_cache_compresion = True
+
+
+class CompressedCache:
+    """
+    LRU en memoria de cuerpos comprimidos, limitada por el total de bytes almacenados.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._items[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        for key, value in DEFAULT_CONFIG.items():
+            app.config.setdefault(key, value)
+        self.cache = CompressedCache(app.config['COMPRESSION_CACHE_MAX_BYTES'])
+        app.extensions['compression'] = self
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def supported_encodings():
+        return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def compress(self, body: bytes, encoding: str, cached: bool) -> bytes:
+        config = current_app.config
+        if encoding == 'br':
+            quality = config['COMPRESSION_CACHED_BROTLI_QUALITY' if cached else 'COMPRESSION_BROTLI_QUALITY']
+            return brotli.compress(body, quality=quality)
+        level = config['COMPRESSION_CACHED_GZIP_LEVEL' if cached else 'COMPRESSION_GZIP_LEVEL']
+        # mtime=0 hace que la salida sea determinista para el mismo contenido
+        return gzip.compress(body, compresslevel=level, mtime=0)
+
+    def after_request(self, response):
+        config = current_app.config
+        if not config['COMPRESSION_ENABLED']:
+            return response
+        if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.supported_encodings())
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < config['COMPRESSION_MIN_SIZE']:
+            return response
+
+        view = current_app.view_functions.get(request.endpoint)
+        cached = getattr(view, 'cache_compresion', False) and not g.get('sin_cache_compresion')
+        if cached:
+            key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = self.compress(body, encoding, cached=True)
+                self.cache.set(key, compressed)
+        else:
+            compressed = self.compress(body, encoding, cached=False)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,246 @@
+"""
+Enrutamiento de lecturas a réplicas de Postgres con consistencia "read-your-writes".
+
+Las peticiones GET se leen de una réplica (en round-robin) y todo lo demás va a la primaria.
+Cuando una petición hace commit de una escritura, el cliente queda fijado a la primaria durante
+``READ_YOUR_WRITES_SECONDS``, para que por ejemplo ``/exam_result`` o ``/total_points`` justo
+después de ``/send_exam_results`` vean el resultado aunque la réplica tenga retraso:
+- la respuesta lleva una cookie firmada (``READ_YOUR_WRITES_COOKIE``) con el instante hasta el que
+  dura; la valida cualquier worker sin guardar nada en el servidor (la firma usa ``SECRET_KEY``,
+  que debe ser la misma en todos los workers e instancias);
+- además se fijan el email y el token del usuario, en Redis si hay caché compartida
+  (``REDIS_URL``) y si no en memoria del worker, para clientes que no guardan cookies.
+No se fija por dirección IP: ``X-Forwarded-For`` lo elige el cliente y detrás de un NAT se
+compartiría entre usuarios.
+
+``leer_de_primaria()`` manda a la primaria las lecturas de un bloque aunque la petición sea un GET:
+lo usa la caché compartida al calcular un valor que va a guardar, para no dejar bajo la versión
+recién incrementada un valor leído de una réplica atrasada.
+
+Las réplicas se configuran con ``DB_REPLICA_URIS`` (lista de URIs) o con la variable de entorno
+``db_replica_endpoints`` (hosts separados por coma, mismas credenciales que la primaria).
+"""
+import hashlib
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+def replica_uris_from_env() -> list:
+    endpoints = [endpoint.strip() for endpoint in os.getenv('db_replica_endpoints', '').split(',') if endpoint.strip()]
+    return [
+        f'postgresql://{os.getenv("db_username")}:{os.getenv("db_password")}@{endpoint}/{os.getenv("db_name")}'
+        for endpoint in endpoints
+    ]
+
+
+def usar_primaria(view):
+    """
+    Marca una vista GET que escribe o que debe leer siempre de la primaria.
+    """
+    view.usar_primaria = True
+    return view
+
+
+@contextmanager
+def leer_de_primaria():
+    """
+    Dentro del bloque las consultas de ``db.session`` van a la primaria (solo en un contexto de app).
+    """
+    previous = g.get('leer_de_primaria', False)
+    g.leer_de_primaria = True
+    try:
+        yield
+    finally:
+        g.leer_de_primaria = previous
+
+
+class PinStore:
+    """
+    Identidades fijadas a la primaria hasta un instante dado (en memoria del proceso).
+    """
+    def __init__(self):
+        self._pins = {}
+        self._lock = threading.Lock()
+
+    def pin(self, identities, until: float):
+        with self._lock:
+            for identity in identities:
+                self._pins[identity] = until
+            if len(self._pins) > 10000:
+                now = time.time()
+                self._pins = {key: value for key, value in self._pins.items() if value > now}
+
+    def is_pinned(self, identities) -> bool:
+        now = time.time()
+        return any(self._pins.get(identity, 0) > now for identity in identities)
+
+
+class SharedPinStore:
+    """
+    Identidades fijadas a la primaria en Redis (cliente con la API de redis-py), visibles para
+    todos los workers. Si Redis no responde no se fija nada y queda la cookie.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def _key(identity: str) -> str:
+        return 'pin:' + hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]
+
+    def pin(self, identities, until: float):
+        milliseconds = max(int((until - time.time()) * 1000), 1)
+        try:
+            for identity in identities:
+                self.backend.set(self._key(identity), '1', px=milliseconds)
+        except Exception:
+            logger.warning('No se pudo fijar el usuario a la primaria en Redis', exc_info=True)
+
+    def is_pinned(self, identities) -> bool:
+        identities = list(identities)
+        if not identities:
+            return False
+        try:
+            return any(value is not None for value in self.backend.mget([self._key(identity) for identity in identities]))
+        except Exception:
+            logger.warning('No se pudo consultar Redis para read-your-writes', exc_info=True)
+            return False
+
+
+class ReadRouter:
+    def __init__(self, app=None, pin_store=None):
+        self._pin_store = pin_store
+        self._local_pins = PinStore()
+        self.replica_keys = []
+        self._next = itertools.count()
+        self.window = 5
+        self.cookie_name = 'rw_pin'
+        self._serializer = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Debe llamarse antes de ``db.init_app``: agrega las réplicas a ``SQLALCHEMY_BINDS``.
+        """
+        app.config.setdefault('DB_REPLICA_URIS', replica_uris_from_env())
+        app.config.setdefault('READ_YOUR_WRITES_SECONDS', 5)
+        app.config.setdefault('READ_YOUR_WRITES_COOKIE', 'rw_pin')
+        app.config.setdefault('SECRET_KEY', os.getenv('SECRET_KEY'))
+        self.window = app.config['READ_YOUR_WRITES_SECONDS']
+        self.cookie_name = app.config['READ_YOUR_WRITES_COOKIE']
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.replica_keys = []
+        for number, uri in enumerate(app.config['DB_REPLICA_URIS']):
+            key = f'replica_{number}'
+            binds[key] = uri
+            self.replica_keys.append(key)
+        if self.replica_keys and app.config['SECRET_KEY']:
+            self._serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='read-your-writes')
+            app.after_request(self._set_pin_cookie)
+        app.extensions['db_router'] = self
+
+    @property
+    def pin_store(self):
+        if self._pin_store is not None:
+            return self._pin_store
+        backend = current_app.extensions.get('shared_cache_backend')
+        return SharedPinStore(backend) if backend is not None else self._local_pins
+
+    @staticmethod
+    def request_identities() -> set:
+        identities = set()
+        email = g.get('user_email') or request.args.get('userEmail')
+        if email:
+            identities.add(f'email:{email}')
+        authorization = request.headers.get('Authorization')
+        if authorization:
+            identities.add('token:' + hashlib.sha256(authorization.encode('utf-8')).hexdigest())
+        return identities
+
+    def pin_current_user(self):
+        if not self.replica_keys:
+            return
+        until = time.time() + self.window
+        g.read_your_writes_until = until
+        self.pin_store.pin(self.request_identities(), until)
+
+    def _set_pin_cookie(self, response):
+        until = g.get('read_your_writes_until')
+        if until is not None and self._serializer is not None:
+            response.set_cookie(self.cookie_name, self._serializer.dumps(until), max_age=math.ceil(self.window),
+                                httponly=True, secure=request.is_secure, samesite='Lax')
+        return response
+
+    def _cookie_pinned(self) -> bool:
+        value = request.cookies.get(self.cookie_name)
+        if not value or self._serializer is None:
+            return False
+        try:
+            until = self._serializer.loads(value, max_age=math.ceil(self.window))
+        except BadSignature:
+            return False
+        return isinstance(until, (int, float)) and until > time.time()
+
+    def is_pinned(self) -> bool:
+        return self._cookie_pinned() or self.pin_store.is_pinned(self.request_identities())
+
+    def should_read_replica(self, session) -> bool:
+        if not self.replica_keys or not has_request_context():
+            return False
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        view = current_app.view_functions.get(request.endpoint)
+        if getattr(view, 'usar_primaria', False):
+            return False
+        return not self.is_pinned()
+
+    def read_engine(self, engines):
+        """
+        Engine de lectura para una operación de solo lectura aunque llegue por POST (p. ej. /batch):
+        una réplica, o ``None`` (primaria) si no hay réplicas o el usuario está fijado a la primaria.
+        """
+        if not self.replica_keys or self.is_pinned():
+            return None
+        return self.replica_engine(engines)
+
+    def replica_engine(self, engines):
+        key = self.replica_keys[next(self._next) % len(self.replica_keys)]
+        return engines[key]
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+        if self._flushing:
+            # Una vez que la sesión escribe, el resto de la petición usa la primaria
+            self.info['escribio'] = True
+        elif not self.info.get('escribio') and not g.get('leer_de_primaria'):
+            # La decisión (y la réplica elegida) se mantiene para toda la sesión
+            if 'replica' not in self.info:
+                router = current_app.extensions.get('db_router')
+                use_replica = router is not None and router.should_read_replica(self)
+                self.info['replica'] = router.replica_engine(self._db.engines) if use_replica else None
+            if self.info['replica'] is not None:
+                return self.info['replica']
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _pin_after_write(session):
+    if session.info.get('escribio') and has_request_context():
+        router = current_app.extensions.get('db_router')
+        if router is not None:
+            router.pin_current_user()
@@ -0,0 +1,111 @@
+"""
+Reconciliación del catálogo de Postgres con las tablas de DynamoDB (``educational_data`` y
+``exams_data``, definidas en ``utils/dynamodb.tf``).
+
+1. DynamoDB se lee con Scans segmentados en paralelo (``Segment``/``TotalSegments``, un hilo y un
+   cliente por segmento) y de cada ítem se guarda solo el hash de su contenido.
+2. Postgres se recorre con un cursor del lado del servidor; cada fila se convierte al ítem que le
+   corresponde y se compara por hash.
+3. Solo se escriben las diferencias, con escrituras en lote (``batch_writer``, 25 ítems por
+   llamada y reintento de los no procesados). Los ítems que sobran en DynamoDB se informan y se
+   borran solo si se pide.
+
+Las llaves de los ítems usan los ids de Postgres (``curso#12``), así que la herramienta se puede
+ejecutar las veces que sea necesario.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+DEFAULT_SEGMENTS = 4
+KEY_ATTRIBUTES = ('pk', 'sk')
+
+
+def item_key(item: dict) -> tuple:
+    return item['pk'], item['sk']
+
+
+def content_hash(item: dict) -> str:
+    canonical = json.dumps(item, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class DynamoSync:
+    def __init__(self, endpoint_url: str = None, segments: int = DEFAULT_SEGMENTS,
+                 dry_run: bool = False, delete_extra: bool = False):
+        self.endpoint_url = endpoint_url
+        self.segments = segments
+        self.dry_run = dry_run
+        self.delete_extra = delete_extra
+        self._local = threading.local()
+
+    def _resource(self):
+        # Los objetos de boto3 resource no se comparten entre hilos
+        if getattr(self._local, 'resource', None) is None:
+            import boto3
+            self._local.resource = boto3.session.Session().resource('dynamodb', endpoint_url=self.endpoint_url)
+        return self._local.resource
+
+    def _scan_segment(self, table_name: str, segment: int) -> dict:
+        table = self._resource().Table(table_name)
+        hashes = {}
+        params = {'Segment': segment, 'TotalSegments': self.segments}
+        while True:
+            page = table.scan(**params)
+            for item in page.get('Items', []):
+                hashes[item_key(item)] = content_hash(item)
+            if 'LastEvaluatedKey' not in page:
+                return hashes
+            params['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+    def scan_hashes(self, table_name: str) -> dict:
+        """
+        ``(pk, sk) -> hash`` de todos los ítems de la tabla, leídos en ``segments`` hilos.
+        """
+        hashes = {}
+        with ThreadPoolExecutor(max_workers=self.segments) as executor:
+            for segment_hashes in executor.map(lambda segment: self._scan_segment(table_name, segment),
+                                               range(self.segments)):
+                hashes.update(segment_hashes)
+        return hashes
+
+    def sync_table(self, table_name: str, items) -> dict:
+        """
+        Compara ``items`` (generador con los ítems esperados) contra la tabla y escribe las
+        diferencias. Devuelve los contadores y el rendimiento de cada etapa.
+        """
+        started = time.monotonic()
+        existing = self.scan_hashes(table_name)
+        scanned_at = time.monotonic()
+        stats = {'tabla': table_name, 'leidos_dynamo': len(existing), 'leidos_postgres': 0,
+                 'iguales': 0, 'nuevos': 0, 'modificados': 0, 'sobrantes': 0, 'borrados': 0}
+
+        table = self._resource().Table(table_name)
+        batch = nullcontext() if self.dry_run else table.batch_writer(overwrite_by_pkeys=list(KEY_ATTRIBUTES))
+        with batch as writer:
+            for item in items:
+                stats['leidos_postgres'] += 1
+                current = existing.pop(item_key(item), None)
+                if current == content_hash(item):
+                    stats['iguales'] += 1
+                    continue
+                stats['nuevos' if current is None else 'modificados'] += 1
+                if writer is not None:
+                    writer.put_item(Item=item)
+            # Lo que quedó en ``existing`` no tiene fila en Postgres
+            stats['sobrantes'] = len(existing)
+            if writer is not None and self.delete_extra:
+                for pk, sk in existing:
+                    writer.delete_item(Key={'pk': pk, 'sk': sk})
+                    stats['borrados'] += 1
+
+        finished = time.monotonic()
+        escritos = stats['nuevos'] + stats['modificados'] + stats['borrados'] if not self.dry_run else 0
+        stats['segundos'] = round(finished - started, 3)
+        stats['items_por_segundo_scan'] = round(stats['leidos_dynamo'] / max(scanned_at - started, 1e-6), 1)
+        stats['filas_por_segundo_postgres'] = round(stats['leidos_postgres'] / max(finished - scanned_at, 1e-6), 1)
+        stats['escrituras'] = escritos
+        return stats
@@ -0,0 +1,355 @@
+"""
+Canal Server-Sent Events (``GET /events``) con los puntos, insignias nuevas y posición en el ranking
+del usuario, para que la app deje de consultar ``/total_points`` y ``/user_points`` periódicamente.
+
+Cuando ``/send_exam_results`` o ``/extra_points`` hacen commit se publica el nuevo total del usuario:
+- con Postgres se envía con ``NOTIFY`` y cada worker lo recibe en un hilo con ``LISTEN``, así que
+  llega a los clientes conectados a cualquier worker;
+- con otras bases se reparte solo dentro del proceso.
+
+Cada worker mantiene en memoria el total de todos los usuarios del ranking (los mismos que
+``/user_points``: usuarios con algún examen; se carga con la primera conexión y se actualiza con
+cada publicación) para calcular posiciones sin volver a agregar en la base; a cada cliente conectado
+se le avisa cuando su posición cambia, también si lo desplazó otro usuario.
+
+Con NOTIFY cada escritura se publica siempre: un worker no sabe si otro acaba de recibir su primer
+cliente, y una publicación perdida dejaría su ranking desfasado. Lo que sí se omite sin clientes es
+el cálculo de las insignias nuevas (``has_listeners``): cada worker con clientes lo avisa en el mismo
+canal cada ``LISTEN_POLL_SECONDS`` y los demás lo recuerdan un rato. Si la conexión de ``LISTEN`` se
+pierde, al reconectar el ranking se vuelve a cargar de la base. Sin NOTIFY (un solo proceso) no se
+publica nada mientras no haya clientes; un worker sin clientes olvida su ranking y lo vuelve a cargar
+con la siguiente conexión.
+
+Cada conexión ocupa un hilo del worker: ``EVENTS_MAX_STREAMS`` limita las conexiones por worker
+(el resto recibe 503 con ``Retry-After``); por defecto es la mitad de los hilos del worker
+(``GUNICORN_THREADS``) y nunca todos, para que siempre queden hilos para las demás peticiones. Es el
+parámetro de capacidad: conexiones simultáneas = workers × ``EVENTS_MAX_STREAMS``, así que para muchos
+clientes hay que subir ``GUNICORN_THREADS`` (o servir ``/events`` con una instancia aparte con muchos
+hilos). ``EVENTS_STREAM_SECONDS`` cierra las conexiones periódicamente; ``EventSource`` se vuelve a
+conectar solo.
+"""
+import json
+import logging
+import os
+import queue
+import re
+import select
+import threading
+import time
+from bisect import bisect_right, insort
+
+from flask import Response, jsonify, make_response
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_NAME = re.compile(r'^[a-z_][a-z0-9_]*$')
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTEN_POLL_SECONDS = 5
+# Un aviso de "tengo clientes" de otro worker vale por este tiempo
+PRESENCE_SECONDS = 3 * LISTEN_POLL_SECONDS
+RECONNECT_MILLISECONDS = 3000
+
+
+class Leaderboard:
+    """
+    Totales de puntos por usuario con una lista ordenada de los totales para calcular posiciones.
+    """
+    def __init__(self):
+        self.totals = {}
+        self._sorted = []
+
+    def load(self, rows):
+        self.totals = {email: total for email, total in rows}
+        self._sorted = sorted(self.totals.values())
+
+    def update(self, email: str, total):
+        """
+        ``total`` es ``None`` si el usuario no entra en el ranking.
+        """
+        previous = self.totals.pop(email, None)
+        if previous is not None:
+            del self._sorted[bisect_right(self._sorted, previous) - 1]
+        if total is not None:
+            self.totals[email] = total
+            insort(self._sorted, total)
+
+    def rank(self, email: str):
+        total = self.totals.get(email)
+        if total is None:
+            return None
+        return len(self._sorted) - bisect_right(self._sorted, total) + 1
+
+
+class Subscriber:
+    def __init__(self, email: str):
+        self.email = email
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.rank = None
+
+    def send(self, event: str, data: dict):
+        try:
+            self.queue.put_nowait((event, data))
+        except queue.Full:
+            # Cliente lento: se descarta; el siguiente evento trae el total actualizado
+            pass
+
+
+def sse(event: str, data: dict) -> str:
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n'
+
+
+class EventHub:
+    def __init__(self, app=None, **kwargs):
+        self.leaderboard = Leaderboard()
+        self.leaderboard_rows = None
+        self.engine = None
+        self.app = None
+        self.channel = 'puntos_usuario'
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._listener = None
+        self._remote_until = 0.0
+        self._announced_at = 0.0
+        if app is not None:
+            self.init_app(app, **kwargs)
+
+    def init_app(self, app, leaderboard_rows=None):
+        """
+        ``leaderboard_rows``: función que devuelve los pares ``(email, total)`` de todos los usuarios.
+        """
+        app.config.setdefault('EVENTS_CHANNEL', os.getenv('EVENTS_CHANNEL', 'puntos_usuario'))
+        app.config.setdefault('EVENTS_WORKER_THREADS', int(os.getenv('GUNICORN_THREADS', '4')))
+        app.config.setdefault('EVENTS_MAX_STREAMS', int(os.getenv(
+            'EVENTS_MAX_STREAMS', str(app.config['EVENTS_WORKER_THREADS'] // 2))))
+        app.config.setdefault('EVENTS_STREAM_SECONDS', float(os.getenv('EVENTS_STREAM_SECONDS', '300')))
+        app.config.setdefault('EVENTS_HEARTBEAT_SECONDS', float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15')))
+        if not CHANNEL_NAME.match(app.config['EVENTS_CHANNEL']):
+            raise ValueError(f"EVENTS_CHANNEL inválido: {app.config['EVENTS_CHANNEL']}")
+        self.channel = app.config['EVENTS_CHANNEL']
+        self.max_streams = app.config['EVENTS_MAX_STREAMS']
+        if self.max_streams >= app.config['EVENTS_WORKER_THREADS']:
+            self.max_streams = max(app.config['EVENTS_WORKER_THREADS'] - 1, 0)
+            logger.warning('EVENTS_MAX_STREAMS ocuparía todos los hilos del worker; se limita a %d',
+                           self.max_streams)
+        self.stream_seconds = app.config['EVENTS_STREAM_SECONDS']
+        self.heartbeat = app.config['EVENTS_HEARTBEAT_SECONDS']
+        if leaderboard_rows is not None:
+            self.leaderboard_rows = leaderboard_rows
+        # El hilo de LISTEN la usa para recargar el ranking
+        self.app = app
+        app.extensions['events'] = self
+
+    def _uses_notify(self, engine) -> bool:
+        return engine is not None and engine.dialect.name == 'postgresql'
+
+    def should_publish(self, engine) -> bool:
+        """
+        Si hay que publicar los puntos de una escritura: siempre con NOTIFY (los rankings de los demás
+        workers dependen de cada publicación) y, sin NOTIFY, solo si este proceso tiene clientes.
+        """
+        if self._uses_notify(engine):
+            self._ensure_listening(engine)
+            return True
+        with self._lock:
+            return bool(self._subscribers)
+
+    def has_listeners(self, engine) -> bool:
+        """
+        Si hay clientes conectados a este worker o, con NOTIFY, a otro que lo avisó hace poco. Si no,
+        no vale la pena calcular las insignias nuevas.
+        """
+        with self._lock:
+            if self._subscribers:
+                return True
+        if not self._uses_notify(engine):
+            return False
+        self._ensure_listening(engine)
+        return time.monotonic() < self._remote_until
+
+    def publish(self, engine, email: str, total_points: int, new_badges: list = (), ranking_points=None):
+        """
+        Publica el nuevo total del usuario. ``engine`` es el de la base principal (donde escuchan
+        todos los workers); ``ranking_points`` es su total en el ranking (``None`` si no entra).
+        """
+        message = {'email': email, 'total_points': total_points, 'insignias_nuevas': list(new_badges),
+                   'total_ranking': ranking_points}
+        if self._uses_notify(engine):
+            try:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql('SELECT pg_notify(%s, %s)', (self.channel, json.dumps(message, default=str)))
+                    connection.commit()
+                return
+            except Exception:
+                logger.exception('No se pudo publicar con NOTIFY; se reparte solo en este worker')
+        self._dispatch(message)
+
+    def _announce(self, connection):
+        """
+        Avisa a los demás workers que este tiene clientes (``connection``: conexión DBAPI; fuera de
+        autocommit el aviso sale con el commit).
+        """
+        self._announced_at = time.monotonic()
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, json.dumps({'oyentes': os.getpid()})))
+        finally:
+            cursor.close()
+
+    def _dispatch(self, message: dict):
+        if 'oyentes' in message:
+            self._remote_until = time.monotonic() + PRESENCE_SECONDS
+            return
+        email = message['email']
+        with self._lock:
+            if self._loaded:
+                self.leaderboard.update(email, message.get('total_ranking'))
+            subscribers = [subscriber for group in self._subscribers.values() for subscriber in group]
+        for subscriber in subscribers:
+            if subscriber.email == email:
+                subscriber.send('puntos', {'total_points': message['total_points']})
+                if message['insignias_nuevas']:
+                    subscriber.send('insignias', {'insignias_nuevas': message['insignias_nuevas']})
+            self._send_rank(subscriber)
+
+    def _send_rank(self, subscriber: Subscriber):
+        with self._lock:
+            rank = self.leaderboard.rank(subscriber.email)
+            previous, subscriber.rank = subscriber.rank, rank
+        if rank != previous:
+            subscriber.send('ranking', {'posicion': rank, 'posicion_anterior': previous,
+                                        'usuarios': len(self.leaderboard.totals)})
+
+    def _ensure_started(self, engine):
+        """
+        Carga el ranking y arranca el hilo de ``LISTEN`` (con la primera conexión del worker, después
+        del fork de gunicorn). Necesita el contexto de la app.
+        """
+        self._ensure_listening(engine)
+        with self._lock:
+            if self._loaded:
+                return
+            self.leaderboard.load(self.leaderboard_rows() if self.leaderboard_rows else ())
+            self._loaded = True
+
+    def _ensure_listening(self, engine):
+        with self._lock:
+            if self._uses_notify(engine) and self._listener is None:
+                self._listener = threading.Thread(target=self._listen, args=(engine,), daemon=True,
+                                                  name='events-listen')
+                self._listener.start()
+
+    def _reload(self):
+        """
+        Vuelve a cargar el ranking de la base (las publicaciones de mientras no hubo LISTEN se perdieron).
+        """
+        with self._lock:
+            if not self._loaded or self.app is None or self.leaderboard_rows is None:
+                return
+        with self.app.app_context():
+            rows = list(self.leaderboard_rows())
+        with self._lock:
+            self.leaderboard.load(rows)
+            subscribers = [subscriber for group in self._subscribers.values() for subscriber in group]
+        for subscriber in subscribers:
+            self._send_rank(subscriber)
+
+    def _listen(self, engine):
+        reconnecting = False
+        while True:
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                # La conexión no vuelve al pool: seguiría recibiendo notificaciones
+                connection.detach()
+                driver = connection.driver_connection
+                driver.autocommit = True
+                driver.cursor().execute(f'LISTEN {self.channel}')
+                if reconnecting:
+                    self._reload()
+                # Desde aquí, perder la conexión significa perder publicaciones
+                reconnecting = True
+                while True:
+                    with self._lock:
+                        has_subscribers = bool(self._subscribers)
+                    if has_subscribers and time.monotonic() - self._announced_at >= LISTEN_POLL_SECONDS:
+                        self._announce(driver)
+                    if select.select([driver], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    driver.poll()
+                    while driver.notifies:
+                        self._dispatch(json.loads(driver.notifies.pop(0).payload))
+            except Exception:
+                logger.exception('Se perdió la conexión de LISTEN; reintentando')
+                time.sleep(1)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+    def stream(self, engine, email: str, total_points: int) -> Response:
+        """
+        Respuesta ``text/event-stream`` del usuario, empezando con su total y su posición actuales.
+        """
+        self._ensure_started(engine)
+        subscriber = Subscriber(email)
+        with self._lock:
+            if sum(len(group) for group in self._subscribers.values()) >= self.max_streams:
+                response = make_response(jsonify({'message': 'Demasiadas conexiones de eventos, intente de nuevo'}), 503)
+                response.headers['Retry-After'] = str(RECONNECT_MILLISECONDS // 1000)
+                return response
+            first = not self._subscribers
+            self._subscribers.setdefault(email, []).append(subscriber)
+        if first and self._uses_notify(engine):
+            # Sin esperar al hilo de LISTEN, para que los demás workers empiecen a publicar ya
+            try:
+                connection = engine.raw_connection()
+                try:
+                    self._announce(connection)
+                    connection.commit()
+                finally:
+                    connection.close()
+            except Exception:
+                logger.warning('No se pudo avisar a los demás workers', exc_info=True)
+        subscriber.send('puntos', {'total_points': total_points})
+        self._send_rank(subscriber)
+
+        def generate():
+            try:
+                yield f'retry: {RECONNECT_MILLISECONDS}\n\n'
+                deadline = time.monotonic() + self.stream_seconds
+                while time.monotonic() < deadline:
+                    try:
+                        event, data = subscriber.queue.get(timeout=self.heartbeat)
+                    except queue.Empty:
+                        # Comentario SSE: mantiene viva la conexión y detecta clientes desconectados
+                        yield ': ping\n\n'
+                        continue
+                    yield sse(event, data)
+            finally:
+                self._unsubscribe(subscriber)
+
+        response = Response(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            group = self._subscribers.get(subscriber.email, [])
+            if subscriber in group:
+                group.remove(subscriber)
+            if not group:
+                self._subscribers.pop(subscriber.email, None)
+            if not self._subscribers:
+                # Sin clientes nadie le publica: el ranking se vuelve a cargar con la próxima conexión
+                self._loaded = False
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'conexiones': sum(len(group) for group in self._subscribers.values()),
+                'usuarios_ranking': len(self.leaderboard.totals),
+                'escuchando': self._listener is not None and self._listener.is_alive(),
+                'maximo_conexiones': self.max_streams,
+                'clientes_en_algun_worker': time.monotonic() < self._remote_until,
+            }
@@ -0,0 +1,78 @@
+"""
+Exportación de resultados para reportes (CSV o XLSX) con memoria constante.
+
+Las filas llegan de un generador (cursor del lado del servidor con ``yield_per``) y se escriben
+a medida que se leen:
+- CSV: se envía al cliente por bloques mientras se recorre el cursor.
+- XLSX: ``openpyxl`` en modo ``write_only`` escribe las filas a disco sin guardarlas en memoria;
+  el archivo se arma en un temporal y luego se envía por bloques (el formato zip no permite
+  enviarlo antes de terminar). Mientras se arma ocupa el worker, así que la API solo lo arma hasta
+  ``EXPORT_XLSX_MAX_ROWS`` filas; los más grandes se hacen con el comando ``flask export-results``.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+
+from flask import Response, stream_with_context
+
+from json_provider import STREAM_CHUNK_SIZE
+
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def csv_chunks(header: list, rows):
+    """
+    Bloques de bytes de un CSV UTF-8 (con BOM para que Excel respete los acentos).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if buffer.tell() >= STREAM_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_csv(target, header: list, rows) -> None:
+    for chunk in csv_chunks(header, rows):
+        target.write(chunk)
+
+
+def write_xlsx(target, sheets) -> None:
+    """
+    ``sheets`` es una lista de ``(titulo, encabezados, filas)``; ``target`` una ruta o archivo.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, header, rows in sheets:
+        sheet = workbook.create_sheet(title=title[:31])
+        sheet.append(header)
+        for row in rows:
+            sheet.append(list(row))
+    workbook.save(target)
+
+
+def xlsx_chunks(sheets):
+    descriptor, path = tempfile.mkstemp(prefix='export-', suffix='.xlsx')
+    os.close(descriptor)
+    try:
+        write_xlsx(path, sheets)
+        with open(path, 'rb') as source:
+            while chunk := source.read(STREAM_CHUNK_SIZE):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def export_response(chunks, filename: str, mimetype: str) -> Response:
+    return Response(
+        stream_with_context(chunks), mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -0,0 +1,52 @@
+"""
+Campos a pedido (``?fields=a,b``) en los endpoints de lectura.
+
+Cada endpoint declara sus campos: las columnas que necesita cada uno y cómo se arma en el JSON.
+Con ``fields`` se cargan solo esas columnas (``load_only``) y la respuesta trae solo esos campos;
+sin ``fields`` la respuesta es la de siempre. ``id`` siempre se carga porque es la llave primaria.
+"""
+from flask import abort, jsonify, make_response, request
+from sqlalchemy.orm import load_only
+
+
+class Fieldset:
+    def __init__(self, fields: dict):
+        """
+        ``fields``: nombre del campo JSON -> ``(columnas, función(obj) -> valor)``.
+        """
+        self.fields = fields
+
+    def requested(self, exclude=()) -> list:
+        """
+        Campos pedidos en ``?fields=``, en el orden de la declaración; todos si no se envía.
+        ``exclude``: campos que este endpoint no ofrece (pedirlos responde 400 como uno desconocido).
+        """
+        valid = [name for name in self.fields if name not in exclude]
+        value = request.args.get('fields')
+        if not value:
+            return valid
+        names = {name.strip() for name in value.split(',') if name.strip()}
+        unknown = names - set(valid)
+        if unknown:
+            abort(make_response(jsonify({
+                'message': f"Campos desconocidos: {', '.join(sorted(unknown))}",
+                'campos_validos': valid,
+            }), 400))
+        return [name for name in valid if name in names]
+
+    def columns(self, names: list) -> list:
+        columns = []
+        for name in names:
+            for column in self.fields[name][0]:
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def load_only(self, model, names: list):
+        """
+        Opción de consulta que carga solo las columnas de ``names`` (y la llave primaria).
+        """
+        return load_only(model.id, *self.columns(names))
+
+    def render(self, obj, names: list) -> dict:
+        return {name: self.fields[name][1](obj) for name in names}
@@ -0,0 +1,33 @@
+"""
+Configuración de gunicorn: ``gunicorn -c gunicorn.conf.py``
+
+La app se construye una sola vez en el proceso maestro (``preload_app``) y los workers la
+comparten en copy-on-write. ``gc.freeze`` mueve los objetos precargados a la generación
+permanente para que el recolector no los toque (y no ensucie las páginas compartidas).
+"""
+import gc
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '2'))
+# Cada cliente de /events ocupa un hilo; la capacidad de /events depende de este valor (ver README)
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+preload_app = True
+
+
+def when_ready(server):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """
+    Cada worker descarta el pool heredado del maestro (por ejemplo, las conexiones del warmup)
+    sin cerrarlas, para no compartir sockets de Postgres entre procesos.
+    """
+    from app import db
+
+    flask_app = server.app.wsgi()
+    with flask_app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
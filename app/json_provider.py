@@ -0,0 +1,80 @@
+"""
+Serialización JSON de la API.
+
+Flask usa por defecto el módulo estándar ``json``; aquí se registra un proveedor
+basado en ``orjson`` (mucho más rápido para las listas de preguntas y artículos)
+y se deja el proveedor estándar como respaldo si ``orjson`` no está instalado.
+"""
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson es opcional
+    orjson = None
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Mantiene el mismo contrato que ``DefaultJSONProvider`` (fechas en formato HTTP,
+    UUID, dataclasses, llaves ordenadas y texto UTF-8 sin escapar) pero codifica con orjson.
+    Si se pasan argumentos propios de ``json.dumps`` se delega en el proveedor estándar.
+    """
+    ensure_ascii = False
+
+    def _options(self):
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps_bytes(self, obj) -> bytes:
+        if orjson is None:
+            return self.dumps(obj).encode('utf-8')
+        return orjson.dumps(obj, default=self.default, option=self._options())
+
+    def dumps(self, obj, **kwargs) -> str:
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        if orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def stream_json_array(items, key: str = None, provider: OrjsonProvider = None) -> Response:
+    """
+    Envía una lista JSON elemento por elemento a partir de un generador (por ejemplo un
+    cursor del lado del servidor con ``yield_per``), sin materializar la lista completa.
+    Si se indica ``key`` la lista se envuelve en un objeto: ``{"key": [...]}``.
+    """
+    dumps_bytes = (provider or current_app.json).dumps_bytes
+    prefix = b'{"' + key.encode('utf-8') + b'":[' if key else b'['
+    suffix = b']}\n' if key else b']\n'
+
+    def generate():
+        # Se agrupan los elementos en bloques para no hacer una escritura por fila
+        buffer = bytearray(prefix)
+        first = True
+        for item in items:
+            if not first:
+                buffer += b','
+            first = False
+            buffer += dumps_bytes(item)
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += suffix
+        yield bytes(buffer)
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -0,0 +1,121 @@
+"""
+Acceso a los archivos de los artículos (PDF y videos) guardados en S3.
+
+- ``MediaStore.describe`` obtiene tamaño, hash, tipo MIME y última modificación con un HEAD
+  (y lee el objeto completo solo si S3 no guardó un checksum SHA-256).
+- ``MediaStore.presigned_url`` firma URLs de descarga y reutiliza la firma mientras le quede
+  al menos la mitad de su vigencia.
+- ``MediaStore.get_object`` descarga por rangos de bytes para el proxy con soporte de ``Range``.
+
+``S3_ENDPOINT_URL`` permite apuntar a un S3 local (moto server, MinIO) en pruebas.
+"""
+import base64
+import hashlib
+import os
+import threading
+import time
+from urllib.parse import quote, unquote_plus, urlparse
+
+HASH_CHUNK_SIZE = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def parse_s3_url(url: str):
+    """
+    Devuelve ``(bucket, key)`` para URLs de S3 de estilo virtual-host
+    (``https://bucket.s3.amazonaws.com/key``) o de ruta (``https://s3.amazonaws.com/bucket/key``).
+    """
+    parsed = urlparse(url)
+    host = parsed.netloc
+    path = unquote_plus(parsed.path.lstrip('/'))
+    if '.s3.' in host or '.s3-' in host:
+        return host.split('.s3', 1)[0], path
+    bucket, _, key = path.partition('/')
+    return bucket, key
+
+
+def s3_url(endpoint_url: str, bucket: str, key: str) -> str:
+    """
+    URL de estilo de ruta del objeto en el endpoint del cliente (AWS, MinIO o moto server);
+    ``parse_s3_url`` la vuelve a separar en bucket y llave.
+    """
+    return f"{endpoint_url.rstrip('/')}/{bucket}/{quote(key)}"
+
+
+class MediaStore:
+    def __init__(self, app=None):
+        self._client = None
+        self._signatures = {}
+        self._lock = threading.Lock()
+        self.endpoint_url = None
+        self.presigned_ttl = 3600
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('S3_ENDPOINT_URL', os.getenv('S3_ENDPOINT_URL'))
+        app.config.setdefault('MEDIA_PRESIGNED_TTL', int(os.getenv('MEDIA_PRESIGNED_TTL', '3600')))
+        self.endpoint_url = app.config['S3_ENDPOINT_URL']
+        self.presigned_ttl = app.config['MEDIA_PRESIGNED_TTL']
+        app.extensions['media_store'] = self
+
+    @property
+    def client(self):
+        # boto3 se importa la primera vez que se usa para no cargarlo en el arranque
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('s3', endpoint_url=self.endpoint_url)
+        return self._client
+
+    def describe(self, url: str, compute_hash: bool = False, hashed_etag: str = None) -> dict:
+        """
+        ``hashed_etag``: ETag de la versión cuyo hash ya se tiene; si el objeto no cambió no se
+        vuelve a leer completo aunque se pida ``compute_hash`` (``hash_contenido`` queda en ``None``).
+        """
+        bucket, key = parse_s3_url(url)
+        head = self.client.head_object(Bucket=bucket, Key=key, ChecksumMode='ENABLED')
+        etag = head.get('ETag', '').strip('"')
+        content_hash = None
+        if head.get('ChecksumSHA256') and '-' not in head['ChecksumSHA256']:
+            content_hash = base64.b64decode(head['ChecksumSHA256']).hex()
+        elif compute_hash and etag != hashed_etag:
+            content_hash = self.sha256(bucket, key)
+        return {
+            'tamano_bytes': head['ContentLength'],
+            'hash_contenido': content_hash,
+            'etag': etag,
+            'tipo_mime': head.get('ContentType'),
+            'ultima_modificacion': head.get('LastModified'),
+        }
+
+    def sha256(self, bucket: str, key: str) -> str:
+        digest = hashlib.sha256()
+        body = self.client.get_object(Bucket=bucket, Key=key)['Body']
+        for chunk in body.iter_chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def presigned_url(self, url: str):
+        """
+        Devuelve ``(url_firmada, segundos_restantes)``.
+        """
+        bucket, key = parse_s3_url(url)
+        now = time.time()
+        with self._lock:
+            cached = self._signatures.get((bucket, key))
+        if cached is not None and cached[1] - now > self.presigned_ttl / 2:
+            return cached[0], int(cached[1] - now)
+        signed = self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=self.presigned_ttl)
+        with self._lock:
+            self._signatures[(bucket, key)] = (signed, now + self.presigned_ttl)
+        return signed, self.presigned_ttl
+
+    def get_object(self, url: str, byte_range: str = None, if_none_match: str = None) -> dict:
+        bucket, key = parse_s3_url(url)
+        params = {'Bucket': bucket, 'Key': key}
+        if byte_range:
+            params['Range'] = byte_range
+        if if_none_match:
+            params['IfNoneMatch'] = if_none_match
+        return self.client.get_object(**params)
@@ -0,0 +1,104 @@
+"""
+Extracción offline de vistas previas de los archivos de los artículos.
+
+Cada archivo se procesa en un proceso aparte (``ProcessPoolExecutor``):
+- PDF: número de páginas y miniatura de la primera página (``pdfinfo`` / ``pdftoppm`` de poppler).
+- Video: duración y fotograma de portada (``ffprobe`` / ``ffmpeg``). El video no se descarga:
+  ffmpeg lee por rangos desde una URL firmada solo los bytes que necesita.
+
+Las miniaturas se suben al mismo bucket bajo ``previews/<hash>.png`` y su URL se arma con el
+endpoint del cliente de S3 (``S3_ENDPOINT_URL`` si está configurado). Los procesos no tocan la
+base de datos; el proceso principal guarda los resultados.
+"""
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from media import parse_s3_url, s3_url
+
+THUMBNAIL_WIDTH = 320
+COMMAND_TIMEOUT = 120
+
+
+def _s3_client(endpoint_url):
+    import boto3
+    return boto3.client('s3', endpoint_url=endpoint_url)
+
+
+def _pdf_metadata(path: str, workdir: str):
+    info = subprocess.run(['pdfinfo', path], capture_output=True, text=True, check=True, timeout=COMMAND_TIMEOUT)
+    match = re.search(r'^Pages:\s+(\d+)', info.stdout, re.MULTILINE)
+    paginas = int(match.group(1)) if match else None
+    prefix = os.path.join(workdir, 'miniatura')
+    subprocess.run(
+        ['pdftoppm', '-png', '-f', '1', '-l', '1', '-scale-to', str(THUMBNAIL_WIDTH), '-singlefile', path, prefix],
+        capture_output=True, check=True, timeout=COMMAND_TIMEOUT)
+    return {'paginas': paginas}, prefix + '.png'
+
+
+def _video_metadata(source: str, workdir: str):
+    probe = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'json', source],
+        capture_output=True, text=True, check=True, timeout=COMMAND_TIMEOUT)
+    duracion = float(json.loads(probe.stdout)['format']['duration'])
+    poster = os.path.join(workdir, 'miniatura.png')
+    # Portada en el segundo 1 (o al inicio si el video es más corto)
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-ss', '1' if duracion > 1 else '0', '-i', source, '-frames:v', '1',
+         '-vf', f'scale={THUMBNAIL_WIDTH}:-2', '-y', poster],
+        capture_output=True, check=True, timeout=COMMAND_TIMEOUT)
+    return {'duracion_segundos': round(duracion, 2)}, poster
+
+
+def extract_preview(task: dict) -> dict:
+    """
+    Corre en un proceso del pool. ``task`` tiene articulo_id, url, tipo, hash_contenido y endpoint_url.
+    """
+    result = {
+        'articulo_id': task['articulo_id'],
+        'hash_contenido': task['hash_contenido'],
+        'paginas': None,
+        'duracion_segundos': None,
+        'miniatura_url': None,
+        'error': None,
+    }
+    client = _s3_client(task['endpoint_url'])
+    bucket, key = parse_s3_url(task['url'])
+    workdir = tempfile.mkdtemp(prefix='preview-')
+    try:
+        if task['tipo'] == 'video':
+            source = client.generate_presigned_url(
+                'get_object', Params={'Bucket': bucket, 'Key': key}, ExpiresIn=3600)
+            metadata, thumbnail = _video_metadata(source, workdir)
+        else:
+            path = os.path.join(workdir, 'archivo.pdf')
+            client.download_file(bucket, key, path)
+            metadata, thumbnail = _pdf_metadata(path, workdir)
+        result.update(metadata)
+        thumbnail_key = f"previews/{task['hash_contenido']}.png"
+        client.upload_file(thumbnail, bucket, thumbnail_key, ExtraArgs={'ContentType': 'image/png'})
+        result['miniatura_url'] = s3_url(client.meta.endpoint_url, bucket, thumbnail_key)
+    except Exception as error:
+        result['error'] = str(error)[:500]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def run_pipeline(tasks: list, workers: int = None):
+    """
+    Procesa las tareas en un pool de procesos y va entregando los resultados a medida que terminan.
+    Se usa ``spawn`` para que los procesos no hereden conexiones abiertas a la base.
+    """
+    if not tasks:
+        return
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(extract_preview, task) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
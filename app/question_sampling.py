@@ -0,0 +1,88 @@
+"""
+Sorteo de preguntas para exámenes que toman N preguntas al azar de un banco grande.
+
+El banco de cada examen se guarda como un arreglo de ids (y un arreglo por etiqueta), así que
+cada sorteo cuesta O(N) sin importar el tamaño del banco y sin ``ORDER BY random()`` en la base.
+El sorteo depende solo de la semilla: al calificar se vuelve a sortear con la misma semilla
+para saber qué preguntas le tocaron al usuario.
+
+La semilla la elige el servidor y viaja firmada (junto con el id del examen y la hora de emisión):
+si el cliente pudiera elegirla, probaría semillas hasta dar con las preguntas que ya conoce.
+"""
+import random
+import secrets
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+SALT_SEMILLA = 'semilla-examen'
+
+
+class SemillaInvalida(ValueError):
+    pass
+
+
+def nueva_semilla() -> int:
+    return secrets.randbits(53)
+
+
+def firmar_semilla(secreto: str, examen_id: int, semilla: int) -> str:
+    return URLSafeTimedSerializer(secreto, salt=SALT_SEMILLA).dumps([examen_id, semilla])
+
+
+def leer_semilla(secreto: str, token, examen_id: int, max_age: float) -> int:
+    """
+    Semilla de un token emitido por ``firmar_semilla`` para el examen ``examen_id`` hace menos de
+    ``max_age`` segundos. Lanza ``SemillaInvalida`` si falta, no es del servidor o ya venció.
+    """
+    if not isinstance(token, str) or not token:
+        raise SemillaInvalida('Falta la semilla del intento; pida el examen de nuevo')
+    try:
+        examen, semilla = URLSafeTimedSerializer(secreto, salt=SALT_SEMILLA).loads(token, max_age=max_age)
+    except (BadSignature, TypeError, ValueError):
+        raise SemillaInvalida('Semilla inválida o vencida; pida el examen de nuevo')
+    if examen != examen_id or not isinstance(semilla, int):
+        raise SemillaInvalida('La semilla no corresponde a este examen')
+    return semilla
+
+
+def repartir_cuotas(cantidad: int, tamanos: dict) -> dict:
+    """
+    Reparte ``cantidad`` preguntas entre las etiquetas proporcionalmente al tamaño de cada una
+    (método del mayor residuo). Ninguna etiqueta recibe más preguntas de las que tiene.
+    """
+    total = sum(tamanos.values())
+    cuotas = {}
+    residuos = []
+    for etiqueta in sorted(tamanos):
+        exacto = cantidad * tamanos[etiqueta] / total
+        cuotas[etiqueta] = int(exacto)
+        residuos.append((exacto - int(exacto), etiqueta))
+    faltantes = cantidad - sum(cuotas.values())
+    for _, etiqueta in sorted(residuos, key=lambda residuo: (-residuo[0], residuo[1])):
+        if faltantes <= 0:
+            break
+        if cuotas[etiqueta] < tamanos[etiqueta]:
+            cuotas[etiqueta] += 1
+            faltantes -= 1
+    return cuotas
+
+
+def sortear_ids(banco: dict, cantidad: int, semilla: int, estratificar: bool = False) -> list:
+    """
+    :param banco: ``{'ids': [...], 'por_etiqueta': {etiqueta: [...]}}`` con los ids ordenados.
+    :param cantidad: preguntas por intento; si es None o cubre todo el banco se devuelven todas.
+    """
+    ids = banco['ids']
+    if not cantidad or cantidad >= len(ids):
+        return list(ids)
+    rng = random.Random(semilla)
+    if not estratificar:
+        return rng.sample(ids, cantidad)
+
+    por_etiqueta = banco['por_etiqueta']
+    cuotas = repartir_cuotas(cantidad, {etiqueta: len(grupo) for etiqueta, grupo in por_etiqueta.items()})
+    seleccion = []
+    for etiqueta in sorted(cuotas):
+        seleccion.extend(rng.sample(por_etiqueta[etiqueta], cuotas[etiqueta]))
+    rng.shuffle(seleccion)
+    return seleccion
@@ -0,0 +1,106 @@
+"""
+Recalificación en bloque de los resultados guardados de un examen cuando cambia su clave de
+respuestas (``Pregunta.respuesta_correcta``).
+
+Los envíos se cargan como una matriz ``envíos x preguntas`` con el código de la opción elegida y
+se califican en una sola operación vectorizada contra la clave. Las celdas que no se pueden volver
+a calificar (resultados anteriores a que se guardara la opción elegida, o preguntas que ya no están
+en el examen) conservan la calificación guardada.
+"""
+import numpy as np
+
+OPCIONES = ('A', 'B', 'C', 'D')
+SIN_OPCION = 0
+
+
+def codigo_opcion(opcion) -> int:
+    return OPCIONES.index(opcion) + 1 if opcion in OPCIONES else SIN_OPCION
+
+
+class Envios:
+    """
+    Matrices de un conjunto de envíos:
+    - ``seleccion``: código de la opción elegida (0 si no se puede recalificar la celda),
+    - ``presente``: la pregunta está en el envío y se puede recalificar,
+    - ``correctas_anteriores``: calificación guardada de cada celda recalificable,
+    - ``clave_anterior``: código de la respuesta correcta con la que se calificó cada celda,
+    - ``correctas_fijas``: respuestas correctas guardadas que no se pueden recalificar.
+    """
+    def __init__(self, respuestas: list, columnas: dict, por_enunciado: dict, textos: list):
+        """
+        :param respuestas: lista de ``ResultadoExamen.respuestas`` (JSON) de cada envío.
+        :param columnas: id de pregunta -> columna de la matriz.
+        :param por_enunciado: enunciado -> id de pregunta (resultados que no guardan el id).
+        :param textos: por columna, texto de cada opción -> su código. Solo para resultados que no
+            guardan ``opcion_correcta``: sus respuestas incorrectas guardan el texto de la opción
+            correcta, no la letra, y un texto que no esté (p. ej. repetido en dos opciones) cuenta
+            como calificado con otra clave.
+        """
+        filas, preguntas = len(respuestas), len(columnas)
+        self.seleccion = np.zeros((filas, preguntas), dtype=np.int8)
+        self.presente = np.zeros((filas, preguntas), dtype=bool)
+        self.correctas_anteriores = np.zeros((filas, preguntas), dtype=bool)
+        self.clave_anterior = np.zeros((filas, preguntas), dtype=np.int8)
+        self.correctas_fijas = np.zeros(filas, dtype=np.int32)
+        self.contestadas = np.zeros(filas, dtype=np.int32)
+        for fila, resultado in enumerate(respuestas):
+            preguntas_envio = (resultado or {}).get('questions') or []
+            self.contestadas[fila] = len(preguntas_envio)
+            for pregunta in preguntas_envio:
+                correcta = pregunta.get('respuesta') == 'correcta'
+                pregunta_id = pregunta.get('pregunta_id') or por_enunciado.get(pregunta.get('enunciado_pregunta'))
+                columna = columnas.get(pregunta_id)
+                codigo = codigo_opcion(pregunta.get('opcion_seleccionada'))
+                if columna is None or codigo == SIN_OPCION:
+                    self.correctas_fijas[fila] += correcta
+                    continue
+                self.seleccion[fila, columna] = codigo
+                self.presente[fila, columna] = True
+                self.correctas_anteriores[fila, columna] = correcta
+                if pregunta.get('opcion_correcta'):
+                    self.clave_anterior[fila, columna] = codigo_opcion(pregunta['opcion_correcta'])
+                else:
+                    self.clave_anterior[fila, columna] = codigo if correcta else textos[columna].get(
+                        pregunta.get('respuesta_correcta'), SIN_OPCION)
+
+
+def calificar(envios: Envios, clave: np.ndarray, totales: np.ndarray):
+    """
+    Devuelve ``(celdas correctas, respuestas correctas por envío, puntaje 0-100 por envío)``.
+
+    :param clave: código de la opción correcta de cada columna.
+    :param totales: número de preguntas que cuentan en cada envío (denominador del puntaje).
+    """
+    correctas = (envios.seleccion == clave[np.newaxis, :]) & envios.presente
+    validas = correctas.sum(axis=1, dtype=np.int32) + envios.correctas_fijas
+    puntaje = np.divide(validas * 100.0, totales, out=np.zeros(len(validas)), where=totales > 0)
+    return correctas, validas, puntaje
+
+
+class Recalificacion:
+    """
+    Resultado de recalificar un examen:
+    - ``cambiados``: índices de los envíos calificados con otra clave o cuyo puntaje cambió,
+    - ``puntajes``, ``validas`` y ``correctas``: nueva calificación de cada envío,
+    - ``diferencia_correctas``: cambio en respuestas correctas de cada pregunta (columna),
+    - ``diferencia_por_envio``: el mismo cambio por envío y pregunta.
+    """
+    def __init__(self, envios: Envios, opciones_clave: list, con_sorteo: list, sorteadas: int,
+                 puntajes_anteriores: list):
+        """
+        :param opciones_clave: opción correcta (``'A'``...) de cada columna.
+        :param con_sorteo: si cada envío tiene semilla; esos cuentan ``sorteadas`` preguntas aunque
+            no las hayan contestado todas.
+        """
+        clave = np.array([codigo_opcion(opcion) for opcion in opciones_clave], dtype=np.int8)
+        totales = np.where(np.array(con_sorteo, dtype=bool) & (sorteadas > 0), sorteadas, envios.contestadas)
+        self.correctas, self.validas, self.puntajes = calificar(envios, clave, totales)
+        anteriores = np.array(puntajes_anteriores, dtype=np.float64)
+        # Una respuesta incorrecta también cambia si cambió la clave: guarda el texto de la opción correcta
+        otra_clave = ((envios.clave_anterior != clave[np.newaxis, :]) & envios.presente).any(axis=1)
+        otro_puntaje = ~np.isclose(self.puntajes, anteriores)
+        self.cambiados = np.flatnonzero(otro_puntaje | otra_clave)
+        self.puntajes_cambiados = int(otro_puntaje.sum())
+        self.diferencia_puntos = float((self.puntajes[self.cambiados] - anteriores[self.cambiados]).sum())
+        self.diferencia_por_envio = self.correctas.astype(np.int8) - envios.correctas_anteriores.astype(np.int8)
+        self.diferencia_correctas = self.diferencia_por_envio.sum(axis=0, dtype=np.int64)
@@ -0,0 +1,249 @@
+"""
+Búsqueda de texto completo sobre cursos, artículos y preguntas.
+
+En Postgres cada tabla tiene una columna generada ``busqueda`` (tsvector con la configuración
+``es_unaccent``: stemming en español e insensible a acentos) con índice GIN; la base la mantiene
+al escribir. En cualquier otra base (SQLite en pruebas) se usa un índice invertido en memoria que
+se construye en la primera búsqueda y se actualiza al hacer commit.
+"""
+import math
+import re
+import threading
+import unicodedata
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import Session
+
+# tipo -> (columna título [peso A], columna contenido [peso B], columna del padre para navegar)
+SEARCH_COLUMNS = {
+    'curso': ('nombre', 'contenido', 'bloque_curso_id'),
+    'articulo': ('titulo', 'contenido', 'curso_id'),
+    'pregunta': ('enunciado', None, 'examen_id'),
+}
+
+# Pesos de ts_rank por defecto para A y B
+WEIGHT_TITLE = 1.0
+WEIGHT_CONTENT = 0.4
+
+POSTGRES_CONFIG_DDL = """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION es_unaccent (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION es_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END
+$$;
+"""
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'e', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'o', 'para',
+    'por', 'que', 'se', 'sin', 'su', 'sus', 'un', 'una', 'uno', 'unos', 'unas', 'y',
+}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def postgres_column_ddl(tipo: str) -> str:
+    titulo, contenido, _ = SEARCH_COLUMNS[tipo]
+    vector = f"setweight(to_tsvector('es_unaccent'::regconfig, coalesce({titulo}, '')), 'A')"
+    if contenido:
+        vector += f" || setweight(to_tsvector('es_unaccent'::regconfig, coalesce({contenido}, '')), 'B')"
+    return (f"ALTER TABLE {tipo} ADD COLUMN IF NOT EXISTS busqueda tsvector "
+            f"GENERATED ALWAYS AS ({vector}) STORED;\n"
+            f"CREATE INDEX IF NOT EXISTS ix_{tipo}_busqueda ON {tipo} USING GIN (busqueda);")
+
+
+def normalizar(texto: str) -> str:
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+SUFIJOS = sorted([
+    'aciones', 'acion', 'mente', 'icos', 'icas', 'ico', 'ica', 'ios', 'ias', 'io', 'ia',
+    'es', 'os', 'as', 's', 'o', 'a', 'e',
+], key=len, reverse=True)
+
+
+def raiz(palabra: str) -> str:
+    """
+    Stemming liviano en español: quita el sufijo más largo conocido dejando al menos 4 letras.
+    Es suficiente para que "hemofílicos" encuentre "hemofilia" en el índice de pruebas.
+    """
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= 4:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def terminos(texto: str) -> list:
+    if not texto:
+        return []
+    return [raiz(token) for token in TOKEN_RE.findall(normalizar(texto)) if token not in STOPWORDS]
+
+
+class InvertedIndex:
+    """
+    Índice invertido en memoria: término -> {(tipo, id): peso}.
+    """
+    def __init__(self):
+        self.built = False
+        self.postings = {}
+        self.documents = {}
+        self._lock = threading.RLock()
+
+    def clear(self):
+        with self._lock:
+            self.built = False
+            self.postings = {}
+            self.documents = {}
+
+    def remove(self, key):
+        with self._lock:
+            document = self.documents.pop(key, None)
+            if document is None:
+                return
+            for termino in document['terminos']:
+                posting = self.postings.get(termino)
+                if posting is not None:
+                    posting.pop(key, None)
+                    if not posting:
+                        del self.postings[termino]
+
+    def add(self, key, titulo, contenido, padre_id):
+        pesos = {}
+        for termino in terminos(titulo):
+            pesos[termino] = pesos.get(termino, 0) + WEIGHT_TITLE
+        for termino in terminos(contenido):
+            pesos[termino] = pesos.get(termino, 0) + WEIGHT_CONTENT
+        with self._lock:
+            self.remove(key)
+            self.documents[key] = {'titulo': titulo, 'padre_id': padre_id, 'terminos': list(pesos)}
+            for termino, peso in pesos.items():
+                self.postings.setdefault(termino, {})[key] = peso
+
+    def search(self, query: str, tipos, offset: int, limit: int) -> list:
+        consulta = set(terminos(query))
+        if not consulta:
+            return []
+        with self._lock:
+            postings = [self.postings.get(termino, {}) for termino in consulta]
+            if not all(postings):
+                return []
+            postings.sort(key=len)
+            candidatos = set(postings[0]).intersection(*postings[1:])
+            total = len(self.documents)
+            resultados = []
+            for key in candidatos:
+                if key[0] not in tipos:
+                    continue
+                rank = sum(posting[key] * math.log(1 + total / len(posting)) for posting in postings)
+                document = self.documents[key]
+                resultados.append((rank, key, document))
+        resultados.sort(key=lambda r: (-r[0], r[1]))
+        return [
+            {'tipo': key[0], 'id': key[1], 'titulo': document['titulo'],
+             'padre_id': document['padre_id'], 'rank': round(rank, 6)}
+            for rank, key, document in resultados[offset:offset + limit]
+        ]
+
+
+class CatalogSearch:
+    def __init__(self, db, models: dict):
+        self.db = db
+        self.models = models
+        self.index = InvertedIndex()
+        for tipo, model in models.items():
+            event.listen(model.__table__, 'after_create',
+                         DDL(postgres_column_ddl(tipo)).execute_if(dialect='postgresql'))
+        event.listen(db.metadata, 'before_create', DDL(POSTGRES_CONFIG_DDL).execute_if(dialect='postgresql'))
+        event.listen(db.metadata, 'after_create', lambda *args, **kwargs: self.index.clear())
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def init_app(self, app):
+        app.extensions['catalog_search'] = self
+
+    def create_postgres_index(self):
+        """
+        Agrega columnas e índices de búsqueda a una base existente (idempotente).
+        """
+        with self.db.engine.begin() as connection:
+            connection.execute(text(POSTGRES_CONFIG_DDL))
+            for tipo in self.models:
+                connection.execute(text(postgres_column_ddl(tipo)))
+
+    def _uses_postgres(self) -> bool:
+        return self.db.engine.dialect.name == 'postgresql'
+
+    def _after_flush(self, session, flush_context):
+        if not self.index.built:
+            return
+        pendientes = session.info.setdefault('busqueda_pendiente', [])
+        for obj in list(session.new) + list(session.dirty):
+            tipo = obj.__table__.name if hasattr(obj, '__table__') else None
+            if tipo in self.models:
+                titulo, contenido, padre = SEARCH_COLUMNS[tipo]
+                pendientes.append(((tipo, obj.id), getattr(obj, titulo),
+                                   getattr(obj, contenido) if contenido else None, getattr(obj, padre)))
+        for obj in session.deleted:
+            tipo = obj.__table__.name if hasattr(obj, '__table__') else None
+            if tipo in self.models:
+                pendientes.append(((tipo, obj.id), None, None, None))
+
+    def _after_commit(self, session):
+        for key, titulo, contenido, padre_id in session.info.pop('busqueda_pendiente', []):
+            if titulo is None:
+                self.index.remove(key)
+            else:
+                self.index.add(key, titulo, contenido, padre_id)
+
+    def _after_rollback(self, session):
+        session.info.pop('busqueda_pendiente', None)
+
+    def build_index(self):
+        self.index.clear()
+        for tipo, model in self.models.items():
+            titulo, contenido, padre = SEARCH_COLUMNS[tipo]
+            columnas = [model.id, getattr(model, titulo), getattr(model, padre)]
+            if contenido:
+                columnas.append(getattr(model, contenido))
+            for row in self.db.session.query(*columnas).execution_options(yield_per=1000):
+                self.index.add((tipo, row[0]), row[1], row[3] if contenido else None, row[2])
+        self.index.built = True
+
+    def search(self, query: str, page: int = 1, page_size: int = 20, tipos=None):
+        """
+        Devuelve ``(resultados, hay_mas)`` ordenados por relevancia.
+        """
+        tipos = [tipo for tipo in (tipos or self.models) if tipo in self.models]
+        if not tipos:
+            # Sin tipos conocidos no hay nada que unir en el UNION ALL
+            return [], False
+        offset = (page - 1) * page_size
+        if not self._uses_postgres():
+            if not self.index.built:
+                self.build_index()
+            resultados = self.index.search(query, set(tipos), offset, page_size + 1)
+            return resultados[:page_size], len(resultados) > page_size
+
+        selects = []
+        for tipo in tipos:
+            titulo, _, padre = SEARCH_COLUMNS[tipo]
+            selects.append(
+                f"SELECT '{tipo}' AS tipo, id, {titulo} AS titulo, {padre} AS padre_id, "
+                f"ts_rank_cd(busqueda, q.query) AS rank FROM {tipo}, q WHERE busqueda @@ q.query")
+        sql = text(
+            "WITH q AS (SELECT websearch_to_tsquery('es_unaccent', :query) AS query) "
+            + " UNION ALL ".join(selects)
+            + " ORDER BY rank DESC, tipo, id LIMIT :limit OFFSET :offset")
+        rows = self.db.session.execute(sql, {'query': query, 'limit': page_size + 1, 'offset': offset}).all()
+        resultados = [
+            {'tipo': row.tipo, 'id': row.id, 'titulo': row.titulo, 'padre_id': row.padre_id,
+             'rank': float(row.rank)}
+            for row in rows
+        ]
+        return resultados[:page_size], len(resultados) > page_size
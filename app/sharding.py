@@ -0,0 +1,260 @@
+"""
+Particionamiento horizontal (sharding) de los resultados de cada usuario por hash del email.
+
+``resultado_examen`` y ``puntaje_usuario`` viven en N bases (``SHARD_URIS`` o la variable de
+entorno ``db_shard_uris``, URIs separadas por coma). Cada email cae siempre en la misma base
+(jump consistent hash sobre blake2b del email), así que los endpoints de un usuario consultan
+una sola base. El catálogo (especializaciones, cursos, exámenes...) sigue en la base principal;
+por eso en las bases de shards las tablas se crean sin llaves foráneas.
+
+Sin shards configurados todo sigue en la base principal y ``session_for`` devuelve ``db.session``.
+
+Los ids de cada shard usan secuencias disjuntas (inicio = índice + 1, incremento
+``SHARD_ID_STRIDE``), así un id identifica un único resultado aunque el usuario cambie de shard.
+"""
+import hashlib
+import os
+import queue
+import threading
+
+from flask import g
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable, DropTable
+
+SHARD_ID_STRIDE = 1024
+SCATTER_QUEUE_SIZE = 8
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping y Veach): al pasar de N a N+1 shards solo se mueve 1/(N+1)
+    de los usuarios.
+    """
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def normalize_email(email: str) -> str:
+    """
+    Forma del email con la que se elige el shard y se compara el dueño de una fila.
+    """
+    return (email or '').strip().lower()
+
+
+def shard_index(email: str, buckets: int) -> int:
+    digest = hashlib.blake2b(normalize_email(email).encode('utf-8'), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, 'big'), buckets)
+
+
+class UserShards:
+    def __init__(self, db, models=(), app=None):
+        self.db = db
+        self.models = list(models)
+        self.shard_keys = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Debe llamarse antes de ``db.init_app``: agrega los shards a ``SQLALCHEMY_BINDS``.
+        """
+        uris = [uri.strip() for uri in os.getenv('db_shard_uris', '').split(',') if uri.strip()]
+        app.config.setdefault('SHARD_URIS', uris)
+        binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+        self.shard_keys = []
+        for number, uri in enumerate(app.config['SHARD_URIS']):
+            key = f'shard_{number}'
+            binds[key] = uri
+            self.shard_keys.append(key)
+        app.extensions['user_shards'] = self
+        app.teardown_appcontext(self._close_sessions)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.shard_keys)
+
+    @property
+    def partitioned(self) -> bool:
+        """
+        Si los resultados están repartidos en más de una base (un id solo no basta para encontrarlos).
+        """
+        return len(self.shard_keys) > 1
+
+    @property
+    def tables(self):
+        return [model.__table__ for model in self.models]
+
+    def engine(self, number: int):
+        return self.db.engines[self.shard_keys[number]]
+
+    def shard_for(self, email: str) -> int:
+        return shard_index(email, len(self.shard_keys))
+
+    def session(self, number: int) -> Session:
+        sessions = g.setdefault('shard_sessions', {})
+        if number not in sessions:
+            sessions[number] = Session(bind=self.engine(number))
+        return sessions[number]
+
+    def session_for(self, email: str):
+        """
+        Sesión de la base donde viven los resultados del usuario.
+        """
+        if not self.enabled:
+            return self.db.session
+        return self.session(self.shard_for(email))
+
+    def sessions(self):
+        if not self.enabled:
+            return [self.db.session]
+        return [self.session(number) for number in range(len(self.shard_keys))]
+
+    @staticmethod
+    def _close_sessions(exception=None):
+        for session in g.pop('shard_sessions', {}).values():
+            session.close()
+
+    def create_tables(self):
+        for number in range(len(self.shard_keys)):
+            engine = self.engine(number)
+            with engine.begin() as connection:
+                for table in self.tables:
+                    if engine.dialect.has_table(connection, table.name):
+                        continue
+                    connection.execute(CreateTable(table, include_foreign_key_constraints=[]))
+                    for index in table.indexes:
+                        index.create(connection)
+                    if engine.dialect.name == 'postgresql':
+                        connection.execute(text(
+                            f'ALTER SEQUENCE {table.name}_id_seq INCREMENT BY {SHARD_ID_STRIDE} '
+                            f'RESTART WITH {number + 1}'))
+
+    def drop_tables(self):
+        for number in range(len(self.shard_keys)):
+            with self.engine(number).begin() as connection:
+                for table in reversed(self.tables):
+                    if self.engine(number).dialect.has_table(connection, table.name):
+                        connection.execute(DropTable(table))
+
+    def scatter_stream(self, statement, batch_size: int = 1000):
+        """
+        Ejecuta ``statement`` en todos los shards en paralelo (un hilo por shard con cursor del
+        servidor) y entrega las filas a medida que llegan. La cola es acotada, así que la memoria
+        no depende del total de filas.
+        """
+        if not self.enabled:
+            yield from self.db.session.execute(
+                statement.execution_options(stream_results=True, yield_per=batch_size))
+            return
+
+        results = queue.Queue(maxsize=SCATTER_QUEUE_SIZE * len(self.shard_keys))
+        done = object()
+        cancel = threading.Event()
+        # Los engines se obtienen aquí: los hilos no tienen contexto de la app
+        engines = [self.engine(number) for number in range(len(self.shard_keys))]
+
+        def worker(engine):
+            try:
+                with engine.connect() as connection:
+                    rows = connection.execution_options(stream_results=True, yield_per=batch_size).execute(statement)
+                    for batch in rows.partitions():
+                        if cancel.is_set():
+                            return
+                        results.put(batch)
+                results.put(done)
+            except Exception as error:
+                results.put(error)
+
+        threads = [threading.Thread(target=worker, args=(engine,), daemon=True) for engine in engines]
+        for thread in threads:
+            thread.start()
+        pending = len(threads)
+        try:
+            while pending:
+                item = results.get()
+                if item is done:
+                    pending -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield from item
+        finally:
+            cancel.set()
+            # Libera a los hilos que estén esperando lugar en la cola
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def find(self, model, row_id, email: str = None):
+        """
+        Busca por id en el shard del usuario. Solo devuelve la fila si es de ``email``: los ids se
+        pueden repetir entre shards y un id ajeno no debe revelar datos de otro usuario. Sin email
+        (solo posible con una única base de resultados) busca por id como antes de los shards.
+        """
+        if not email:
+            if self.partitioned:
+                raise ValueError('Se requiere el email del dueño de la fila')
+            return self.session_for(email).get(model, row_id)
+        row = self.session_for(email).get(model, row_id)
+        if row is None or normalize_email(row.usuario_email) != normalize_email(email):
+            return None
+        return row
+
+    def rebalance(self, batch_size: int = 500, dry_run: bool = False) -> dict:
+        """
+        Mueve los datos de cada usuario al shard que le corresponde con la lista actual de
+        ``SHARD_URIS`` (por ejemplo después de agregar shards). Copia y luego borra del origen,
+        usuario por usuario en lotes; se puede volver a ejecutar. Es una tarea de mantenimiento:
+        debe correr con la app ya configurada con la nueva lista de shards.
+
+        En Postgres los ids se conservan (las secuencias son disjuntas); en otras bases (SQLite en
+        pruebas) los ids pueden repetirse entre shards, así que el destino asigna ids nuevos.
+        """
+        summary = {'usuarios_movidos': 0, 'filas_movidas': 0}
+        email_columns = [table.c.usuario_email for table in self.tables]
+        for source in range(len(self.shard_keys)):
+            source_engine = self.engine(source)
+            with source_engine.connect() as connection:
+                emails = set()
+                for column in email_columns:
+                    emails.update(connection.execute(select(column).distinct()).scalars())
+            misplaced = {}
+            for email in emails:
+                target = self.shard_for(email)
+                if target != source:
+                    misplaced.setdefault(target, []).append(email)
+            for target, target_emails in misplaced.items():
+                for start in range(0, len(target_emails), batch_size):
+                    batch = target_emails[start:start + batch_size]
+                    summary['usuarios_movidos'] += len(batch)
+                    summary['filas_movidas'] += self._move_users(source, target, batch, dry_run)
+        return summary
+
+    def _move_users(self, source: int, target: int, emails: list, dry_run: bool) -> int:
+        moved = 0
+        keep_ids = self.engine(target).dialect.name == 'postgresql'
+        with self.engine(source).begin() as source_connection, self.engine(target).begin() as target_connection:
+            for table in self.tables:
+                rows = [dict(row._mapping) for row in source_connection.execute(
+                    select(table).where(table.c.usuario_email.in_(emails)))]
+                moved += len(rows)
+                if dry_run or not rows:
+                    continue
+                ids = [row['id'] for row in rows]
+                if keep_ids:
+                    # Copias de una ejecución anterior interrumpida
+                    target_connection.execute(delete(table).where(
+                        table.c.id.in_(ids), table.c.usuario_email.in_(emails)))
+                else:
+                    for row in rows:
+                        del row['id']
+                target_connection.execute(insert(table), rows)
+                source_connection.execute(delete(table).where(table.c.id.in_(ids)))
+        return moved
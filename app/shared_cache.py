@@ -0,0 +1,220 @@
+"""
+Caché compartida entre workers para resultados calculados por usuario (puntos, insignias,
+avance de bloques, gráfica de progreso).
+
+Con ``REDIS_URL`` se usa Redis (o cualquier servidor compatible). Sin él la caché queda apagada y
+todo se calcula en cada petición: una caché por proceso no es compartida y, con varios workers de
+gunicorn, un worker seguiría sirviendo los puntos viejos después de que otro guardara un examen.
+``MemoryBackend`` solo se usa si se pasa explícitamente (pruebas).
+
+Las entradas se guardan bajo la versión vigente del usuario y del catálogo:
+``calc:<nombre>:<usuario>:<version usuario>:<version catálogo>:<parámetros>``. Invalidar es
+incrementar la versión (``INCR``): las entradas viejas dejan de leerse y expiran solas por TTL.
+Si un cálculo termina después de una escritura, queda guardado bajo la versión anterior y nadie
+lo vuelve a leer.
+
+El valor que se guarda se calcula leyendo de la primaria (``leer_de_primaria``): justo después de
+incrementar la versión una réplica atrasada todavía no tiene la escritura, y lo que se leyera de ella
+quedaría guardado bajo la versión nueva hasta que expire. Solo los fallos de caché van a la primaria;
+sin caché se lee de donde toque, porque no se guarda nada.
+
+Un candado (``SET NX``) evita que varios workers calculen a la vez la misma entrada; si Redis no
+responde, se calcula sin caché.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import current_app, has_app_context
+
+from db_routing import leer_de_primaria
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 600
+LOCK_TTL = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+class MemoryBackend:
+    """
+    Subconjunto de la API de redis-py que usa la caché, en memoria del proceso.
+    """
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._alive(key)
+            return entry[0] if entry else None
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        expires = None
+        if ex is not None:
+            expires = time.monotonic() + ex
+        elif px is not None:
+            expires = time.monotonic() + px / 1000
+        with self._lock:
+            if nx and self._alive(key) is not None:
+                return None
+            self._data[key] = (value if isinstance(value, bytes) else str(value).encode('utf-8'), expires)
+            return True
+
+    def incr(self, key):
+        with self._lock:
+            entry = self._alive(key)
+            value = int(entry[0]) + 1 if entry else 1
+            self._data[key] = (str(value).encode('utf-8'), entry[1] if entry else None)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+
+def user_key(email: str) -> str:
+    return hashlib.sha256((email or '').strip().lower().encode('utf-8')).hexdigest()[:32]
+
+
+class SharedCache:
+    def __init__(self, app=None):
+        self._default_backend = None
+        self.ttl = DEFAULT_TTL
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, backend=None):
+        """
+        ``backend``: cliente con la API de redis-py (``MemoryBackend`` o fakeredis en pruebas); si no
+        se pasa se usa ``REDIS_URL`` y, sin ella, la caché queda apagada.
+        """
+        app.config.setdefault('REDIS_URL', os.getenv('REDIS_URL'))
+        app.config.setdefault('SHARED_CACHE_TTL', int(os.getenv('SHARED_CACHE_TTL', str(DEFAULT_TTL))))
+        self.ttl = app.config['SHARED_CACHE_TTL']
+        if backend is None and app.config['REDIS_URL']:
+            import redis
+            backend = redis.Redis.from_url(app.config['REDIS_URL'], socket_timeout=0.5,
+                                           socket_connect_timeout=0.5)
+        if backend is None:
+            logger.info('Sin REDIS_URL: la caché compartida de resultados por usuario está apagada')
+        # Cada app tiene su cliente (como cada worker); fuera de un contexto se usa el último
+        app.extensions['shared_cache_backend'] = backend
+        self._default_backend = backend
+        app.extensions['shared_cache'] = self
+
+    @property
+    def backend(self):
+        if has_app_context():
+            return current_app.extensions.get('shared_cache_backend')
+        return self._default_backend
+
+    def _versions(self, email: str):
+        usuario, catalogo = self.backend.mget([f'ver:usuario:{user_key(email)}', 'ver:catalogo'])
+        return int(usuario or 0), int(catalogo or 0)
+
+    def get_or_compute(self, name: str, email: str, compute, params: tuple = ()):
+        """
+        Devuelve el valor (serializable a JSON) de ``compute()`` para el usuario, desde la caché
+        si la versión del usuario y la del catálogo no cambiaron.
+        """
+        if self.backend is None:
+            return compute()
+        try:
+            usuario, catalogo = self._versions(email)
+            suffix = hashlib.sha256(json.dumps(params, default=str).encode('utf-8')).hexdigest()[:16] if params else '-'
+            key = f'calc:{name}:{user_key(email)}:{usuario}:{catalogo}:{suffix}'
+            cached = self.backend.get(key)
+        except Exception:
+            self.errors += 1
+            logger.warning('Caché compartida no disponible; se calcula sin caché', exc_info=True)
+            return compute()
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+
+        self.misses += 1
+        lock = f'lock:{key}'
+        try:
+            leader = self.backend.set(lock, '1', px=LOCK_TTL * 1000, nx=True)
+            if not leader:
+                cached = self._wait(key)
+                if cached is not None:
+                    return json.loads(cached)
+        except Exception:
+            self.errors += 1
+            logger.warning('Caché compartida no disponible; se calcula sin caché', exc_info=True)
+            return compute()
+
+        try:
+            with leer_de_primaria():
+                value = compute()
+        finally:
+            if leader:
+                self._call(self.backend.delete, lock)
+        self._call(self.backend.set, key, json.dumps(value, default=str), ex=self.ttl)
+        return value
+
+    def _wait(self, key: str):
+        # Otro worker lo está calculando: se espera su resultado hasta que expire su candado
+        deadline = time.monotonic() + LOCK_TTL
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            cached = self.backend.get(key)
+            if cached is not None:
+                return cached
+        return None
+
+    def _call(self, operation, *args, **kwargs):
+        try:
+            return operation(*args, **kwargs)
+        except Exception:
+            self.errors += 1
+            logger.warning('Caché compartida no disponible', exc_info=True)
+            return None
+
+    def invalidate_user(self, email: str):
+        """
+        Se llama después de cada escritura del usuario (resultados de examen, puntos extra).
+        """
+        if self.backend is None:
+            return
+        if self._call(self.backend.incr, f'ver:usuario:{user_key(email)}') is not None:
+            self.invalidations += 1
+
+    def invalidate_catalog(self):
+        """
+        Cambios del catálogo (exámenes nuevos) alteran el avance e insignias de todos los usuarios.
+        """
+        if self.backend is None:
+            return
+        if self._call(self.backend.incr, 'ver:catalogo') is not None:
+            self.invalidations += 1
+
+    def metrics(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 3) if total else None,
+            'errors': self.errors,
+            'invalidations': self.invalidations,
+        }
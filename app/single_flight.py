@@ -0,0 +1,104 @@
+"""
+Agrupación de peticiones idénticas en vuelo ("single-flight").
+
+Cuando muchos alumnos abren la app al mismo tiempo, las mismas consultas fallan la caché a la
+vez. Con ``SingleFlight.do`` solo el primer hilo que llega con una llave ejecuta el cálculo; los
+demás esperan y reciben el mismo resultado (o la misma excepción). No guarda nada al terminar:
+la vigencia de los datos la deciden ``CatalogCache`` o la consulta misma.
+
+La agrupación es por proceso (entre los hilos de un worker). ``lock_factory`` permite cambiar
+el candado por uno compartido entre workers cuando exista un almacén común.
+"""
+import hashlib
+import threading
+from functools import wraps
+
+from flask import Response, current_app, request
+
+FOLLOWER_TIMEOUT = 30
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self, follower_timeout: float = FOLLOWER_TIMEOUT, lock_factory=None):
+        self.follower_timeout = follower_timeout
+        self.lock_factory = lock_factory
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            # Si el líder tarda demasiado, el seguidor calcula por su cuenta
+            if not call.done.wait(self.follower_timeout):
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            if self.lock_factory is not None:
+                with self.lock_factory(key):
+                    call.result = fn()
+            else:
+                call.result = fn()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+
+flight = SingleFlight()
+
+
+def request_key() -> tuple:
+    """
+    Identidad normalizada de la petición: vista, parámetros ordenados, usuario (token o email) y
+    base de la que se lee. Un cliente fijado a la primaria (read-your-writes) no debe recibir lo
+    que otro leyó de una réplica atrasada.
+    """
+    authorization = request.headers.get('Authorization', '')
+    router = current_app.extensions.get('db_router')
+    reads_replica = router is not None and router.should_read_replica(None)
+    return (
+        request.endpoint,
+        tuple(sorted(request.args.items(multi=True))),
+        hashlib.sha256(authorization.encode('utf-8')).hexdigest() if authorization else None,
+        'replica' if reads_replica else 'primaria',
+    )
+
+
+def coalesce(view):
+    """
+    Para vistas GET sin efectos: las peticiones idénticas concurrentes comparten una sola
+    ejecución. Cada seguidor recibe su propia copia de la respuesta.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        def run():
+            response = current_app.make_response(view(*args, **kwargs))
+            return response.status_code, response.get_data(), list(response.headers.items())
+
+        status, body, headers = flight.do(request_key(), run)
+        return Response(body, status=status, headers=headers)
+    return wrapper
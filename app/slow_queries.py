@@ -0,0 +1,225 @@
+"""
+Registro de consultas lentas y revisión de planes de ejecución.
+
+Con ``SLOW_QUERY_MS`` (opcional) cada engine registra las sentencias que tardan más que ese umbral,
+con sus parámetros y la vista que las ejecutó, y captura su plan:
+- en Postgres ``EXPLAIN (ANALYZE, BUFFERS)`` para los SELECT (se vuelven a ejecutar, dentro de un
+  savepoint) y ``EXPLAIN`` sin ANALYZE para las escrituras;
+- en otras bases ``EXPLAIN QUERY PLAN``.
+Cada sentencia se explica a lo más una vez cada ``SLOW_QUERY_EXPLAIN_INTERVAL`` segundos.
+
+``capture()`` junta todas las sentencias de un bloque de código; lo usa el comando
+``check-query-plans`` para revisar los planes de las vistas principales (``plan_shape`` y
+``sequential_scans``).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+RECENT_SLOW_QUERIES = 50
+MAX_PARAMETERS_LENGTH = 500
+READ_PREFIXES = ('select', 'with')
+
+
+def is_read(statement: str) -> bool:
+    return statement.lstrip().lower().startswith(READ_PREFIXES)
+
+
+def explain(dbapi_connection, dialect: str, statement: str, parameters, analyze: bool = False,
+            json_format: bool = False):
+    """
+    Plan de ``statement`` ejecutado en la conexión DBAPI. En Postgres devuelve el texto del plan (o el
+    JSON con ``json_format``); en otras bases las filas de ``EXPLAIN QUERY PLAN``.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        if dialect != 'postgresql':
+            cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters or ())
+            return [row[-1] for row in cursor.fetchall()]
+        options = ['ANALYZE', 'BUFFERS'] if analyze else []
+        if json_format:
+            options.append('FORMAT JSON')
+        prefix = f"EXPLAIN ({', '.join(options)}) " if options else 'EXPLAIN '
+        # Un error del EXPLAIN no debe abortar la transacción de la petición
+        cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        if json_format:
+            plan = rows[0][0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        return '\n'.join(row[0] for row in rows)
+    finally:
+        cursor.close()
+
+
+def plan_shape(plan, dialect: str) -> list:
+    """
+    Forma del plan sin costos ni tiempos (tipo de nodo, tabla e índice), para comparar planes.
+    """
+    if dialect != 'postgresql':
+        return list(plan)
+    shape = []
+
+    def walk(node, depth):
+        parts = [node['Node Type']]
+        if 'Relation Name' in node:
+            parts.append(f"on {node['Relation Name']}")
+        if 'Index Name' in node:
+            parts.append(f"using {node['Index Name']}")
+        shape.append('  ' * depth + ' '.join(parts))
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(plan[0]['Plan'], 0)
+    return shape
+
+
+def sequential_scans(plan, dialect: str) -> list:
+    """
+    Tablas que el plan lee completas.
+    """
+    if dialect != 'postgresql':
+        # SQLite: "SCAN tabla" (antes de 3.36 "SCAN TABLE tabla") sin índice, frente a
+        # "SEARCH tabla USING INDEX ..."
+        tables = []
+        for detail in plan:
+            words = detail.split()
+            if words[:1] != ['SCAN'] or 'USING' in words:
+                continue
+            if words[1:2] == ['TABLE']:
+                words = words[1:]
+            if len(words) > 1:
+                tables.append(words[1])
+        return tables
+    tables = []
+
+    def walk(node):
+        if node['Node Type'] == 'Seq Scan':
+            tables.append(node['Relation Name'])
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return tables
+
+
+def table_rows(dbapi_connection, dialect: str, table: str) -> int:
+    """
+    Filas de la tabla: la estimación del planificador en Postgres, ``COUNT(*)`` en otras bases.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        if dialect == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', (table,))
+        else:
+            cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    def __init__(self, app=None, db=None):
+        self.threshold = None
+        self.explain_enabled = True
+        self.explain_interval = 60
+        self.recent = deque(maxlen=RECENT_SLOW_QUERIES)
+        self._explained = {}
+        self._captures = []
+        self._lock = threading.Lock()
+        self._engines = set()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        """
+        Debe llamarse después de ``db.init_app`` (necesita los engines ya creados).
+        """
+        threshold = os.getenv('SLOW_QUERY_MS')
+        app.config.setdefault('SLOW_QUERY_MS', float(threshold) if threshold else None)
+        app.config.setdefault('SLOW_QUERY_EXPLAIN', os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1')
+        app.config.setdefault('SLOW_QUERY_EXPLAIN_INTERVAL', float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '60')))
+        self.threshold = app.config['SLOW_QUERY_MS']
+        self.explain_enabled = app.config['SLOW_QUERY_EXPLAIN']
+        self.explain_interval = app.config['SLOW_QUERY_EXPLAIN_INTERVAL']
+        if self.threshold is not None:
+            with app.app_context():
+                self.attach(db.engines.values())
+        app.extensions['slow_query_log'] = self
+
+    def attach(self, engines):
+        for engine in engines:
+            if engine in self._engines:
+                continue
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._engines.add(engine)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('slow_query_started')
+        if not started:
+            # La sentencia empezó antes de registrar los eventos
+            return
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+        for captured in self._captures:
+            captured.append((conn.engine, statement, parameters, elapsed_ms))
+        if self.threshold is None or elapsed_ms < self.threshold or executemany:
+            return
+        entry = {
+            'ms': round(elapsed_ms, 1),
+            'endpoint': request.endpoint if has_request_context() else None,
+            'statement': statement,
+            'parameters': repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            'plan': self._explain_once(conn, statement, parameters),
+        }
+        self.recent.append(entry)
+        logger.warning('Consulta lenta (%.1f ms, %s): %s\nParámetros: %s%s', elapsed_ms, entry['endpoint'],
+                       statement, entry['parameters'], f"\nPlan:\n{entry['plan']}" if entry['plan'] else '')
+
+    def _explain_once(self, conn, statement: str, parameters):
+        if not self.explain_enabled:
+            return None
+        key = hashlib.sha1(statement.encode('utf-8')).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(key, -self.explain_interval) < self.explain_interval:
+                return None
+            self._explained[key] = now
+        try:
+            plan = explain(conn.connection.dbapi_connection, conn.dialect.name, statement, parameters,
+                           analyze=is_read(statement))
+        except Exception as error:
+            return f'(no se pudo obtener el plan: {error})'
+        return plan if isinstance(plan, str) else '\n'.join(plan)
+
+    @contextmanager
+    def capture(self, engines=()):
+        """
+        Junta ``(engine, sentencia, parámetros, ms)`` de todas las sentencias ejecutadas en el bloque.
+        """
+        self.attach(engines)
+        captured = []
+        self._captures.append(captured)
+        try:
+            yield captured
+        finally:
+            self._captures.remove(captured)
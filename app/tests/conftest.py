@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as api  # noqa: E402
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    Fábrica de apps sobre la misma base SQLite del test (cada app hace de un worker distinto).
+    """
+    def factory(**config):
+        config.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+        return api.create_app(config)
+    return factory
+
+
+@pytest.fixture
+def seeded_app(make_app):
+    app = make_app()
+    app.test_client().get('/initial_data')
+    return app
+
+
+@pytest.fixture
+def s3_media(seeded_app, monkeypatch):
+    """
+    Bucket de moto con un archivo por cada artículo del catálogo inicial.
+    """
+    from media import parse_s3_url
+    from moto import mock_aws
+
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    monkeypatch.setattr(api.media_store, '_client', None)
+    monkeypatch.setattr(api.media_store, '_signatures', {})
+    with mock_aws():
+        client = api.media_store.client
+        with seeded_app.app_context():
+            urls = {article.id: article.url_contenido for article in api.Articulo.query}
+        for article_id, url in urls.items():
+            bucket, key = parse_s3_url(url)
+            client.create_bucket(Bucket=bucket)
+            client.put_object(Bucket=bucket, Key=key, Body=bytes(range(256)) * 8 + str(article_id).encode())
+        yield client
@@ -0,0 +1,40 @@
+import threading
+import time
+
+import app as api
+from admission import RouteLimiter
+
+
+def test_full_queue_and_timeout_are_shed():
+    limiter = RouteLimiter(concurrency=1, queue=1, timeout=0.1)
+    assert limiter.acquire() is None
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(limiter.acquire()))
+    waiter.start()
+    while limiter.waiting == 0:
+        time.sleep(0.005)
+    assert limiter.acquire() == 'cola llena'
+    waiter.join()
+    assert results == ['tiempo de espera agotado']
+
+    limiter.release()
+    assert limiter.acquire() is None
+    assert limiter.metrics()['shed_queue_full'] == limiter.metrics()['shed_timeout'] == 1
+
+
+def test_saturated_route_gets_503_and_others_still_work(make_app):
+    app = make_app(ADMISSION_LIMITS={'api.extra_points': {'concurrency': 1, 'queue': 0, 'timeout': 0.1}})
+    client = app.test_client()
+    client.get('/initial_data')
+    limiter = api.admission_control.limiters['api.extra_points']
+    limiter.acquire()
+    try:
+        response = client.post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After']
+        assert client.get('/total_points?userEmail=a@x.com').status_code == 200
+    finally:
+        limiter.release()
+    assert client.post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'}).status_code == 200
+    assert api.admission_control.metrics()['api.extra_points']['in_flight'] == 0
@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import app as api
+from auth import AuthError, CognitoVerifier, KeysUnavailable
+
+ISSUER = 'https://cognito-idp.us-east-1.amazonaws.com/us-east-1_X'
+
+
+def new_key(kid):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key()))
+    jwk.update(kid=kid, alg='RS256', use='sig')
+    return private, jwk
+
+
+def token(private, kid, email='a@x.com'):
+    claims = {'iss': ISSUER, 'aud': 'cid', 'token_use': 'id', 'email': email, 'exp': int(time.time()) + 600}
+    return jwt.encode(claims, private, algorithm='RS256', headers={'kid': kid})
+
+
+class Loader:
+    def __init__(self, *jwks):
+        self.keys = list(jwks)
+        self.calls = 0
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {'keys': self.keys}
+
+
+def test_rotated_key_is_fetched_once_and_unknown_kids_back_off():
+    old_private, old_jwk = new_key('old')
+    new_private, new_jwk = new_key('new')
+    loader = Loader(old_jwk)
+    verifier = CognitoVerifier(ISSUER, 'cid', jwks_loader=loader, min_refresh_interval=0.2)
+    assert verifier.verify(token(old_private, 'old'))['email'] == 'a@x.com'
+
+    # Token con un kid que aún no existe: una descarga y después ninguna hasta que pase la espera
+    with pytest.raises(AuthError):
+        verifier.verify(token(new_private, 'new', 'b@x.com'))
+    with pytest.raises(AuthError):
+        verifier.verify(token(new_private, 'new', 'c@x.com'))
+    assert loader.calls == 1
+
+    loader.keys.append(new_jwk)
+    time.sleep(0.25)
+    assert verifier.verify(token(new_private, 'new', 'd@x.com'))['email'] == 'd@x.com'
+    assert loader.calls == 2
+
+
+def test_failed_refresh_keeps_serving_stale_keys():
+    private, jwk = new_key('k1')
+    loader = Loader(jwk)
+    verifier = CognitoVerifier(ISSUER, 'cid', jwks_loader=loader, refresh_interval=0.1, min_refresh_interval=0.05)
+    verifier.verify(token(private, 'k1'))
+
+    loader.error = OSError('timeout')
+    time.sleep(0.15)
+    assert verifier.verify(token(private, 'k1', 'b@x.com'))['email'] == 'b@x.com'
+    assert verifier.verify(token(private, 'k1', 'c@x.com'))['email'] == 'c@x.com'
+    # El fallo no se reintenta en cada petición
+    assert loader.calls == 2
+
+
+def test_concurrent_refresh_fetches_once():
+    private, jwk = new_key('k1')
+
+    def slow_loader():
+        time.sleep(0.2)
+        slow_loader.calls += 1
+        return {'keys': [jwk]}
+    slow_loader.calls = 0
+
+    verifier = CognitoVerifier(ISSUER, 'cid', jwks_loader=slow_loader)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(verifier.verify(token(private, 'k1', f'{i}@x.com'))))
+               for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5
+    assert slow_loader.calls == 1
+
+
+def test_loader_failure_without_keys_is_503_not_500(make_app):
+    loader = Loader()
+    loader.error = OSError('Cognito no responde')
+    app = make_app(COGNITO_USER_POOL_ID='us-east-1_X', COGNITO_CLIENT_ID='cid')
+    api.cognito_auth.init_app(app, jwks_loader=loader)
+    private, _ = new_key('k1')
+
+    response = app.test_client().get('/total_points', headers={'Authorization': f"Bearer {token(private, 'k1')}"})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+    with pytest.raises(KeysUnavailable):
+        api.cognito_auth.verifier.verify(token(private, 'k1'))
+
+
+def test_bad_signature_is_401(make_app):
+    private, jwk = new_key('k1')
+    other_private, _ = new_key('k1')
+    app = make_app(COGNITO_USER_POOL_ID='us-east-1_X', COGNITO_CLIENT_ID='cid')
+    app.test_client().get('/initial_data')
+    api.cognito_auth.init_app(app, jwks_loader=Loader(jwk))
+
+    client = app.test_client()
+    assert client.get('/total_points', headers={'Authorization': f"Bearer {token(private, 'k1')}"}).status_code == 200
+    response = client.get('/total_points', headers={'Authorization': f"Bearer {token(other_private, 'k1')}"})
+    assert response.status_code == 401
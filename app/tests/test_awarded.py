@@ -0,0 +1,46 @@
+import app as api
+from awarded import AwardedSet
+
+
+def extra_points(client, email='a@x.com', article_id=1):
+    return client.post('/extra_points', json={'articleId': article_id, 'userEmail': email}).get_json()
+
+
+def test_repeat_calls_are_answered_from_memory(seeded_app):
+    client = seeded_app.test_client()
+    assert extra_points(client)['extrapoints'] is True
+    hits = api.awarded_points.hits
+    assert extra_points(client)['extrapoints'] is False
+    assert api.awarded_points.hits == hits + 1
+    assert extra_points(client, 'b@x.com')['extrapoints'] is True
+
+
+def test_points_from_another_worker_are_found_in_the_database(seeded_app):
+    client = seeded_app.test_client()
+    extra_points(client)
+    # Otro worker arranca sin el par en memoria: la base decide y el par se agrega
+    api.awarded_points.clear()
+    assert extra_points(client)['extrapoints'] is False
+    assert ('a@x.com', 1) in api.awarded_points
+
+
+def test_warmup_loads_existing_awards(seeded_app):
+    extra_points(seeded_app.test_client())
+    api.awarded_points.clear()
+    with seeded_app.app_context():
+        api.cargar_puntos_otorgados()
+    assert api.awarded_points.loaded
+    assert ('a@x.com', 1) in api.awarded_points
+    assert ('a@x.com', 2) not in api.awarded_points
+
+
+def test_load_started_before_clear_is_discarded():
+    awarded = AwardedSet()
+
+    def rows():
+        awarded.clear()
+        yield 'a@x.com', 1
+
+    awarded.load(rows())
+    assert not awarded.loaded
+    assert ('a@x.com', 1) not in awarded
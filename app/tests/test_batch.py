@@ -0,0 +1,81 @@
+import pytest
+from flask import g
+from sqlalchemy import func, select
+
+import app as api
+
+
+@pytest.fixture
+def batch_app(make_app):
+    app = make_app()
+
+    def falla_despues_de_escribir():
+        # Escribe y falla antes de hacer commit, como una vista con un error a medias
+        api.db.session.add(api.PuntajeUsuarioExtraArticulos(usuario_email='falla@x.com', puntaje=60, articulo_id=2))
+        api.db.session.flush()
+        raise RuntimeError('falla a medias')
+    app.add_url_rule('/falla', 'falla', falla_despues_de_escribir, methods=['POST'])
+    app.add_url_rule('/usuario_en_g', 'usuario_en_g', lambda: {'user_email': g.get('user_email')})
+    app.test_client().get('/initial_data')
+    return app
+
+
+def batch(app, requests):
+    return app.test_client().post('/batch', json={'requests': requests})
+
+
+def puntos_de(app, email):
+    with app.app_context():
+        return api.db.session.scalar(select(func.count()).select_from(api.PuntajeUsuarioExtraArticulos).where(
+            api.PuntajeUsuarioExtraArticulos.usuario_email == email))
+
+
+@pytest.mark.parametrize('requests', [['/article?article_id=1'], [None], [{'path': 5}], [{'method': 'DELETE', 'path': '/x'}]])
+def test_malformed_subrequests_are_400(batch_app, requests):
+    assert batch(batch_app, requests).status_code == 400
+
+
+def test_failed_subrequest_does_not_leak_into_the_next(batch_app):
+    response = batch(batch_app, [
+        {'method': 'POST', 'path': '/falla', 'body': {}},
+        {'method': 'POST', 'path': '/extra_points', 'body': {'articleId': 1, 'userEmail': 'a@x.com'}},
+        {'method': 'GET', 'path': '/total_points?userEmail=a@x.com'},
+    ])
+    assert [item['status'] for item in response.get_json()['responses']] == [500, 200, 200]
+    assert response.get_json()['responses'][2]['body']['total_points'] == 60
+    # Lo que escribió la sub-petición fallida no se guardó con el commit de la siguiente
+    assert puntos_de(batch_app, 'falla@x.com') == 0
+    assert puntos_de(batch_app, 'a@x.com') == 1
+
+
+def test_parallel_reads_match_sequential_in_order(batch_app):
+    requests = [{'path': f'/article?article_id={number}'} for number in range(1, 6)] + [{'path': '/list_specialties'}]
+    secuencial = batch(batch_app, requests).get_json()['responses']
+    paralelo = batch_app.test_client().post('/batch', json={'requests': requests, 'paralelo': True}).get_json()['responses']
+    assert paralelo == secuencial
+    assert [item['body']['id'] for item in paralelo[:5]] == [1, 2, 3, 4, 5]
+
+
+def test_parallel_is_ignored_when_the_batch_writes(batch_app):
+    response = batch_app.test_client().post('/batch', json={'paralelo': True, 'requests': [
+        {'method': 'POST', 'path': '/extra_points', 'body': {'articleId': 1, 'userEmail': 'a@x.com'}},
+        {'path': '/total_points?userEmail=a@x.com'},
+    ]})
+    # En secuencia la lectura ve la escritura anterior
+    assert response.get_json()['responses'][1]['body']['total_points'] == 60
+
+
+@pytest.mark.parametrize('path', ['/events?userEmail=a@x.com', '/article_media?article_id=1',
+                                  '/export_results?formato=csv', '/batch'])
+def test_streaming_routes_are_not_batchable(batch_app, path):
+    response = batch(batch_app, [{'path': '/list_specialties'}, {'path': path}])
+    assert response.status_code == 400
+    assert 'no permitida' in response.get_json()['message'].lower()
+
+
+def test_each_subrequest_gets_its_own_g(batch_app):
+    responses = batch(batch_app, [
+        {'path': '/total_points?userEmail=a@x.com'},
+        {'path': '/usuario_en_g'},
+    ]).get_json()['responses']
+    assert responses[1]['body'] == {'user_email': None}
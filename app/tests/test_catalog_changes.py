@@ -0,0 +1,42 @@
+import app as api
+
+
+def changes(client, since=None, epoca=None):
+    params = {}
+    if since is not None:
+        params = {'since': since, 'epoca': epoca}
+    return client.get('/catalog_changes', query_string=params).get_json()
+
+
+def test_client_receives_only_what_changed(seeded_app):
+    client = seeded_app.test_client()
+    full = changes(client)
+    assert full['snapshot'] and full['entidades']['curso']
+
+    with seeded_app.app_context():
+        api.db.session.get(api.Curso, 1).nombre = 'Curso renombrado'
+        api.db.session.delete(api.db.session.get(api.Pregunta, 5))
+        api.db.session.commit()
+
+    delta = changes(client, full['version'], full['epoca'])
+    assert delta['snapshot'] is False
+    assert delta['version'] > full['version']
+    assert [curso['nombre'] for curso in delta['cambios']['curso']['actualizados']] == ['Curso renombrado']
+    assert delta['cambios']['pregunta'] == {'actualizados': [], 'eliminados': [5]}
+    assert set(delta['cambios']) == {'curso', 'pregunta'}
+
+    assert changes(client, delta['version'], delta['epoca'])['cambios'] == {}
+
+
+def test_recreated_catalog_or_stale_cursor_gets_a_snapshot(seeded_app, make_app):
+    client = seeded_app.test_client()
+    before = changes(client)
+    client.get('/initial_data')
+    assert changes(client, before['version'], before['epoca'])['snapshot'] is True
+
+    app = make_app(CATALOG_DELTA_LIMIT=0)
+    current = changes(app.test_client())
+    with app.app_context():
+        api.db.session.get(api.Curso, 1).nombre = 'Otro nombre'
+        api.db.session.commit()
+    assert changes(app.test_client(), current['version'], current['epoca'])['snapshot'] is True
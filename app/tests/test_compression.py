@@ -0,0 +1,38 @@
+import gzip
+import json
+
+from compression import CompressedCache
+
+
+def test_catalog_body_is_compressed_once_and_reused(make_app):
+    app = make_app(COMPRESSION_MIN_SIZE=100)
+    client = app.test_client()
+    client.get('/initial_data')
+    cache = app.extensions['compression'].cache
+    plain = client.get('/list_articles?course_id=1')
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+
+    responses = [client.get('/list_articles?course_id=1', headers={'Accept-Encoding': 'gzip'}) for _ in range(2)]
+    assert all(response.headers['Content-Encoding'] == 'gzip' for response in responses)
+    assert json.loads(gzip.decompress(responses[1].data)) == plain.get_json()
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_small_responses_are_not_compressed(seeded_app):
+    response = seeded_app.test_client().get('/list_specialties', headers={'Accept-Encoding': 'gzip'})
+    assert len(response.data) < 1024
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_cache_evicts_least_recently_used_by_size():
+    cache = CompressedCache(max_bytes=10)
+    cache.set('a', b'12345')
+    cache.set('b', b'12345')
+    cache.get('a')
+    cache.set('c', b'123')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'12345' and cache.get('c') == b'123'
+    assert cache.size == 8
+    cache.set('grande', b'x' * 11)
+    assert cache.get('grande') is None
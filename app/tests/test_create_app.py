@@ -0,0 +1,30 @@
+from sqlalchemy import event
+
+import app as api
+
+
+def test_warmup_preloads_catalog_and_awarded_points(seeded_app, make_app):
+    seeded_app.test_client().post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+    api.catalog_cache.clear()
+    api.awarded_points.clear()
+
+    app = make_app(WARMUP_ON_START=True)
+    assert api.awarded_points.loaded and ('a@x.com', 1) in api.awarded_points
+    loaded = api.catalog_cache.get_or_load(('answer_key', 1), lambda: None)
+    assert loaded and 1 in loaded
+
+    statements = []
+    with app.app_context():
+        event.listen(api.db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+    assert app.test_client().get('/list_specialties').status_code == 200
+    assert statements == []
+
+
+def test_config_overrides_and_boot_time(make_app):
+    app = make_app(CATALOG_CACHE_TTL=12, SECRET_KEY='llave')
+    assert api.catalog_cache.ttl == 12
+    assert app.config['SECRET_KEY'] == 'llave'
+    assert app.config['BOOT_TIME'] > 0
+    # Sin SECRET_KEY se genera una por app
+    assert make_app().config['SECRET_KEY'] != make_app().config['SECRET_KEY']
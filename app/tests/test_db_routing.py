@@ -0,0 +1,76 @@
+import fakeredis
+import pytest
+
+import app as api
+
+
+def points(client, email, **headers):
+    return client.get(f'/total_points?userEmail={email}', headers=headers).get_json()['total_points']
+
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    """
+    Primaria y una "réplica" en otro archivo SQLite que no recibe las escrituras (retraso infinito).
+    En la réplica b@x.com tiene 60 puntos y en la primaria 0, para saber de dónde se leyó.
+    """
+    replica_uri = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica = make_app(SQLALCHEMY_DATABASE_URI=replica_uri)
+    replica.test_client().get('/initial_data')
+    replica.test_client().post('/extra_points', json={'articleId': 1, 'userEmail': 'b@x.com'})
+
+    def factory():
+        app = make_app(DB_REPLICA_URIS=[replica_uri], SECRET_KEY='prueba')
+        return app
+    primary = factory()
+    primary.test_client().get('/initial_data')
+    return factory, primary
+
+
+def test_writer_reads_own_write_in_any_worker(replicated):
+    factory, worker_1 = replicated
+    worker_2 = factory()
+    client = worker_1.test_client()
+    response = client.post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+    cookie = response.headers['Set-Cookie'].split(';')[0]
+
+    assert points(client, 'a@x.com') == 60
+    # La cookie firmada la valida otro worker sin estado compartido
+    assert points(worker_2.test_client(), 'a@x.com', Cookie=cookie) == 60
+
+
+def test_pin_is_not_shared_by_client_address(replicated):
+    _, app = replicated
+    app.test_client().post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'},
+                           headers={'X-Forwarded-For': '10.0.0.1'})
+    # Otro usuario detrás de la misma IP (o que la falsifica) sigue leyendo de la réplica
+    assert points(app.test_client(), 'b@x.com', **{'X-Forwarded-For': '10.0.0.1'}) == 60
+
+
+def test_forged_pin_cookie_is_ignored(replicated):
+    _, app = replicated
+    client = app.test_client()
+    client.set_cookie('rw_pin', '9999999999')
+    assert points(client, 'b@x.com') == 60
+
+
+def test_clients_without_cookies_are_pinned_through_redis(replicated):
+    factory, worker_1 = replicated
+    worker_2 = factory()
+    server = fakeredis.FakeServer()
+    api.shared_cache.init_app(worker_1, backend=fakeredis.FakeRedis(server=server))
+    api.shared_cache.init_app(worker_2, backend=fakeredis.FakeRedis(server=server))
+
+    worker_1.test_client().post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+    assert fakeredis.FakeRedis(server=server).keys('pin:*')
+    assert points(worker_2.test_client(), 'a@x.com') == 60
+
+
+def test_cached_values_are_computed_on_the_primary(replicated):
+    _, app = replicated
+    api.shared_cache.init_app(app, backend=fakeredis.FakeRedis(server=fakeredis.FakeServer()))
+    # En la réplica b@x.com tiene 60 puntos; lo que se guarda en la caché sale de la primaria
+    assert points(app.test_client(), 'b@x.com') == 0
+    hits = api.shared_cache.hits
+    assert points(app.test_client(), 'b@x.com') == 0
+    assert api.shared_cache.hits == hits + 1
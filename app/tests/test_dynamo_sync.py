@@ -0,0 +1,86 @@
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import app as api
+from dynamo_sync import DynamoSync
+
+TABLES = ('educational_data', 'exams_data')
+
+
+@pytest.fixture
+def dynamo(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    with mock_aws():
+        resource = boto3.resource('dynamodb')
+        for name in TABLES:
+            resource.create_table(
+                TableName=name, BillingMode='PAY_PER_REQUEST',
+                KeySchema=[{'AttributeName': 'pk', 'KeyType': 'HASH'}, {'AttributeName': 'sk', 'KeyType': 'RANGE'}],
+                AttributeDefinitions=[{'AttributeName': 'pk', 'AttributeType': 'S'},
+                                      {'AttributeName': 'sk', 'AttributeType': 'S'}])
+        yield resource
+
+
+def sync(app, *args):
+    result = app.test_cli_runner().invoke(args=['sync-dynamodb', '--segments', '2', *args])
+    assert result.exit_code == 0, result.output
+    return {stats['tabla']: stats for stats in map(json.loads, result.output.splitlines())}
+
+
+def test_second_sync_writes_nothing(seeded_app, dynamo):
+    first = sync(seeded_app)
+    for name in TABLES:
+        assert first[name]['nuevos'] == first[name]['leidos_postgres'] > 0
+        assert dynamo.Table(name).scan()['Count'] == first[name]['nuevos']
+
+    second = sync(seeded_app)
+    for name in TABLES:
+        assert second[name]['escrituras'] == 0
+        assert second[name]['iguales'] == first[name]['leidos_postgres']
+
+
+def test_only_changed_rows_are_written(seeded_app, dynamo):
+    sync(seeded_app)
+    with seeded_app.app_context():
+        pregunta = api.db.session.get(api.Pregunta, 1)
+        pregunta.enunciado = 'Enunciado corregido'
+        api.db.session.commit()
+
+    stats = sync(seeded_app)
+    # La pregunta aparece en educational_data y en exams_data
+    assert stats['educational_data']['modificados'] == 1
+    assert stats['exams_data']['modificados'] == 1
+    assert stats['educational_data']['nuevos'] == stats['exams_data']['nuevos'] == 0
+    item = dynamo.Table('educational_data').get_item(Key={'pk': 'pregunta#1', 'sk': 'metadata'})['Item']
+    assert item['nombre'] == 'Enunciado corregido'
+
+
+def test_dry_run_and_extra_items(seeded_app, dynamo):
+    assert sync(seeded_app, '--dry-run')['exams_data']['escrituras'] == 0
+    assert dynamo.Table('exams_data').scan()['Count'] == 0
+
+    sync(seeded_app)
+    table = dynamo.Table('educational_data')
+    table.put_item(Item={'pk': 'curso#999', 'sk': 'metadata', 'type': 'curso'})
+
+    stats = sync(seeded_app, '--table', 'educational_data')
+    assert stats['educational_data']['sobrantes'] == 1
+    assert stats['educational_data']['borrados'] == 0
+    assert 'Item' in table.get_item(Key={'pk': 'curso#999', 'sk': 'metadata'})
+
+    stats = sync(seeded_app, '--table', 'educational_data', '--delete-extra')
+    assert stats['educational_data']['borrados'] == 1
+    assert 'Item' not in table.get_item(Key={'pk': 'curso#999', 'sk': 'metadata'})
+
+
+def test_parallel_scan_reads_every_segment(dynamo):
+    table = dynamo.Table('exams_data')
+    with table.batch_writer() as writer:
+        for i in range(60):
+            writer.put_item(Item={'pk': f'examen#{i}', 'sk': 'metadata'})
+    assert len(DynamoSync(segments=4).scan_hashes('exams_data')) == 60
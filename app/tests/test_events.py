@@ -0,0 +1,83 @@
+import app as api
+from events import EventHub, Leaderboard
+
+
+def read_events(response, count):
+    events = []
+    for chunk in response.response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event:'):
+            events.append(chunk.split('\n')[0][len('event: '):])
+            if len(events) == count:
+                return events
+    return events
+
+
+def test_no_publish_work_without_listeners(seeded_app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, 'insignias_usuario', lambda email: calls.append('insignias') or {'badges': []})
+    monkeypatch.setattr(api.live_events, 'publish', lambda *args: calls.append('publish'))
+
+    client = seeded_app.test_client()
+    client.post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+    client.post('/send_exam_results', json={'examId': 1, 'userEmail': 'a@x.com', 'elapsedTime': 60,
+                                             'exam_results': [{'questionId': 1, 'optionSelectedValue': 'A'}]})
+    assert calls == []
+
+
+def test_subscriber_receives_points_after_write(seeded_app, monkeypatch):
+    # Si algo falla, el stream se cierra pronto en vez de colgar la prueba
+    monkeypatch.setattr(api.live_events, 'stream_seconds', 2)
+    monkeypatch.setattr(api.live_events, 'heartbeat', 0.1)
+    client = seeded_app.test_client()
+    stream = client.get('/events?userEmail=a@x.com', buffered=False)
+    try:
+        assert read_events(stream, 1) == ['puntos']
+        assert api.live_events.has_listeners(None)
+        # Solo con puntos extra todavía no entra en el ranking (igual que en /user_points)
+        client.post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+        assert read_events(stream, 1) == ['puntos']
+        client.post('/send_exam_results', json={
+            'examId': 1, 'userEmail': 'a@x.com', 'elapsedTime': 60,
+            'exam_results': [{'questionId': 1, 'optionSelectedValue': 'B'}]})
+        assert read_events(stream, 3) == ['puntos', 'insignias', 'ranking']
+    finally:
+        stream.close()
+    assert api.live_events.metrics()['conexiones'] == 0
+
+
+def test_max_streams_leaves_threads_for_requests(make_app):
+    make_app()
+    assert api.live_events.max_streams == 2
+    make_app(EVENTS_WORKER_THREADS=8)
+    assert api.live_events.max_streams == 4
+    make_app(EVENTS_WORKER_THREADS=8, EVENTS_MAX_STREAMS=8)
+    assert api.live_events.max_streams == 7
+    make_app(EVENTS_WORKER_THREADS=1)
+    assert api.live_events.max_streams == 0
+
+
+def test_leaderboard_matches_user_points(seeded_app):
+    client = seeded_app.test_client()
+    for email, option in (('a@x.com', 'B'), ('b@x.com', 'A')):
+        client.post('/send_exam_results', json={'examId': 1, 'userEmail': email, 'elapsedTime': 60,
+                                                 'exam_results': [{'questionId': 1, 'optionSelectedValue': option}]})
+    client.post('/extra_points', json={'articleId': 1, 'userEmail': 'c@x.com'})
+    with seeded_app.app_context():
+        assert api.total_ranking('c@x.com') is None
+        board = Leaderboard()
+        board.load(api.filas_ranking())
+        for email in ('a@x.com', 'b@x.com', 'c@x.com'):
+            board.update(email, api.total_ranking(email))
+    ranking = {user['email']: user['total_points'] for user in client.get('/user_points').get_json()['users_points']}
+    assert {email.split('@')[0]: total for email, total in board.totals.items()} == ranking
+    assert board.rank('a@x.com') == 1 and board.rank('b@x.com') == 2
+
+
+def test_notify_mode_always_publishes(monkeypatch):
+    hub = EventHub()
+    monkeypatch.setattr(hub, '_ensure_listening', lambda engine: None)
+    postgres = type('Engine', (), {'dialect': type('Dialect', (), {'name': 'postgresql'})()})()
+    assert hub.should_publish(postgres)
+    assert not hub.has_listeners(postgres)
+    assert not hub.should_publish(None)
@@ -0,0 +1,74 @@
+import csv
+import io
+
+import pytest
+from openpyxl import load_workbook
+
+import app as api
+
+USERS = ('a@x.com', 'b@x.com', 'c@x.com')
+
+
+@pytest.fixture
+def results_app(make_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(api.cognito_auth, 'require_group', lambda group: {})
+    app = make_app(SHARD_URIS=[f"sqlite:///{tmp_path / f'shard{number}.db'}" for number in range(2)])
+    client = app.test_client()
+    client.get('/initial_data')
+    for email in USERS:
+        client.post('/send_exam_results', json={'examId': 1, 'userEmail': email, 'elapsedTime': 60,
+                                                 'exam_results': [{'questionId': 1, 'optionSelectedValue': 'B'}]})
+        client.post('/extra_points', json={'articleId': 1, 'userEmail': email})
+    return app
+
+
+def read_csv(response):
+    assert response.mimetype == 'text/csv'
+    return list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+
+
+def test_csv_streams_rows_from_every_shard(results_app):
+    client = results_app.test_client()
+    header, *rows = read_csv(client.get('/export_results?formato=csv'))
+    assert header == api.EXPORT_RESULTS_HEADER
+    assert sorted(row[header.index('usuario_email')] for row in rows) == list(USERS)
+
+    _, *puntos = read_csv(client.get('/export_results?formato=csv&datos=puntos_extra'))
+    assert len(puntos) == len(USERS)
+
+
+def test_specialization_filter(results_app):
+    client = results_app.test_client()
+    _, *rows = read_csv(client.get('/export_results?formato=csv'))
+    especializacion = rows[0][0]
+    assert len(read_csv(client.get('/export_results', query_string={'especializacion': especializacion}))) == 4
+    with results_app.app_context():
+        otra = api.Especializacion.query.filter(api.Especializacion.nombre != especializacion).first().nombre
+    assert len(read_csv(client.get('/export_results', query_string={'especializacion': otra}))) == 1
+
+
+def test_xlsx_export_from_the_command(results_app, tmp_path):
+    output = tmp_path / 'resultados.xlsx'
+    result = results_app.test_cli_runner().invoke(args=['export-results', str(output)])
+    assert result.exit_code == 0, result.output
+    workbook = load_workbook(output, read_only=True)
+    assert workbook.sheetnames == ['resultados_examenes', 'puntos_extra']
+    assert [len(list(sheet.iter_rows())) for sheet in workbook] == [len(USERS) + 1] * 2
+
+
+def test_unknown_format_is_rejected_before_reading_results(results_app, monkeypatch):
+    monkeypatch.setattr(api, 'mapa_catalogo', lambda *args: pytest.fail('no debe consultar el catálogo'))
+    assert results_app.test_client().get('/export_results?formato=pdf').status_code == 400
+
+
+def test_xlsx_from_the_api_is_capped(results_app):
+    client = results_app.test_client()
+    response = client.get('/export_results?formato=xlsx')
+    assert response.mimetype == api.XLSX_MIMETYPE
+    workbook = load_workbook(io.BytesIO(response.get_data()), read_only=True)
+    assert [len(list(sheet.iter_rows())) for sheet in workbook] == [len(USERS) + 1] * 2
+
+    results_app.config['EXPORT_XLSX_MAX_ROWS'] = 2 * len(USERS) - 1
+    response = client.get('/export_results?formato=xlsx')
+    assert response.status_code == 400
+    assert 'export-results' in response.get_json()['message']
@@ -0,0 +1,42 @@
+from sqlalchemy import event
+
+import app as api
+
+
+def captured_sql(app):
+    statements = []
+    with app.app_context():
+        event.listen(api.db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_requested_fields_only_load_their_columns(seeded_app):
+    statements = captured_sql(seeded_app)
+    cursos = seeded_app.test_client().get('/list_courses?bloque_id=1&fields=nombre').get_json()
+    assert cursos and all(set(curso) == {'nombre'} for curso in cursos)
+    consulta, = [sql for sql in statements if 'FROM curso' in sql]
+    assert 'curso.nombre' in consulta and 'curso.contenido' not in consulta
+
+
+def test_without_fields_the_response_is_unchanged(seeded_app):
+    client = seeded_app.test_client()
+    assert set(client.get('/list_courses?bloque_id=1').get_json()[0]) == {'id', 'nombre', 'contenido'}
+    article = client.get('/article?article_id=1').get_json()
+    assert {'id', 'titulo', 'url_file', 'tipo', 'contenido', 'examen_id'} <= set(article)
+    assert set(client.get('/article?article_id=1&fields=titulo,examen_id').get_json()) == {'titulo', 'examen_id'}
+
+
+def test_unknown_fields_are_rejected(seeded_app):
+    response = seeded_app.test_client().get('/list_articles?course_id=1&fields=titulo,clave')
+    assert response.status_code == 400
+    assert 'clave' in response.get_json()['message']
+    assert 'titulo' in response.get_json()['campos_validos']
+
+
+def test_fields_not_offered_by_the_endpoint_are_rejected(seeded_app):
+    client = seeded_app.test_client()
+    response = client.get('/list_articles?course_id=1&fields=examen_id')
+    assert response.status_code == 400
+    assert 'examen_id' not in response.get_json()['campos_validos']
+    assert 'examen_id' not in client.get('/list_articles?course_id=1').get_json()[0]
@@ -0,0 +1,47 @@
+import json
+from datetime import datetime
+
+from flask import Flask, jsonify
+
+from json_provider import OrjsonProvider, stream_json_array
+
+
+def make_flask():
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    return app
+
+
+def test_same_output_as_the_default_provider():
+    app = make_flask()
+    data = {'nombre': 'Hematología', 'b': 1, 'a': [1.5, None], 'fecha': datetime(2024, 5, 1, 12, 30)}
+    with app.app_context():
+        body = jsonify(data).get_data()
+    assert json.loads(body) == json.loads(Flask(__name__).json.dumps(data))
+    assert 'Hematología'.encode('utf-8') in body
+    assert body.index(b'"a"') < body.index(b'"b"')
+
+
+def test_stream_json_array_in_chunks(monkeypatch):
+    monkeypatch.setattr('json_provider.STREAM_CHUNK_SIZE', 64)
+    app = make_flask()
+    items = ({'email': f'usuario{number}', 'total_points': number} for number in range(50))
+    with app.test_request_context():
+        response = stream_json_array(items, key='users_points')
+        chunks = list(response.response)
+    assert len(chunks) > 1
+    assert json.loads(b''.join(chunks))['users_points'][49] == {'email': 'usuario49', 'total_points': 49}
+
+    with app.test_request_context():
+        assert json.loads(b''.join(stream_json_array(iter(())).response)) == []
+
+
+def test_user_points_ranking_is_streamed(seeded_app):
+    client = seeded_app.test_client()
+    client.post('/extra_points', json={'articleId': 1, 'userEmail': 'a@x.com'})
+    client.post('/send_exam_results', json={'examId': 1, 'userEmail': 'a@x.com', 'elapsedTime': 60,
+                                             'exam_results': [{'questionId': 1, 'optionSelectedValue': 'B'}]})
+    response = client.get('/user_points')
+    assert response.is_streamed
+    usuario, = response.get_json()['users_points']
+    assert usuario['email'] == 'a' and usuario['total_points'] > 0
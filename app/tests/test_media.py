@@ -0,0 +1,64 @@
+import hashlib
+
+import app as api
+from media import parse_s3_url
+
+
+def test_parse_s3_url_styles():
+    assert parse_s3_url('https://archivosemc.s3.amazonaws.com/Q3+Tarjeton.pdf') == ('archivosemc', 'Q3 Tarjeton.pdf')
+    assert parse_s3_url('https://s3.us-east-1.amazonaws.com/archivosemc/videos/a.mp4') == ('archivosemc', 'videos/a.mp4')
+
+
+def test_byte_ranges_and_etag_validation(seeded_app, s3_media):
+    client = seeded_app.test_client()
+    full = client.get('/article_media?article_id=1')
+    assert full.status_code == 200 and len(full.data) == 2049
+    assert full.headers['Accept-Ranges'] == 'bytes'
+
+    partial = client.get('/article_media?article_id=1', headers={'Range': 'bytes=100-199'})
+    assert partial.status_code == 206
+    assert partial.data == full.data[100:200]
+    assert partial.headers['Content-Range'] == 'bytes 100-199/2049'
+
+    cached = client.get('/article_media?article_id=1', headers={'If-None-Match': full.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == full.headers['ETag']
+
+
+def test_presigned_url_is_reused_while_fresh(seeded_app, s3_media):
+    client = seeded_app.test_client()
+    first = client.get('/article_media_url?article_id=1').get_json()
+    second = client.get('/article_media_url?article_id=1').get_json()
+    assert first['url'] == second['url']
+    assert len(api.media_store._signatures) == 1
+
+
+def test_manifest_keeps_the_computed_hash_while_the_file_is_unchanged(seeded_app, s3_media):
+    runner = seeded_app.test_cli_runner()
+    assert 'for 7 articles' in runner.invoke(args=['refresh-media-manifest', '--hash']).output
+    with seeded_app.app_context():
+        manifiesto = api.db.session.get(api.Articulo, 1).manifiesto
+        assert manifiesto.tamano_bytes == 2049
+        assert manifiesto.hash_contenido == hashlib.sha256(bytes(range(256)) * 8 + b'1').hexdigest()
+
+    runner.invoke(args=['refresh-media-manifest'])
+    with seeded_app.app_context():
+        assert api.db.session.get(api.Articulo, 1).manifiesto.hash_contenido is not None
+    assert 'for 0 articles' in runner.invoke(args=['refresh-media-manifest', '--only-missing']).output
+
+
+def test_unchanged_files_are_not_hashed_again(seeded_app, s3_media, monkeypatch):
+    runner = seeded_app.test_cli_runner()
+    runner.invoke(args=['refresh-media-manifest', '--hash'])
+    leidos = []
+    original = api.media_store.sha256
+    monkeypatch.setattr(api.media_store, 'sha256', lambda bucket, key: leidos.append(key) or original(bucket, key))
+
+    with seeded_app.app_context():
+        bucket, key = parse_s3_url(api.db.session.get(api.Articulo, 1).url_contenido)
+    s3_media.put_object(Bucket=bucket, Key=key, Body=b'nueva version')
+    assert 'for 7 articles' in runner.invoke(args=['refresh-media-manifest', '--hash']).output
+    assert leidos == [key]
+    with seeded_app.app_context():
+        assert api.db.session.get(api.Articulo, 1).manifiesto.hash_contenido == hashlib.sha256(b'nueva version').hexdigest()
+        assert api.db.session.get(api.Articulo, 2).manifiesto.hash_contenido is not None
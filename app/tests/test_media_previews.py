@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+import app as api
+import media_previews
+
+
+def fake_metadata(source, workdir):
+    thumbnail = os.path.join(workdir, 'miniatura.png')
+    with open(thumbnail, 'wb') as target:
+        target.write(b'\x89PNG')
+    return {'paginas': 3}, thumbnail
+
+
+@pytest.fixture
+def previews_app(seeded_app, s3_media, monkeypatch):
+    # Sin pool de procesos (moto solo existe en este proceso) ni poppler/ffmpeg
+    monkeypatch.setattr(api, 'run_pipeline', lambda tasks, workers=None: map(media_previews.extract_preview, tasks))
+    monkeypatch.setattr(media_previews, '_pdf_metadata', fake_metadata)
+    monkeypatch.setattr(media_previews, '_video_metadata', fake_metadata)
+    seeded_app.test_cli_runner().invoke(args=['refresh-media-manifest', '--hash'])
+    return seeded_app
+
+
+def extract(app):
+    with app.app_context():
+        return api.extract_media_previews()
+
+
+def test_only_changed_files_are_processed_again(previews_app, s3_media):
+    assert extract(previews_app) == {'procesados': 7, 'errores': 0, 'sin_cambios': 0}
+    assert extract(previews_app) == {'procesados': 0, 'errores': 0, 'sin_cambios': 7}
+
+    with previews_app.app_context():
+        article = api.db.session.get(api.Articulo, 1)
+        preview = article.preview
+        bucket, key = media_previews.parse_s3_url(article.url_contenido)
+        assert preview.paginas == 3
+        assert media_previews.parse_s3_url(preview.miniatura_url) == (bucket, f'previews/{preview.hash_contenido}.png')
+    assert s3_media.get_object(Bucket=bucket, Key=f'previews/{preview.hash_contenido}.png')['Body'].read() == b'\x89PNG'
+
+    s3_media.put_object(Bucket=bucket, Key=key, Body=b'nueva version')
+    previews_app.test_cli_runner().invoke(args=['refresh-media-manifest', '--hash'])
+    assert extract(previews_app) == {'procesados': 1, 'errores': 0, 'sin_cambios': 6}
+
+
+def test_failed_files_are_retried(previews_app, monkeypatch):
+    def broken(source, workdir):
+        raise RuntimeError('pdfinfo no encontrado')
+
+    monkeypatch.setattr(media_previews, '_pdf_metadata', broken)
+    assert extract(previews_app) == {'procesados': 2, 'errores': 5, 'sin_cambios': 0}
+    with previews_app.app_context():
+        assert 'pdfinfo' in api.db.session.get(api.Articulo, 1).preview.error
+
+    monkeypatch.setattr(media_previews, '_pdf_metadata', fake_metadata)
+    assert extract(previews_app) == {'procesados': 5, 'errores': 0, 'sin_cambios': 2}
+
+
+def test_thumbnail_url_uses_the_client_endpoint():
+    url = media_previews.s3_url('http://localhost:9000/', 'archivosemc', 'previews/abc.png')
+    assert url == 'http://localhost:9000/archivosemc/previews/abc.png'
+    assert media_previews.parse_s3_url(url) == ('archivosemc', 'previews/abc.png')
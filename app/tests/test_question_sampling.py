@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+
+import app as api
+from question_sampling import firmar_semilla
+
+
+@pytest.fixture
+def sampled_app(seeded_app):
+    with seeded_app.app_context():
+        api.db.session.get(api.Examen, 1).preguntas_por_intento = 3
+        api.db.session.commit()
+    api.catalog_cache.clear()
+    return seeded_app
+
+
+def send(client, seed, exam_id=1, questions=()):
+    body = {'examId': exam_id, 'userEmail': 'a@x.com', 'elapsedTime': 60, 'exam_results': list(questions)}
+    if seed is not None:
+        body['semilla'] = seed
+    return client.post('/send_exam_results', json=body)
+
+
+def test_seed_is_issued_and_signed_by_the_server(sampled_app):
+    client = sampled_app.test_client()
+    exam = client.get('/exam?exam_id=1').get_json()
+    assert isinstance(exam['semilla'], str)
+    assert len(exam['preguntas_id']) == 3
+
+    # Volver a abrir el intento con la misma semilla da las mismas preguntas
+    again = client.get('/exam', query_string={'exam_id': 1, 'semilla': exam['semilla']}).get_json()
+    assert again['preguntas_id'] == exam['preguntas_id']
+
+    answers = [{'questionId': question_id, 'optionSelectedValue': 'A'} for question_id in exam['preguntas_id']]
+    assert send(client, exam['semilla'], questions=answers).status_code == 200
+
+
+@pytest.mark.parametrize('seed', [None, 12345, 'no-firmada'])
+def test_seeds_not_issued_by_the_server_are_rejected(sampled_app, seed):
+    client = sampled_app.test_client()
+    assert send(client, seed).status_code == 400
+    if seed is not None:
+        assert client.get('/exam', query_string={'exam_id': 1, 'semilla': seed}).status_code == 400
+
+
+def test_seed_from_another_exam_or_key_is_rejected(sampled_app):
+    client = sampled_app.test_client()
+    assert send(client, firmar_semilla(sampled_app.config['SECRET_KEY'], 2, 7)).status_code == 400
+    assert send(client, firmar_semilla('otra llave', 1, 7)).status_code == 400
+
+
+def test_repeated_answers_count_once(sampled_app):
+    client = sampled_app.test_client()
+    exam = client.get('/exam?exam_id=1').get_json()
+    question_id = exam['preguntas_id'][0]
+    with sampled_app.app_context():
+        correcta = api.db.session.get(api.Pregunta, question_id).respuesta_correcta
+    answers = [{'questionId': question_id, 'optionSelectedValue': correcta}] * 5
+    result_id = send(client, exam['semilla'], questions=answers).get_json()['exam_results_id']
+
+    result = client.get(f'/exam_result?exam_result_id={result_id}&userEmail=a@x.com').get_json()
+    assert result['result_responses']['points'] == pytest.approx(100 / 3)
+    assert result['total_questions'] == 1
+
+
+@pytest.mark.parametrize('questions', [[{'optionSelectedValue': 'A'}], [{'questionId': 'uno'}], [{'questionId': None}], ['x']])
+def test_malformed_question_ids_are_400(sampled_app, questions):
+    client = sampled_app.test_client()
+    exam = client.get('/exam?exam_id=1').get_json()
+    assert send(client, exam['semilla'], questions=questions).status_code == 400
+
+
+def test_upgrade_schema_adds_sampling_columns(seeded_app):
+    with seeded_app.app_context():
+        with api.db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE resultado_examen DROP COLUMN semilla'))
+            connection.execute(text('ALTER TABLE examen DROP COLUMN estratificar_por_etiqueta'))
+
+    runner = seeded_app.test_cli_runner()
+    result = runner.invoke(args=['upgrade-schema'])
+    assert 'resultado_examen.semilla' in result.output
+    assert 'examen.estratificar_por_etiqueta' in result.output
+
+    assert 'resultado_examen' not in runner.invoke(args=['upgrade-schema', '--dry-run']).output
+    assert seeded_app.test_client().get('/exam?exam_id=1').status_code == 200
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import func, select
+
+import app as api
+
+
+def submit(client, email, option='A', exam_id=1):
+    return client.post('/send_exam_results', json={
+        'examId': exam_id, 'userEmail': email, 'elapsedTime': 120,
+        'exam_results': [{'questionId': 1, 'optionSelectedValue': option},
+                         {'questionId': 2, 'optionSelectedValue': 'B'}]})
+
+
+def stats(app):
+    with app.app_context():
+        counters = api.db.session.get(api.EstadisticaPregunta, 1)
+        pending = api.db.session.scalar(select(func.count()).select_from(api.EstadisticaPreguntaDelta))
+        return counters and counters.intentos, pending
+
+
+@pytest.fixture
+def stats_app(make_app):
+    app = make_app(QUESTION_STATS_FOLD_EVERY=1000)
+    app.test_client().get('/initial_data')
+    return app
+
+
+def test_attempts_append_deltas_and_fold_sums_them_once(stats_app):
+    client = stats_app.test_client()
+    for number in range(3):
+        submit(client, f'{number}@x.com', option='A' if number else 'C')
+    assert stats(stats_app) == (0, 6)
+
+    with stats_app.app_context():
+        assert api.plegar_estadisticas() == 6
+        assert api.plegar_estadisticas() == 0
+        counters = api.db.session.get(api.EstadisticaPregunta, 1)
+        assert (counters.intentos, counters.opcion_a, counters.opcion_c) == (3, 2, 1)
+        assert counters.tiempo_acumulado == pytest.approx(3 * 60)
+    assert stats(stats_app) == (3, 0)
+
+
+def test_workers_fold_every_n_attempts(make_app):
+    app = make_app(QUESTION_STATS_FOLD_EVERY=1)
+    app.test_client().get('/initial_data')
+    submit(app.test_client(), 'a@x.com')
+    assert stats(app) == (1, 0)
+
+
+def test_question_stats_include_pending_deltas(stats_app, monkeypatch):
+    monkeypatch.setattr(api.cognito_auth, 'require_group', lambda group: {})
+    client = stats_app.test_client()
+    submit(client, 'a@x.com')
+    with stats_app.app_context():
+        api.plegar_estadisticas()
+    submit(client, 'b@x.com', option='C')
+
+    pregunta = client.get('/question_stats?exam_id=1').get_json()['preguntas'][0]
+    assert pregunta['intentos'] == 2
+    assert pregunta['selecciones']['A'] == 1 and pregunta['selecciones']['C'] == 1
+
+
+def test_rebuild_discards_pending_deltas(stats_app):
+    submit(stats_app.test_client(), 'a@x.com')
+    result = stats_app.test_cli_runner().invoke(args=['rebuild-question-stats'])
+    assert result.exit_code == 0
+    assert stats(stats_app) == (1, 0)
+
+
+def test_fold_requires_delete_returning(stats_app, monkeypatch):
+    with stats_app.app_context():
+        monkeypatch.setattr(api.db.engine.dialect, 'delete_returning', False)
+        with pytest.raises(RuntimeError, match='3.35'):
+            api.plegar_estadisticas()
@@ -0,0 +1,117 @@
+import json
+
+import pytest
+from sqlalchemy import select
+
+import app as api
+import regrade as regrade_module
+
+ANSWERS = {'a@x.com': 'A', 'b@x.com': 'A', 'c@x.com': 'B'}
+
+
+@pytest.fixture
+def graded_app(make_app, tmp_path):
+    app = make_app(SHARD_URIS=[f"sqlite:///{tmp_path / f'shard{number}.db'}" for number in range(2)],
+                   QUESTION_STATS_FOLD_EVERY=1000)
+    client = app.test_client()
+    client.get('/initial_data')
+    for email, option in ANSWERS.items():
+        client.post('/send_exam_results', json={
+            'examId': 1, 'userEmail': email, 'elapsedTime': 60,
+            'exam_results': [{'questionId': 1, 'optionSelectedValue': option},
+                             {'questionId': 2, 'optionSelectedValue': 'B'}]})
+    with app.app_context():
+        # La clave decía B; se corrige a A después de los envíos
+        api.db.session.get(api.Pregunta, 1).respuesta_correcta = 'A'
+        api.db.session.commit()
+    return app
+
+
+def regrade(app, *args):
+    result = app.test_cli_runner().invoke(args=['regrade-exam', '1', *args])
+    assert result.exit_code == 0, result.output
+    return json.loads(result.output)
+
+
+def scores(app):
+    with app.app_context():
+        rows = api.user_shards.scatter_stream(select(api.ResultadoExamen.usuario_email, api.ResultadoExamen.puntaje), 100)
+        return {row.usuario_email: row.puntaje for row in rows}
+
+
+def test_dry_run_reports_without_writing(graded_app):
+    resumen = regrade(graded_app, '--dry-run')
+    assert resumen['cambiados'] == 3
+    assert resumen['usuarios_afectados'] == 3
+    assert scores(graded_app) == {'a@x.com': 50, 'b@x.com': 50, 'c@x.com': 100}
+
+
+def test_regrade_updates_every_shard_and_is_idempotent(graded_app, monkeypatch):
+    publicados = []
+    monkeypatch.setattr(api, 'publicar_puntos', publicados.append)
+    assert regrade(graded_app)['cambiados'] == 3
+    assert sorted(publicados) == sorted(ANSWERS)
+    assert scores(graded_app) == {'a@x.com': 100, 'b@x.com': 100, 'c@x.com': 50}
+    with graded_app.app_context():
+        respuestas, = api.user_shards.session_for('a@x.com').scalars(select(api.ResultadoExamen.respuestas).where(
+            api.ResultadoExamen.usuario_email == 'a@x.com')).all()
+    assert respuestas['questions'][0]['respuesta'] == 'correcta'
+
+    assert regrade(graded_app)['cambiados'] == 0
+
+
+def test_stats_correction_is_a_delta_that_matches_a_rebuild(graded_app):
+    regrade(graded_app)
+    with graded_app.app_context():
+        correction = api.db.session.scalars(select(api.EstadisticaPreguntaDelta).where(
+            api.EstadisticaPreguntaDelta.intentos == 0)).all()
+        # Dos aciertos nuevos y uno perdido en la pregunta 1; la pregunta 2 no cambia
+        assert [(delta.pregunta_id, delta.correctas) for delta in correction] == [(1, 1)]
+        api.plegar_estadisticas()
+        folded = api.db.session.get(api.EstadisticaPregunta, 1).correctas
+
+    graded_app.test_cli_runner().invoke(args=['rebuild-question-stats'])
+    with graded_app.app_context():
+        assert api.db.session.get(api.EstadisticaPregunta, 1).correctas == folded == 2
+
+
+def test_results_resubmitted_while_regrading_are_not_overwritten(graded_app, monkeypatch):
+    api.catalog_cache.clear()
+
+    class Concurrente(regrade_module.Recalificacion):
+        def __init__(self, *args):
+            super().__init__(*args)
+            # a@x.com vuelve a enviar el examen (ya con la clave nueva) después de la lectura
+            graded_app.test_client().post('/send_exam_results', json={
+                'examId': 1, 'userEmail': 'a@x.com', 'elapsedTime': 60,
+                'exam_results': [{'questionId': 1, 'optionSelectedValue': 'B'},
+                                 {'questionId': 2, 'optionSelectedValue': 'B'}]})
+    monkeypatch.setattr(regrade_module, 'Recalificacion', Concurrente)
+
+    resumen = regrade(graded_app)
+    assert resumen['cambiados'] == 3
+    assert resumen['omitidos'] == 1
+    assert scores(graded_app) == {'a@x.com': 50, 'b@x.com': 100, 'c@x.com': 50}
+
+
+def test_options_with_the_same_text_are_matched_by_letter(seeded_app):
+    with seeded_app.app_context():
+        pregunta = api.db.session.get(api.Pregunta, 1)
+        pregunta.opcion_b = pregunta.opcion_d = 'Ninguna'
+        api.db.session.commit()
+    api.catalog_cache.clear()
+    seeded_app.test_client().post('/send_exam_results', json={
+        'examId': 1, 'userEmail': 'a@x.com', 'elapsedTime': 60,
+        'exam_results': [{'questionId': 1, 'optionSelectedValue': 'A'}]})
+    # La clave no cambió: "Ninguna" no debe confundirse con la opción D
+    assert regrade(seeded_app)['cambiados'] == 0
+
+    with seeded_app.app_context():
+        resultado = api.db.session.scalars(select(api.ResultadoExamen)).one()
+        # Un resultado anterior a guardar la letra no se puede distinguir: se recalifica una vez
+        resultado.respuestas = {**resultado.respuestas, 'questions': [
+            {key: value for key, value in question.items() if key != 'opcion_correcta'}
+            for question in resultado.respuestas['questions']]}
+        api.db.session.commit()
+    assert regrade(seeded_app)['cambiados'] == 1
+    assert regrade(seeded_app)['cambiados'] == 0
@@ -0,0 +1,25 @@
+import pytest
+
+import app as api
+
+
+def search(app, **params):
+    return app.test_client().get('/search', query_string={'q': 'factor', **params})
+
+
+def test_search_by_known_types(seeded_app):
+    response = search(seeded_app, tipos='articulo, pregunta')
+    assert response.status_code == 200
+    assert {result['tipo'] for result in response.get_json()['results']} <= {'articulo', 'pregunta'}
+
+
+@pytest.mark.parametrize('tipos', ['video', 'curso,video', 'DROP TABLE curso'])
+def test_unknown_types_are_400(seeded_app, tipos):
+    response = search(seeded_app, tipos=tipos)
+    assert response.status_code == 400
+    assert 'Tipos desconocidos' in response.get_json()['message']
+
+
+def test_search_without_known_types_is_empty(seeded_app):
+    with seeded_app.app_context():
+        assert api.catalog_search.search('factor', tipos=['video']) == ([], False)
@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import func, select
+
+import app as api
+
+USERS = [f'usuario{number}@x.com' for number in range(12)]
+
+
+def shard_uris(tmp_path, count):
+    return [f"sqlite:///{tmp_path / f'shard{number}.db'}" for number in range(count)]
+
+
+def send_extra_points(app, email, article_id=1):
+    return app.test_client().post('/extra_points', json={'articleId': article_id, 'userEmail': email})
+
+
+def rows_by_shard(app, model):
+    with app.app_context():
+        return [dict(api.user_shards.session(number).execute(
+                    select(model.usuario_email, func.count()).group_by(model.usuario_email)).all())
+                for number in range(len(api.user_shards.shard_keys))]
+
+
+@pytest.fixture
+def sharded_app(make_app, tmp_path):
+    app = make_app(SHARD_URIS=shard_uris(tmp_path, 2))
+    app.test_client().get('/initial_data')
+    return app
+
+
+def test_find_only_returns_the_owners_row(sharded_app):
+    client = sharded_app.test_client()
+    ids = {}
+    for email in ('a@x.com', 'b@x.com'):
+        response = client.post('/send_exam_results', json={
+            'examId': 1, 'userEmail': email, 'elapsedTime': 60,
+            'exam_results': [{'questionId': 1, 'optionSelectedValue': 'A'}]})
+        ids[email] = response.get_json()['exam_results_id']
+
+    def get(result_id, email=None):
+        params = {'exam_result_id': result_id}
+        if email:
+            params['userEmail'] = email
+        return client.get('/exam_result', query_string=params)
+
+    assert get(ids['a@x.com'], 'a@x.com').status_code == 200
+    assert get(ids['a@x.com'], ' A@X.com').status_code == 200
+    assert get(ids['b@x.com'], 'a@x.com').status_code == 404
+    assert get(ids['a@x.com']).status_code == 400
+    with sharded_app.test_request_context():
+        with pytest.raises(ValueError):
+            api.user_shards.find(api.ResultadoExamen, ids['a@x.com'], email=None)
+
+
+def test_rebalance_moves_users_to_their_new_shard(make_app, tmp_path):
+    one_shard = make_app(SHARD_URIS=shard_uris(tmp_path, 1))
+    one_shard.test_client().get('/initial_data')
+    for email in USERS:
+        send_extra_points(one_shard, email)
+
+    three_shards = make_app(SHARD_URIS=shard_uris(tmp_path, 3))
+    with three_shards.app_context():
+        api.user_shards.create_tables()
+        dry_run = api.user_shards.rebalance(dry_run=True)
+    assert rows_by_shard(three_shards, api.PuntajeUsuarioExtraArticulos)[0] == {email: 1 for email in USERS}
+
+    with three_shards.app_context():
+        summary = api.user_shards.rebalance(batch_size=2)
+        expected = {email: api.user_shards.shard_for(email) for email in USERS}
+    assert summary == dry_run
+    assert 0 < summary['usuarios_movidos'] < len(USERS)
+
+    by_shard = rows_by_shard(three_shards, api.PuntajeUsuarioExtraArticulos)
+    assert sorted(email for shard in by_shard for email in shard) == sorted(USERS)
+    for email, number in expected.items():
+        assert by_shard[number].get(email) == 1
+
+    # Se puede volver a ejecutar sin mover nada; los puntos se siguen leyendo del shard correcto
+    with three_shards.app_context():
+        assert api.user_shards.rebalance()['usuarios_movidos'] == 0
+    points = three_shards.test_client().get(f'/total_points?userEmail={USERS[0]}').get_json()['total_points']
+    assert points == 60
+
+
+def test_single_database_still_accepts_the_id_alone(seeded_app):
+    client = seeded_app.test_client()
+    result_id = client.post('/send_exam_results', json={
+        'examId': 1, 'userEmail': 'A@x.com', 'elapsedTime': 60,
+        'exam_results': [{'questionId': 1, 'optionSelectedValue': 'A'}]}).get_json()['exam_results_id']
+    assert client.get(f'/exam_result?exam_result_id={result_id}').status_code == 200
+    assert client.get(f'/exam_result?exam_result_id={result_id}&userEmail=a@x.com').status_code == 200
+    assert client.get(f'/exam_result?exam_result_id={result_id}&userEmail=b@x.com').status_code == 404
@@ -0,0 +1,75 @@
+import fakeredis
+
+import app as api
+from shared_cache import MemoryBackend, SharedCache
+
+
+def points(app, email):
+    return app.test_client().get(f'/total_points?userEmail={email}').get_json()['total_points']
+
+
+def extra_points(app, email, article_id):
+    return app.test_client().post('/extra_points', json={'articleId': article_id, 'userEmail': email})
+
+
+def test_without_redis_url_cache_is_disabled(seeded_app):
+    assert api.shared_cache.backend is None
+    with seeded_app.app_context():
+        assert api.shared_cache.get_or_compute('x', 'a@x.com', lambda: 1) == 1
+        assert api.shared_cache.get_or_compute('x', 'a@x.com', lambda: 2) == 2
+
+
+def test_write_in_one_worker_invalidates_reads_in_another(seeded_app, make_app):
+    server = fakeredis.FakeServer()
+    worker_1, worker_2 = seeded_app, make_app()
+    api.shared_cache.init_app(worker_1, backend=fakeredis.FakeRedis(server=server))
+    api.shared_cache.init_app(worker_2, backend=fakeredis.FakeRedis(server=server))
+
+    assert points(worker_1, 'a@x.com') == 0
+    assert points(worker_1, 'a@x.com') == 0
+    assert extra_points(worker_2, 'a@x.com', 1).get_json()['extrapoints'] is True
+    assert points(worker_1, 'a@x.com') == 60
+    assert points(worker_2, 'a@x.com') == 60
+
+
+def test_unshared_memory_backends_would_serve_stale_points(seeded_app, make_app):
+    # Lo que pasaba con una caché por proceso: por eso ya no es el valor por defecto
+    worker_1, worker_2 = seeded_app, make_app()
+    api.shared_cache.init_app(worker_1, backend=MemoryBackend())
+    api.shared_cache.init_app(worker_2, backend=MemoryBackend())
+
+    assert points(worker_1, 'a@x.com') == 0
+    extra_points(worker_2, 'a@x.com', 1)
+    assert points(worker_1, 'a@x.com') == 0
+
+
+def test_versions_are_per_user_and_catalog(seeded_app):
+    cache = SharedCache()
+    cache.init_app(seeded_app, backend=fakeredis.FakeRedis())
+    calls = []
+
+    def compute(value):
+        calls.append(value)
+        return value
+
+    with seeded_app.app_context():
+        assert cache.get_or_compute('n', 'a@x.com', lambda: compute(1)) == 1
+        assert cache.get_or_compute('n', 'a@x.com', lambda: compute(2)) == 1
+        assert cache.get_or_compute('n', 'b@x.com', lambda: compute(3)) == 3
+        cache.invalidate_user('a@x.com')
+        assert cache.get_or_compute('n', 'a@x.com', lambda: compute(4)) == 4
+        assert cache.get_or_compute('n', 'b@x.com', lambda: compute(5)) == 3
+        cache.invalidate_catalog()
+        assert cache.get_or_compute('n', 'b@x.com', lambda: compute(6)) == 6
+    assert cache.metrics()['hits'] == 2
+
+
+def test_unreachable_redis_computes_without_cache(seeded_app):
+    cache = SharedCache()
+    server = fakeredis.FakeServer()
+    server.connected = False
+    cache.init_app(seeded_app, backend=fakeredis.FakeRedis(server=server))
+    with seeded_app.app_context():
+        assert cache.get_or_compute('n', 'a@x.com', lambda: 7) == 7
+        cache.invalidate_user('a@x.com')
+    assert cache.metrics()['errors'] >= 2
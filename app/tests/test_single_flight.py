@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from single_flight import SingleFlight, request_key
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(target())
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_identical_concurrent_calls_run_once():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'catalogo'
+
+    results, _ = run_concurrently(5, lambda: flight.do('llave', slow))
+    assert results == ['catalogo'] * 5
+    assert len(calls) == 1
+    assert (flight.leaders, flight.coalesced) == (1, 4)
+    # Nada queda guardado: la siguiente llamada vuelve a calcular
+    flight.do('llave', slow)
+    assert len(calls) == 2
+
+
+def test_followers_receive_the_leaders_error():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError('sin base')
+
+    _, errors = run_concurrently(3, lambda: flight.do('llave', failing))
+    assert len(errors) == 3 and all(isinstance(error, ValueError) for error in errors)
+    assert flight.leaders == 1
+
+
+def test_follower_computes_itself_after_timeout():
+    flight = SingleFlight(follower_timeout=0.05)
+    leader = threading.Thread(target=lambda: flight.do('llave', lambda: time.sleep(0.3)))
+    leader.start()
+    time.sleep(0.02)
+    assert flight.do('llave', lambda: 'propio') == 'propio'
+    leader.join()
+
+
+@pytest.mark.parametrize('other, same', [
+    ('/x?b=2&a=1', True),
+    ('/x?a=1&b=3', False),
+])
+def test_request_key_ignores_parameter_order(other, same):
+    app = Flask(__name__)
+    with app.test_request_context('/x?a=1&b=2'):
+        key = request_key()
+    with app.test_request_context(other):
+        assert (request_key() == key) is same
+
+
+def test_request_key_separates_clients_pinned_to_the_primary(make_app, tmp_path):
+    app = make_app(DB_REPLICA_URIS=[f"sqlite:///{tmp_path / 'replica.db'}"], SECRET_KEY='prueba')
+    path = '/list_courses?bloque_id=1&userEmail=a@x.com'
+    with app.test_request_context(path):
+        replica_key = request_key()
+        app.extensions['db_router'].pin_current_user()
+    with app.test_request_context(path):
+        assert request_key() != replica_key
+    with app.test_request_context('/list_courses?bloque_id=1&userEmail=b@x.com'):
+        assert request_key()[-1] == 'replica'
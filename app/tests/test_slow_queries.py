@@ -0,0 +1,55 @@
+import json
+
+from sqlalchemy import func, select
+
+import app as api
+from slow_queries import sequential_scans
+
+
+def test_slow_queries_are_logged_with_their_plan(make_app, monkeypatch):
+    app = make_app(SLOW_QUERY_MS=0, SLOW_QUERY_EXPLAIN_INTERVAL=3600)
+    client = app.test_client()
+    client.get('/initial_data')
+    api.slow_query_log.recent.clear()
+    client.get('/list_courses?bloque_id=1')
+
+    entry, = [entry for entry in api.slow_query_log.recent if 'FROM curso' in entry['statement']]
+    assert entry['endpoint'] == 'api.list_courses'
+    assert 'curso' in entry['plan']
+    # La misma sentencia no se vuelve a explicar dentro del intervalo
+    client.get('/list_courses?bloque_id=2')
+    assert [entry['plan'] for entry in api.slow_query_log.recent if 'FROM curso' in entry['statement']][-1] is None
+
+    monkeypatch.setattr(api.cognito_auth, 'require_group', lambda group: {})
+    assert client.get('/slow_queries').get_json()['umbral_ms'] == 0
+
+
+def test_sqlite_sequential_scans():
+    plan = ['SCAN resultado_examen', 'SEARCH curso USING INDEX ix_curso (bloque_curso_id=?)',
+            'SCAN pregunta USING COVERING INDEX ix_pregunta', 'SCAN TABLE articulo',
+            'SCAN TABLE examen USING INDEX ix_examen']
+    # Antes de SQLite 3.36 el detalle era "SCAN TABLE tabla"
+    assert sequential_scans(plan, 'sqlite') == ['resultado_examen', 'articulo']
+
+
+def test_check_query_plans_removes_synthetic_users_and_detects_plan_changes(seeded_app, tmp_path):
+    runner = seeded_app.test_cli_runner()
+    snapshot = tmp_path / 'planes.json'
+    result = runner.invoke(args=['check-query-plans', '--synthetic-users', '20'])
+    assert result.exit_code == 2
+    assert '--scratch-db' in result.output
+
+    result = runner.invoke(args=['check-query-plans', '--synthetic-users', '20', '--scratch-db',
+                                 '--snapshot', str(snapshot)])
+    assert result.exit_code == 0, result.output
+    with seeded_app.app_context():
+        assert api.db.session.scalar(select(func.count()).select_from(api.ResultadoExamen)) == 0
+
+    planes = json.loads(snapshot.read_text(encoding='utf-8'))
+    path, resultado = next((path, resultado) for path, resultado in planes.items() if resultado['consultas'])
+    next(iter(resultado['consultas'].values()))['plan'] = ['SCAN plan_anterior']
+    snapshot.write_text(json.dumps(planes), encoding='utf-8')
+
+    result = runner.invoke(args=['check-query-plans', '--compare', str(snapshot)])
+    assert result.exit_code == 1
+    assert f'[plan cambió] {path}' in result.output